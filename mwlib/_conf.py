@@ -38,6 +38,26 @@ class confbase(object):
     def noedits(self):
         return self.get("fetch", "noedits", False, as_bool)
 
+    @property
+    def store_expansions(self):
+        return self.get("expander", "store_expansions", False, as_bool)
+
+    @property
+    def split_sections(self):
+        return self.get("refine", "split_sections", False, as_bool)
+
+    @property
+    def refine_processes(self):
+        return self.get("refine", "processes", 0, int)
+
+    @property
+    def treecleaner_processes(self):
+        return self.get("treecleaner", "processes", 0, int)
+
+    @property
+    def reuse_fragments(self):
+        return self.get("refine", "reuse_fragments", False, as_bool)
+
     @property
     def user_agent(self):
         from mwlib._version import version
@@ -27,18 +27,155 @@ from mwlib.parser import Item, ItemList,  Node, Table, Row, Cell, Paragraph, Pre
 from mwlib.parser import Section, Style, TagNode, Text, Timeline
 from mwlib.parser import  ImageLink, Article, Book, Chapter
 import copy
+from mwlib import nshandling, utoken
 from mwlib.log import Log
 
 log = Log("advtree")
 
 
 def _idIndex(lst, el):
-    """Return index of first appeareance of element el in list lst"""
-    
+    """Return index of first appeareance of element el in list lst
+
+    The index of a node in the children of its parent is cached in
+    node._index, relative to parent._shift, the number of children added
+    minus the number of children removed by the methods of AdvancedNode.
+    node._index + parent._shift is the index of the node, if all children
+    added and removed since it was cached are before the node. If they
+    are all behind it, node._index is the index only if parent._shift was
+    0 when it was cached. Code changing the children of a node directly
+    leaves the cached indices out of date, so both candidates are checked
+    by identity. If neither fits, the cached indices of all elements of
+    lst are renewed.
+    """
+
+    p = el.parent
+    if p is not None and p.children is lst:
+        shift = p._shift
+    else:
+        p = None
+        shift = 0
+    idx = getattr(el, '_index', None)
+    if idx is not None:
+        n = len(lst)
+        if 0 <= idx + shift < n and lst[idx + shift] is el:
+            return idx + shift
+        if shift and 0 <= idx < n and lst[idx] is el:
+            return idx
+
+    idx = -1
     for i, e in enumerate(lst):
-        if e is el:
-            return i
-    raise ValueError('element %r not found' % el)
+        if e is el and idx < 0:
+            idx = i
+        e._index = i - shift
+    if idx < 0:
+        raise ValueError('element %r not found' % el)
+    return idx
+
+class NodeIndex(object):
+    """The nodes of an article by class, see buildAdvancedTree.
+
+    Nodes added by the methods of AdvancedNode are added to the index of
+    the article containing them, nodes added to the children of a node
+    directly are missing. Removed nodes stay in the index until a query
+    finds that they are no longer part of the article.
+    """
+
+    def __init__(self, article):
+        self.article = article
+        self.nodes = {} # class -> set of nodes
+        self.add(article)
+
+    def add(self, node):
+        """Add node and all its children"""
+        nodes = self.nodes
+        todo = [node]
+        while todo:
+            n = todo.pop()
+            s = nodes.get(n.__class__)
+            if s is None:
+                s = nodes[n.__class__] = set()
+            s.add(n)
+            todo.extend(n.children)
+
+    def getPath(self, node):
+        """Return the indices leading from the article to node or None"""
+        path = []
+        article = self.article
+        while node is not article:
+            p = node.parent
+            if p is None:
+                return None
+            try:
+                path.append(_idIndex(p.children, node))
+            except ValueError:
+                return None
+            node = p
+        path.reverse()
+        return path
+
+    def find(self, klass):
+        """Return the nodes of the article w/ klass in document order"""
+        nodes = self.nodes.get(klass)
+        if not nodes:
+            return []
+        res = []
+        for n in list(nodes):
+            path = self.getPath(n)
+            if path is None:
+                nodes.discard(n)
+            else:
+                res.append((path, n))
+        res.sort(key=lambda x: x[0])
+        return [n for (path, n) in res]
+
+
+def _addToNodeIndex(parent, nodes):
+    # add nodes to the NodeIndex of the article containing parent
+    while parent is not None:
+        index = parent._nodeIndex
+        if index is not None:
+            for n in nodes:
+                index.add(n)
+            return
+        parent = parent.parent
+
+
+_immutableTypes = (str, unicode, int, long, float, bool, type(None), nshandling.nshandler)
+
+def _cloneValue(v, memo):
+    if isinstance(v, _immutableTypes):
+        return v
+    if type(v) is dict:
+        return dict([(k, _cloneValue(x, memo)) for (k, x) in v.iteritems()])
+    if type(v) is list:
+        return [_cloneValue(x, memo) for x in v]
+    return copy.deepcopy(v, memo)
+
+def _cloneNode(node, parent, memo):
+    """Return a copy of node and its children w/ parent as parent.
+
+    Strings and the nshandler are shared, dicts and lists like vlist are
+    copied. Other attributes are copied with copy.deepcopy.
+    """
+    c = object.__new__(node.__class__)
+    for name in utoken.token_fields:
+        try:
+            setattr(c, name, getattr(node, name))
+        except AttributeError:
+            pass
+    d = {}
+    for (k, v) in node.__dict__.iteritems():
+        if k == 'children':
+            v = [_cloneNode(x, c, memo) for x in v]
+        elif k == 'parent' or k == '_nodeIndex':
+            continue
+        elif not isinstance(v, _immutableTypes):
+            v = _cloneValue(v, memo)
+        d[k] = v
+    d['parent'] = parent
+    c.__dict__ = d
+    return c
+
 
 def debug(method): # use as decorator
     def f(self, *args, **kargs):
@@ -61,15 +198,15 @@ class AdvancedNode:
 
     parent = None # parent element
     isblocknode = False
+    _index = None # index in parent.children, see _idIndex
+    _shift = 0
+    _nodeIndex = None # NodeIndex of an article, see buildAdvancedTree
 
     def copy(self):
         "return a copy of this node and all its children"
-        p = self.parent
-        try:
-            self.parent = None
-            n = copy.deepcopy(self)
-        finally:
-            self.parent = p
+        n = _cloneNode(self, None, {})
+        if self._nodeIndex is not None:
+            n._nodeIndex = NodeIndex(n)
         return n
 
 
@@ -87,6 +224,9 @@ class AdvancedNode:
             idx+=1
         tp.children.insert(idx, self)
         self.parent = tp
+        tp._shift += 1
+        self._index = idx - tp._shift
+        _addToNodeIndex(tp, [self])
 
     def hasChild(self, c):
         """Check if node c is child of self"""
@@ -98,8 +238,10 @@ class AdvancedNode:
             return False
         
     def appendChild(self, c):
+        c._index = len(self.children) - self._shift
         self.children.append(c)
         c.parent = self
+        _addToNodeIndex(self, [c])
 
     def removeChild(self, c):
         self.replaceChild(c, [])
@@ -112,9 +254,12 @@ class AdvancedNode:
         self.children[idx:idx+1] = newchildren
 
         c.parent = None
-        assert not self.hasChild(c)
-        for nc in newchildren:
+        self._shift += len(newchildren) - 1
+        for (i, nc) in enumerate(newchildren):
             nc.parent = self
+            nc._index = idx + i - self._shift
+        if newchildren:
+            _addToNodeIndex(self, newchildren)
 
     def getParents(self):
         """Return list of parent nodes up to the root node.
@@ -145,6 +290,8 @@ class AdvancedNode:
 
     def getChildNodesByClass(self, klass): #FIXME: rename to getChildrenByClass
         """returns all children  w/ klass"""
+        if self._nodeIndex is not None:
+            return [p for p in self._nodeIndex.find(klass) if p is not self]
         return [p for p in self.getAllChildren() if p.__class__ == klass]
 
     def getAllChildren(self):
@@ -156,7 +303,12 @@ class AdvancedNode:
         
     def getSiblings(self):
         """Return all siblings WITHOUT self"""
-        return [c for c in self.getAllSiblings() if c is not self]
+        s = self.getAllSiblings()
+        try:
+            idx = _idIndex(s, self)
+        except ValueError:
+            return list(s)
+        return s[:idx] + s[idx+1:]
 
     def getAllSiblings(self):
         """Return all siblings plus self"""
@@ -705,16 +857,22 @@ def removeNewlines(node):
             todo.append(c)
 
 
-def buildAdvancedTree(root): # USE WITH CARE
+def buildAdvancedTree(root, index=False): # USE WITH CARE
     """
     extends and cleans parse trees
     do not use this funcs without knowing whether these 
     Node modifications fit your problem
+
+    if index is true, the articles get a NodeIndex, which is used by
+    getChildNodesByClass
     """
     funs = [extendClasses, fixTagNodes, removeNodes, removeNewlines,
             fixStyleNodes,]
     for f in funs:
         f(root)
+    if index:
+        for article in root.find(Article):
+            article._nodeIndex = NodeIndex(article)
         
 
 
@@ -3,7 +3,7 @@
 # See README.rst for additional licensing information.
 
 import os
-from mwlib.net import fetch, sapi as mwapi
+from mwlib.net import fetch, sapi as mwapi, depgraph
 
 from mwlib.parse_collection_page import extract_metadata
 from mwlib.metabook import get_licenses, parse_collection_page, collection
@@ -56,7 +56,8 @@ class start_fetcher(object):
                                      progress=self.progress, 
                                      imagesize=self.options.imagesize,
                                      cover_image=metabook.cover_image,
-                                     fetch_images=not self.options.noimages)
+                                     fetch_images=not self.options.noimages,
+                                     template_graph=depgraph.get_graph(self.api_url))
         self.fetcher.run()
 
     def init_variables(self):
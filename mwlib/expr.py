@@ -14,6 +14,8 @@ import re
 import inspect
 import math
 
+from mwlib import lrucache
+
 class ExprError(Exception):
     pass
 
@@ -192,15 +194,155 @@ class Expr(object):
 
         return self.operand_stack[-1]
 
-_cache = {}
+# opcodes of compiled expressions
+PUSH_NUMBER = 0     # (PUSH_NUMBER, index into numbers)
+PUSH_CONSTANT = 1   # (PUSH_CONSTANT, value)
+APPLY = 2           # (APPLY, function from functions)
+ERROR = 3           # (ERROR, message)
+
+numberrx = re.compile(r"(\d+(?:\.\d+)?|\.\d+)")
+literalrx = re.compile(r"\s*([-+]?)\s*(\d+(?:\.\d+)?|\.\d+)\s*$")
+binaryrx = re.compile(r"""
+\s*(\d+(?:\.\d+)?|\.\d+)
+\s*(>=|<=|<>|!=|[-+*/^<>=]|mod|div|and|or|round)
+\s*(\d+(?:\.\d+)?|\.\d+)\s*$
+""", re.VERBOSE | re.IGNORECASE)
+
+
+def as_float_or_int(s):
+    if "." in s:
+        return float(s)
+    return long(s)
+
+
+def compile_expr(s):
+    """compile expression s to a function, which takes the list of
+    numbers in an expression and returns its value. the function
+    evaluates all expressions, which only differ from s in their
+    numbers, exactly like Expr.parse_expr"""
+
+    tokens = tokenize(s)
+    if not tokens:
+        return lambda numbers: ""
+
+    code = []
+    operator_stack = []
+    numcount = 0
+
+    last_operand, last_operator = False, True
+
+    # same as Expr.parse_expr, but emit instructions instead of
+    # evaluating. errors are raised when the instruction is reached.
+    for operand, operator in tokens:
+        if operand in ("e", "E") and (last_operand or last_operator == ")"):
+            operand, operator = operator, operand
+
+        if operand:
+            if last_operand:
+                code.append((ERROR, "expected operator"))
+                break
+            if operand in Expr.constants:
+                code.append((PUSH_CONSTANT, Expr.constants[operand]))
+            else:
+                code.append((PUSH_NUMBER, numcount))
+                numcount += 1
+        elif operator == "(":
+            operator_stack.append("(")
+        elif operator == ")":
+            while 1:
+                if not operator_stack:
+                    code.append((ERROR, "unbalanced parenthesis"))
+                    break
+                t = operator_stack.pop()
+                if t == "(":
+                    break
+                code.append((APPLY, functions[t]))
+            if code and code[-1][0] == ERROR:
+                break
+        elif operator in precedence:
+            if last_operator and last_operator != ")":
+                if operator == '-':
+                    operator = uminus
+                elif operator == '+':
+                    operator = uplus
+
+            is_unary = operator in unary_ops
+            prec = precedence[operator]
+            while not is_unary and operator_stack and prec <= precedence[operator_stack[-1]]:
+                code.append((APPLY, functions[operator_stack.pop()]))
+            operator_stack.append(operator)
+        else:
+            code.append((ERROR, "unknown operator: %r" % (operator,)))
+            break
+
+        last_operand, last_operator = operand, operator
+    else:
+        while operator_stack:
+            p = operator_stack.pop()
+            if p == "(":
+                code.append((ERROR, "unbalanced parenthesis"))
+                break
+            code.append((APPLY, functions[p]))
+
+    def run(numbers):
+        stack = []
+        for opcode, arg in code:
+            if opcode is APPLY:
+                arg(stack)
+            elif opcode is PUSH_NUMBER:
+                stack.append(as_float_or_int(numbers[arg]))
+            elif opcode is PUSH_CONSTANT:
+                stack.append(arg)
+            else:
+                raise ExprError(arg)
+
+        if len(stack) != 1:
+            raise ExprError("bad stack: %s" % (stack,))
+        return stack[-1]
+
+    return run
+
+
+_compiled = lrucache.lrucache(1000)
+
+
+def evaluate(s):
+    """evaluate expression s without looking at the result cache"""
+
+    mo = literalrx.match(s)
+    if mo is not None:
+        sign, num = mo.groups()
+        if sign == "-":
+            return -as_float_or_int(num)
+        return as_float_or_int(num)
+
+    mo = binaryrx.match(s)
+    if mo is not None:
+        a, op, b = mo.groups()
+        stack = [as_float_or_int(a), as_float_or_int(b)]
+        functions[op.lower()](stack)
+        return stack[0]
+
+    # the expression with its numbers cut out
+    parts = numberrx.split(s)
+    shape = tuple(parts[::2])
+    try:
+        run = _compiled[shape]
+    except KeyError:
+        run = _compiled[shape] = compile_expr(s)
+    return run(parts[1::2])
+
+
+_cache = lrucache.lrucache(10000)
+
+
 def expr(s):
     try:
         return _cache[s]
     except KeyError:
         pass
-    
-    
-    r = Expr().parse_expr(s)
+
+    r = evaluate(s)
     _cache[s] = r
     return r
 
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""persistent per wiki graph of template dependencies
+
+The graph maps the fully qualified name of a template to the names of
+the templates it transcludes. It is updated from the template pages
+fetched while building a nuwiki and lets the fetcher schedule the
+transitive closure of a template set in one pass.
+"""
+
+import os, tempfile
+from hashlib import sha1
+
+from mwlib import myjson as json
+
+format_version = 1
+
+
+def get_dependencies(raw, title, nshandler):
+    """return the fully qualified names of the templates transcluded
+    by raw text of page title"""
+
+    from mwlib.expander import get_templates
+
+    res = set()
+    for name in get_templates(raw, title):
+        name = name.strip()
+        if not name or name.startswith("#") or "{" in name:
+            continue
+        if ":" in name and not name.startswith(":"):
+            if not nshandler._find_namespace(name.split(":", 1)[0])[0]:
+                # magic word or parser function like {{lc:...}}
+                continue
+        res.add(nshandler.get_fqname(name, 10))
+    res.discard(nshandler.get_fqname(title))
+    return res
+
+
+class template_graph(object):
+    def __init__(self, path=None):
+        self.path = path
+        self.graph = {}
+        self.changed = {}
+        if path is not None:
+            self.graph = self._load()
+
+    def __len__(self):
+        return len(self.graph)
+
+    def _load(self):
+        try:
+            data = json.load(open(self.path, "rb"))
+        except (IOError, ValueError):
+            return {}
+        if data.get("format_version") != format_version:
+            return {}
+        return data.get("graph", {})
+
+    def update(self, title, raw, nshandler):
+        """record the dependencies of template title with raw text.
+        return the set of dependencies"""
+
+        deps = get_dependencies(raw, title, nshandler)
+        if set(self.graph.get(title, ())) != deps:
+            self.graph[title] = self.changed[title] = sorted(deps)
+        return deps
+
+    def get(self, title):
+        return self.graph.get(title, [])
+
+    def closure(self, titles):
+        """return the templates transitively transcluded by titles
+        according to the graph, including titles"""
+
+        res = set(titles)
+        todo = list(res)
+        while todo:
+            for x in self.graph.get(todo.pop(), ()):
+                if x not in res:
+                    res.add(x)
+                    todo.append(x)
+        return res
+
+    def save(self):
+        """merge our changes into the graph on disk"""
+
+        if self.path is None or not self.changed:
+            return
+
+        graph = self._load()
+        graph.update(self.changed)
+        self.graph = graph
+        self.changed = {}
+
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+        try:
+            f = os.fdopen(fd, "wb")
+            json.dump(dict(format_version=format_version, graph=graph), f)
+            f.close()
+            os.rename(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+def get_graph(apiurl):
+    """return the template graph for the wiki at apiurl stored in
+    the directory configured via the fetch.template_graph_dir setting
+    (MWLIB_FETCH_TEMPLATE_GRAPH_DIR). if it is not set, the graph only
+    lives in memory"""
+
+    from mwlib import conf
+    path = conf.get("fetch", "template_graph_dir", None)
+    if not path:
+        return template_graph()
+    if isinstance(apiurl, unicode):
+        apiurl = apiurl.encode("utf-8")
+    return template_graph(os.path.join(path, sha1(apiurl).hexdigest() + ".json"))
@@ -10,7 +10,7 @@ import sqlite3dbm
 from lxml import etree
 
 from mwlib import utils, nshandling, conf, myjson as json
-from mwlib.net import sapi as mwapi
+from mwlib.net import sapi as mwapi, depgraph
 
 
 class shared_progress(object):
@@ -231,7 +231,8 @@ class fetcher(object):
                  status=None,
                  progress=None,
                  cover_image=None,
-                 imagesize=800, fetch_images=True):
+                 imagesize=800, fetch_images=True,
+                 template_graph=None):
 
         self.dispatch_event = gevent.event.Event()
         self.api_semaphore = gevent.lock.Semaphore(20)
@@ -257,6 +258,9 @@ class fetcher(object):
         self.fetch_images = fetch_images
 
         self.scheduled = set()
+        if template_graph is None:
+            template_graph = depgraph.template_graph()
+        self.template_graph = template_graph
 
         self.count_total = 0
         self.count_done = 0
@@ -437,11 +441,24 @@ class fetcher(object):
                 self.revids_todo.append(r)
                 self.scheduled.add(r)
 
+        # fetch the templates used by templates in the same pass
+        self._schedule_templates(self.template_graph.closure(templates))
+
+    def _schedule_templates(self, templates):
         for t in templates:
             if t not in self.scheduled:
                 self.pages_todo.append(t)
                 self.scheduled.add(t)
 
+    def _update_template_graph(self, data):
+        pages = data.get("pages", {}).values()
+        for p in pages:
+            revisions = p.get("revisions")
+            if p.get("ns") != 10 or not revisions:
+                continue
+            deps = self.template_graph.update(p["title"], revisions[0]["*"], self.nshandler)
+            # dependencies missing from the graph
+            self._schedule_templates(self.template_graph.closure(deps))
 
     def get_siteinfo_for(self, m):
         return m.get_siteinfo()
@@ -694,6 +711,7 @@ class fetcher(object):
             self._update_redirects(r)
             self._handle_categories(data)
             self.fsout.write_pages(data)
+            self._update_template_graph(data)
 
         def doit(name, lst):
             while lst and self.api.idle():
@@ -733,6 +751,7 @@ class fetcher(object):
         self.fsout.write_redirects(self.redirects)
         self.fsout.write_licenses(self.licenses)
         self.fsout.close()
+        self.template_graph.save()
 
     def _refcall(self, fun, *args, **kw):
         """Increment refcount, schedule call of fun
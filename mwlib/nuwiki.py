@@ -306,6 +306,7 @@ class adapt(object):
     edits = None
     interwikimap = None
     was_tmpdir = False
+    expansion_store = None
     
     def __init__(self, path_or_instance):
         if isinstance(path_or_instance, zipfile.ZipFile):
@@ -314,11 +315,15 @@ class adapt(object):
             extractall(zf, tmpdir)
             path_or_instance = tmpdir
             self.was_tmpdir = True
+            # the nuwiki is removed after rendering, keep expansions beside the zip file
+            self.expansions_path = os.path.splitext(os.path.abspath(zf.filename))[0] + ".expansions.db"
             
         if isinstance(path_or_instance, basestring):
             self.nuwiki = NuWiki(path_or_instance, allow_pickle=not self.was_tmpdir)
         else:
             self.nuwiki = path_or_instance
+        if not self.was_tmpdir:
+            self.expansions_path = os.path.join(self.nuwiki.path, "expansions.db")
         self.siteinfo = self.nuwiki.get_siteinfo()
         self.metabook = self.nuwiki.get_data("metabook")
         
@@ -397,6 +402,19 @@ class adapt(object):
         else:
             return self.nuwiki.html.get(title, {})
 
+    def get_expansion_store(self):
+        """return the templ.expansions.ExpansionStore used to reuse
+        expanded articles or None, if the store_expansions setting
+        (MWLIB_EXPANDER_STORE_EXPANSIONS) is off"""
+
+        if self.expansion_store is None:
+            from mwlib import conf
+            if not conf.store_expansions:
+                return None
+            from mwlib.templ.expansions import ExpansionStore
+            self.expansion_store = ExpansionStore(self.expansions_path)
+        return self.expansion_store
+
     def getParsedArticle(self, title, revision=None):
         if revision:
             page = self.nuwiki.get_page(None, revision)
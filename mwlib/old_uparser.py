@@ -5,13 +5,13 @@
 
 from mwlib import parser
 
-def simplify(node, **kwargs):
-    "concatenates textnodes in order to reduce the number of objects"
+def simplifyChildren(children):
+    "concatenates textnodes in children in order to reduce the number of objects"
     Text = parser.Text
-    
+
     last = None
     toremove = []
-    for i,c in enumerate(node.children):
+    for i,c in enumerate(children):
         if c.__class__ == Text: # would isinstance be safe?
             if last:
                 last.caption += c.caption
@@ -19,17 +19,23 @@ def simplify(node, **kwargs):
             else:
                 last = c
         else:
-            simplify(c)
             last = None
 
     for i,ii in enumerate(toremove):
-        del node.children[ii-i]
+        del children[ii-i]
 
+def simplify(node, **kwargs):
+    "concatenates textnodes in order to reduce the number of objects"
+    simplifyChildren(node.children)
+    for c in node.children:
+        if c.__class__ != parser.Text:
+            simplify(c)
 
-def removeBoilerplate(node, **kwargs):
+
+def removeBoilerplateChildren(children):
     i = 0
-    while i < len(node.children):
-        x = node.children[i]
+    while i < len(children):
+        x = children[i]
         if isinstance(x, parser.TagNode) and x.caption=='div':
             try:
                 klass = x.values.get('class', '')
@@ -37,13 +43,19 @@ def removeBoilerplate(node, **kwargs):
                 klass = ''
                 
             if 'boilerplate' in klass:
-                del node.children[i]
+                del children[i]
                 continue
             
         i += 1
 
+def removeBoilerplate(node, **kwargs):
+    removeBoilerplateChildren(node.children)
     for x in node.children:
         removeBoilerplate(x)
 
 
 postprocessors = [removeBoilerplate, simplify]
+
+# the same for a single list of children, used by parse trees, which
+# are converted lazily (refine.compat.LazyChildren)
+children_postprocessors = [removeBoilerplateChildren, simplifyChildren]
@@ -1,5 +1,7 @@
 # -*- mode: cython -*-
 
+from mwlib.utoken import token as T
+
 cdef class token_walker(object):
     cdef object skip_tags
 
@@ -21,3 +23,392 @@ cdef class token_walker(object):
                     if x.tagname not in skip_tags:
                         res.append(children)
         return res
+
+
+cdef class tokenbuffer(object):
+    """list like container of tokens, see mwlib.refine.tokenbuffer. head
+    holds the tokens before the gap, tail the tokens after the gap in
+    reverse order"""
+    cdef public list head
+    cdef public list tail
+
+    def __init__(self, tokens=()):
+        self.head = list(tokens)
+        self.tail = []
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    def __iter__(self):
+        for x in self.head:
+            yield x
+        for x in reversed(self.tail):
+            yield x
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, list(self))
+
+    cdef _move(self, Py_ssize_t pos):
+        cdef list head = self.head
+        cdef list tail = self.tail
+        cdef list chunk
+        cdef Py_ssize_t n = len(head)
+        if pos < n:
+            chunk = head[pos:]
+            del head[pos:]
+            chunk.reverse()
+            tail.extend(chunk)
+        elif pos > n:
+            chunk = tail[n - pos:]
+            del tail[n - pos:]
+            chunk.reverse()
+            head.extend(chunk)
+
+    cdef Py_ssize_t _index(self, Py_ssize_t i) except -1:
+        cdef Py_ssize_t size = len(self.head) + len(self.tail)
+        if i < 0:
+            i += size
+        if i < 0 or i >= size:
+            raise IndexError("tokenbuffer index out of range")
+        return i
+
+    def __getitem__(self, i):
+        cdef Py_ssize_t start, stop, step, n, j
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            assert step == 1, "extended slices not supported"
+            self._move(max(start, stop))
+            return self.head[start:stop]
+
+        j = self._index(i)
+        n = len(self.head)
+        if j < n:
+            return self.head[j]
+        return self.tail[len(self.tail) - 1 - (j - n)]
+
+    def __setitem__(self, i, value):
+        cdef Py_ssize_t start, stop, step, n, j
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            assert step == 1, "extended slices not supported"
+            self._move(max(start, stop))
+            self.head[start:stop] = value
+            return
+
+        j = self._index(i)
+        n = len(self.head)
+        if j < n:
+            self.head[j] = value
+        else:
+            self.tail[len(self.tail) - 1 - (j - n)] = value
+
+    def __delitem__(self, i):
+        if not isinstance(i, slice):
+            i = self._index(i)
+            i = slice(i, i + 1)
+        self[i] = []
+
+    def insert(self, Py_ssize_t i, value):
+        cdef Py_ssize_t size = len(self)
+        if i < 0:
+            i = max(0, i + size)
+        self._move(min(i, size))
+        self.head.append(value)
+
+    def append(self, value):
+        self._move(len(self))
+        self.head.append(value)
+
+    def tolist(self):
+        self._move(len(self))
+        return self.head
+
+
+# compiled versions of parse_singlequote.run, parse_lines.analyze,
+# parse_paragraphs.run (mwlib.refine.core) and tagparser.run
+# (mwlib.refine.tagparser). they have to produce the same trees as
+# the python versions, see tests/test_refine_compiled.py
+
+cdef _finish_singlequote(list counts, list styles):
+    from mwlib.parser import styleanalyzer
+    cdef Py_ssize_t i
+    cdef Py_ssize_t last_apocount = 0
+
+    assert len(counts) == len(styles)
+    states = styleanalyzer.compute_path(counts)
+
+    for i, s in enumerate(states):
+        style = styles[i]
+        apos = "'" * (s.apocount - last_apocount)
+        if apos:
+            style.children.insert(0, T(type=T.t_text, text=apos))
+        last_apocount = s.apocount
+
+        if s.is_bold and s.is_italic:
+            style.caption = "'''"
+            inner = T(type=T.t_complex_style, caption="''", children=style.children)
+            style.children = [inner]
+        elif s.is_bold:
+            style.caption = "'''"
+        elif s.is_italic:
+            style.caption = "''"
+        else:
+            style.type = T.t_complex_node
+
+
+def parse_singlequote(tokens):
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t start = -1
+    cdef list counts = []
+    cdef list styles = []
+    t_singlequote = T.t_singlequote
+    t_newline = T.t_newline
+    t_complex_style = T.t_complex_style
+
+    while pos < len(tokens):
+        t = tokens[pos]
+        type = t.type
+        if type == t_singlequote:
+            if start < 0:
+                counts.append(len(t.text))
+                start = pos
+                pos += 1
+            else:
+                tokens[start:pos] = [T(type=t_complex_style, children=tokens[start + 1:pos])]
+                styles.append(tokens[start])
+                pos = start + 1
+                start = -1
+        elif type == t_newline:
+            if start >= 0:
+                tokens[start:pos] = [T(type=t_complex_style, children=tokens[start + 1:pos])]
+                styles.append(tokens[start])
+                pos = start
+                start = -1
+            pos += 1
+
+            if counts:
+                _finish_singlequote(counts, styles)
+                counts = []
+                styles = []
+        else:
+            pos += 1
+
+    if start >= 0:
+        tokens[start:pos] = [T(type=t_complex_style, children=tokens[start + 1:pos])]
+        styles.append(tokens[start])
+
+    if counts:
+        _finish_singlequote(counts, styles)
+
+
+cdef _splitdl(item):
+    cdef list children = item.children
+    cdef Py_ssize_t i
+    for i in range(len(children)):
+        x = children[i]
+        if x.type == T.t_special and x.text == ':':
+            s = T(type=T.t_complex_style, caption=':', children=children[i + 1:])
+            del children[i:]
+            return s
+
+
+cdef _getchar(node):
+    assert node.type == T.t_complex_line
+    if node.lineprefix:
+        return node.lineprefix[0]
+    return None
+
+
+cdef _appendline(list lines, Py_ssize_t startpos, item, endtag):
+    cdef Py_ssize_t i
+    line = lines[startpos]
+    if endtag:
+        children = line.children
+        for i in range(len(children)):
+            x = children[i]
+            if x.rawtagname == endtag and x.type == T.t_html_tag_end:
+                after = children[i + 1:]
+                del children[i:]
+                item.children.append(line)
+                lines[startpos] = T(type=T.t_complex_line, tagname="p", lineprefix=None, children=after)
+                return
+
+    item.children.append(line)
+    del lines[startpos]
+
+
+def analyze_lines(list lines):
+    cdef Py_ssize_t startpos = 0
+    t_complex_line = T.t_complex_line
+    t_complex_tag = T.t_complex_tag
+    t_complex_node = T.t_complex_node
+    t_complex_style = T.t_complex_style
+
+    lines.append(T(type=t_complex_line, lineprefix='<guard>')) # guard
+
+    while startpos < len(lines) - 1:
+        prefix = _getchar(lines[startpos])
+        if prefix is None:
+            if lines[startpos].tagname:
+                lines[startpos].type = t_complex_tag
+            else:
+                lines[startpos].type = t_complex_node
+            startpos += 1
+            continue
+
+        endtag = None
+        if prefix == ':':
+            node = T(type=t_complex_style, caption=':')
+            itemtype, itemtag = t_complex_node, None
+        elif prefix == '*':
+            node = T(type=t_complex_tag, tagname="ul")
+            itemtype, itemtag = t_complex_tag, "li"
+            endtag = "ul"
+        elif prefix == "#":
+            node = T(type=t_complex_tag, tagname="ol")
+            itemtype, itemtag = t_complex_tag, "li"
+            endtag = "ol"
+        elif prefix == ';':
+            node = T(type=t_complex_style, caption=';')
+            itemtype, itemtag = t_complex_node, None
+        else:
+            assert 0
+
+        node.children = []
+        dd = None
+
+        while startpos < len(lines) - 1 and _getchar(lines[startpos]) == prefix:
+            # collect items
+            if itemtag is None:
+                item = T(type=itemtype, blocknode=True)
+            else:
+                item = T(type=itemtype, tagname=itemtag, blocknode=True)
+            item.children = []
+            _appendline(lines, startpos, item, endtag)
+
+            while startpos < len(lines) - 1 and prefix == _getchar(lines[startpos]) and len(lines[startpos].lineprefix) > 1:
+                _appendline(lines, startpos, item, endtag)
+
+            for x in item.children:
+                x.lineprefix = x.lineprefix[1:]
+            analyze_lines(item.children)
+            node.children.append(item)
+            if prefix == ';' and item.children and item.children[0].type == t_complex_node:
+                dd = _splitdl(item.children[0])
+                if dd is not None:
+                    break
+            if prefix in ":;":
+                break
+
+        lines.insert(startpos, node)
+        startpos += 1
+        if dd is not None:
+            lines.insert(startpos, dd)
+            startpos += 1
+    del lines[-1] # remove guard
+
+
+cdef _create_paragraph(tokens, Py_ssize_t first, Py_ssize_t i, Py_ssize_t delta):
+    sub = tokens[first:i]
+    if sub:
+        tokens[first:i + delta] = [T(type=T.t_complex_tag, tagname='p', children=sub, blocknode=True)]
+
+
+def parse_paragraphs(tokens):
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t first = 0
+    t_break = T.t_break
+
+    while i < len(tokens):
+        t = tokens[i]
+        if t.type == t_break:
+            _create_paragraph(tokens, first, i, 1)
+            first += 1
+            i = first
+        elif t.blocknode: # blocknode
+            _create_paragraph(tokens, first, i, 0)
+            first += 1
+            i = first
+        else:
+            i += 1
+
+    if first:
+        _create_paragraph(tokens, first, i, 1)
+
+
+cdef Py_ssize_t _find_in_stack(list stack, tag) except -1:
+    cdef Py_ssize_t pos = len(stack) - 1
+    while pos > 0:
+        t = stack[pos][1]
+        if t.tagname == tag.tagname:
+            return pos
+
+        if tag.prio > t.prio:
+            pos -= 1
+        else:
+            break
+
+    return 0
+
+
+cdef Py_ssize_t _close_stack(list stack, Py_ssize_t spos, tokens, Py_ssize_t pos) except -1:
+    cdef Py_ssize_t i
+    close = stack[spos:]
+    del stack[spos:]
+    close.reverse()
+
+    for i, t in close:
+        vlist = tokens[i].vlist
+        display = vlist.get("style", {}).get("display", "").lower()
+        if display == "inline":
+            blocknode = False
+        elif display == "block":
+            blocknode = True
+        else:
+            blocknode = t.blocknode
+
+        sub = tokens[i + 1:pos]
+        tokens[i:pos] = [T(type=T.t_complex_tag, children=sub, tagname=t.tagname, blocknode=blocknode, vlist=vlist)]
+        pos = i + 1
+
+    return pos
+
+
+def parse_tags(tokens, dict name2tag, guard):
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t spos
+    cdef list stack = [guard]
+    t_html_tag = T.t_html_tag
+    t_html_tag_end = T.t_html_tag_end
+
+    while pos < len(tokens):
+        t = tokens[pos]
+        tag = name2tag.get(t.rawtagname)
+        if tag is None:
+            pos += 1
+            continue
+        if t.type == t_html_tag:
+            if t.tag_selfClosing:
+                t.type = T.t_complex_tag
+                t.tagname = t.rawtagname
+                t.rawtagname = None
+                pos += 1
+            else:
+                if stack[-1][1].prio == tag.prio and not tag.nested:
+                    pos = _close_stack(stack, len(stack) - 1, tokens, pos)
+                    assert tokens[pos] is t
+
+                stack.append((pos, tag))
+                pos += 1
+        else:
+            assert t.type == t_html_tag_end
+            # find a matching tag in the stack
+            spos = _find_in_stack(stack, tag)
+            if spos:
+                pos = _close_stack(stack, spos, tokens, pos)
+                assert tokens[pos] is t
+                del tokens[pos]
+            else:
+                pos += 1
+
+    _close_stack(stack, 1, tokens, pos)
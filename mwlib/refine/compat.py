@@ -4,7 +4,7 @@
 
 from mwlib.refine import core
 from mwlib.parser import nodes as N
-from mwlib.utoken import token as T
+from mwlib.utoken import token as T, token_fields
 from mwlib import nshandling
 
 
@@ -28,7 +28,7 @@ tok2class = {
 
         
 
-def _change_classes(node):
+def _change_classes(node, lazy=False, hooks=()):
     if isinstance(node, T):
         if node.type==T.t_complex_table and node.children:
 
@@ -41,8 +41,16 @@ def _change_classes(node):
             node.children=[]
 
         if node.type==T.t_complex_compat:
-            node.__class__ = node.compatnode.__class__
-            node.__dict__ = node.compatnode.__dict__
+            compatnode = node.compatnode
+            node.__class__ = compatnode.__class__
+            node.__dict__ = compatnode.__dict__
+            # the token fields are slots and not part of the __dict__
+            for name in token_fields:
+                try:
+                    setattr(node, name, getattr(compatnode, name))
+                except AttributeError:
+                    if hasattr(node, name):
+                        delattr(node, name)
             return
         
         if node.type==T.t_magicword:
@@ -178,19 +186,89 @@ def _change_classes(node):
             ns, partial, full = node.nshandler.splitname(node.target)
             if node.namespace is None:
                 node.namespace = node.ns
-            
-                
-            
+
+
+        if lazy:
+            if node.children:
+                node.children = LazyChildren(node.children, hooks)
+            return
+
         node = node.children
-        
+
     if node:
         for x in node:
             _change_classes(x)
 
-    
-    
-def parse_txt(raw, **kwargs):
+
+class ChildList(list):
+    """a LazyChildren list after the conversion"""
+
+    __slots__ = ("hooks", )
+
+    def __reduce_ex__(self, proto):
+        return (list, (list(self), ))
+
+    __reduce__ = __reduce_ex__
+
+
+class LazyChildren(ChildList):
+    """children of a node, which are changed to parser.nodes classes by
+    _change_classes when the list is first used. the hooks are then
+    called with the list, see old_uparser.children_postprocessors, and
+    the list becomes a ChildList. code reading the list from C,
+    e.g. str.join or slice assignment, sees the unconverted tokens.
+    copies and pickles are plain lists"""
+
+    __slots__ = ()
+
+    def __init__(self, children, hooks=()):
+        list.__init__(self, children)
+        self.hooks = hooks
+
+    def convert(self):
+        self.__class__ = ChildList
+        for x in list.__iter__(self):
+            _change_classes(x, lazy=True, hooks=self.hooks)
+        for hook in self.hooks:
+            hook(self)
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        self.convert()
+        return list.__add__(other, self)
+
+    def __reduce_ex__(self, proto):
+        self.convert()
+        return ChildList.__reduce_ex__(self, proto)
+
+    __reduce__ = __reduce_ex__
+
+
+def _converting(name):
+    method = getattr(list, name)
+
+    def f(self, *args, **kw):
+        self.convert()
+        return method(self, *args, **kw)
+    f.__name__ = name
+    return f
+
+for name in ["__len__", "__iter__", "__reversed__", "__contains__", "__getitem__", "__getslice__",
+             "__setitem__", "__setslice__", "__delitem__", "__delslice__",
+             "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__",
+             "__add__", "__iadd__", "__mul__", "__rmul__", "__imul__", "__repr__",
+             "append", "extend", "insert", "pop", "remove", "index", "count", "reverse", "sort"]:
+    setattr(LazyChildren, name, _converting(name))
+del name
+
+
+def parse_txt(raw, lazy=False, hooks=(), **kwargs):
+    """parse raw and return an Article node. with lazy=True the children
+    of a node are converted to parser.nodes classes on first access and
+    hooks are called with them, see LazyChildren"""
+
     sub = core.parse_txt(raw, **kwargs)
     article = T(type=T.t_complex_article, start=0, len=0, children=sub)
-    _change_classes(article)
+    _change_classes(article, lazy=lazy, hooks=hooks)
     return article
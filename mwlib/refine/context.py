@@ -0,0 +1,173 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""refine configuration for a wiki
+
+parse_txt needs a namespace handler, the image modifiers from the
+wiki's magic words and the tag parsers. A RefineContext builds them
+once per siteinfo, language and magic words. get_context caches the
+recently used contexts, so that the articles of a book share one
+context and its refine.fragments.FragmentCache. The worker processes
+refining sections in parallel are kept by the context, too, and are
+stopped when the context is dropped from the cache. Contexts can be pickled; the
+tag parsers are rebuilt and the fragment cache starts empty when
+unpickling.
+"""
+
+from hashlib import sha1
+
+from mwlib import myjson as json
+from mwlib import lrucache, nshandling, workers
+from mwlib.refine import util
+from mwlib.refine.fragments import FragmentCache
+
+
+class RefineContext(object):
+    """magicwords default to the ones in siteinfo"""
+
+    def __init__(self, siteinfo=None, lang=None, magicwords=None):
+        if siteinfo is None:
+            self.nshandler = nshandling.get_nshandler_for_lang(lang)
+        else:
+            self.nshandler = nshandling.nshandler(siteinfo)
+        if magicwords is None and siteinfo is not None:
+            magicwords = siteinfo.get("magicwords")
+        self.lang = lang
+        self.magicwords = magicwords
+        self.imagemod = util.ImageMod(magicwords)
+        self._init()
+
+    def _init(self):
+        from mwlib.refine import core
+        self.parsers = core.get_parsers()
+        self._expander = None
+        self._pool = None
+        self.fragments = FragmentCache()
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["parsers"]
+        del d["_expander"]
+        del d["_pool"]
+        del d["fragments"]
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__ = d
+        self._init()
+
+    def __repr__(self):
+        return "<%s lang=%r>" % (self.__class__.__name__, self.lang)
+
+    def get_expander(self):
+        """return an expander without any templates for parse_txt calls,
+        which do not pass their own. the expander is shared by all
+        these calls, its per article state is reset"""
+
+        from mwlib.expander import Expander, DictDB
+
+        e = self._expander
+        if e is None:
+            e = self._expander = Expander("", "pagename", wikidb=DictDB())
+        else:
+            _reset_expander(e)
+        return e
+
+    def get_pool(self, processes):
+        """return the WorkerPool for refine.core.refine_sections. the
+        workers inherit the context, its nshandler, fragment cache and
+        parsers"""
+
+        pool = self._pool
+        if pool is None or pool.processes != processes:
+            if pool is not None:
+                pool.close()
+            resident = [self, self.nshandler, self.imagemod, self.fragments] + self.parsers
+            pool = self._pool = workers.WorkerPool(processes, resident)
+        return pool
+
+    def close(self):
+        """stop the worker processes of the context"""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+# attributes of an Expander with class level defaults, which are set
+# while expanding an article
+_expander_counters = ["magic_displaytitle", "template_spans", "node_count",
+                      "argument_expansions", "argument_cache_hits"]
+
+
+def _reset_expander(e):
+    """reset the per article state of e as if it was new"""
+
+    from mwlib.templ import budget, memo
+    from mwlib.uniq import Uniquifier
+
+    for name in _expander_counters:
+        e.__dict__.pop(name, None)
+    e.uniquifier = Uniquifier()
+    e.budget = budget.get_default_budget()
+    e.recursion_count = 0
+    e.parsedTemplateCache = {}
+    e.dependencies = {}
+    e.switch_tables = {}
+    e.resolver.__dict__.pop("volatile", None)
+    if e.template_memo is not None:
+        e.template_memo = memo.TemplateMemo(e, maxsize=e.template_memo.cache.maxsize)
+
+
+def _digest(x):
+    if x is None:
+        return None
+    return sha1(json.dumps(x, sort_keys=True)).hexdigest()
+
+# (id(siteinfo), id(magicwords), lang) -> (siteinfo, magicwords, context).
+# holding siteinfo and magicwords keeps their ids from being reused
+_recent = {}
+_max_recent = 16
+
+# (digest(siteinfo), digest(magicwords), lang) -> context. a context
+# may be stored under two keys, see get_context
+_max_contexts = 16
+_contexts = lrucache.lrucache(_max_contexts)
+
+
+def _close_evicted(contexts):
+    """close the contexts, which are no longer cached, and forget them
+    in _recent"""
+
+    live = set(id(c) for c in _contexts.cache.values())
+    for c in contexts:
+        if id(c) not in live:
+            c.close()
+    for key, x in _recent.items():
+        if id(x[2]) not in live:
+            del _recent[key]
+
+
+def get_context(siteinfo=None, lang=None, magicwords=None):
+    """return the RefineContext for siteinfo, lang and magicwords. the
+    same context is returned for equal arguments"""
+
+    key = (id(siteinfo), id(magicwords), lang)
+    x = _recent.get(key)
+    if x is not None:
+        return x[2]
+
+    hkey = (_digest(siteinfo), _digest(magicwords), lang)
+    try:
+        context = _contexts[hkey]
+    except KeyError:
+        old = _contexts.cache.values()
+        context = _contexts[hkey] = RefineContext(siteinfo=siteinfo, lang=lang, magicwords=magicwords)
+        # nshandler may have added missing interwikis to siteinfo
+        _contexts[(_digest(siteinfo), hkey[1], lang)] = context
+        _close_evicted(old)
+
+    if len(_recent) >= _max_recent:
+        _recent.clear()
+    _recent[key] = (siteinfo, magicwords, context)
+    return context
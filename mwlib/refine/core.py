@@ -4,12 +4,17 @@
 # Copyright (c) 2007-2009 PediaPress GmbH
 # See README.rst for additional licensing information.
 
+import time
+import cPickle
+
 from mwlib.utoken import tokenize, show, token as T, walknode, walknodel
 from mwlib.refine import util
 from mwlib import tagext, uniq, nshandling
 
 from mwlib.refine.parse_table import parse_tables, parse_table_cells, parse_table_rows, fix_tables, remove_table_garbage
 from mwlib.refine.tagparser import tagparser
+from mwlib.refine.fragments import detach_fragments, attach_fragments
+from mwlib.refine.tokenbuffer import spliced
 
 try:
     from mwlib.refine import _core
@@ -71,6 +76,7 @@ def parse_inputbox(tokens, xopts):
         if t.tagname=='inputbox':
             t.inputbox = T.join_as_text(t.children)
             del t.children[:]
+parse_inputbox.local = True
 
 def _parse_gallery_txt(txt, xopts):
     lines = [x.strip() for x in txt.split("\n")]
@@ -97,10 +103,14 @@ class bunch(object):
         self.__dict__.update(kw)
         
 class parse_sections(object):
+    local = True
+    types = set([T.t_section])
+
     def __init__(self, tokens, xopts):
         self.tokens = tokens
         self.run()
         
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -159,10 +169,14 @@ class parse_sections(object):
         create()
 
 class parse_urls(object):
+    local = True
+    types = set([T.t_urllink])
+
     def __init__(self, tokens, xopts):
         self.tokens = tokens
         self.run()
         
+    @spliced
     def run(self):
         tokens = self.tokens
         i=0
@@ -190,10 +204,14 @@ class parse_urls(object):
                 
 
 class parse_singlequote(object):
+    local = True
+    types = set([T.t_singlequote])
+
     def __init__(self, tokens, xopts):
         self.tokens = tokens
         self.run()
 
+    @spliced
     def run(self):
         def finish():
             assert len(counts)==len(styles)
@@ -261,6 +279,13 @@ class parse_singlequote(object):
             
         if counts:
             finish()
+
+    py_run = run
+
+    if _core is not None:
+        @spliced
+        def run(self):
+            _core.parse_singlequote(self.tokens)
                 
                     
 class parse_preformatted(object):
@@ -271,6 +296,7 @@ class parse_preformatted(object):
             self.tokens = t
             self.run()
 
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -299,6 +325,9 @@ class parse_preformatted(object):
                 
             
 class parse_lines(object):
+    local = True
+    types = set([T.t_item, T.t_colon])
+
     def __init__(self, tokens, xopts):
         self.tokens = tokens
         self.run()
@@ -393,7 +422,14 @@ class parse_lines(object):
                 lines.insert(startpos, dd)
                 startpos += 1
         del lines[-1] # remove guard
+
+    py_analyze = analyze
+
+    if _core is not None:
+        def analyze(self, lines):
+            _core.analyze_lines(lines)
         
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -453,6 +489,9 @@ class parse_lines(object):
 
         
 class parse_links(object):
+    local = True
+    types = set([T.t_2box_close])
+
     def __init__(self, tokens, xopts):
         self.xopts = xopts
         lang = xopts.lang
@@ -491,6 +530,7 @@ class parse_links(object):
 
     
         
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -598,6 +638,7 @@ class parse_paragraphs(object):
             self.tokens = t
             self.run()
         
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -624,32 +665,123 @@ class parse_paragraphs(object):
         if first:
             create()
 
+    py_run = run
+
+    if _core is not None:
+        @spliced
+        def run(self):
+            _core.parse_paragraphs(self.tokens)
+
     
 
 class combined_parser(object):
-    def __init__(self, parsers):
+    """run parsers one after the other on the tokens. parsers walking
+    the tree themselves (need_walker=False) are called once, all others
+    are called for every token list returned by the default token
+    walker.
+
+    parsers marked with local=True only look at the token list they are
+    called with and modify it or token lists of nodes they create. runs
+    of such parsers are fused: the tree is walked only once and all of
+    them are called on a token list before the next one is visited.
+    token lists created by a fused parser are handed to the parsers
+    following it, so the result is the same as running them one by
+    one. parsers with a types attribute are skipped for token lists
+    without any token of these types. fuse=False runs every parser on
+    every token list.
+
+    if timings is a dict, the seconds spent in every parser are added
+    to timings[name of parser].
+    """
+
+    skip_tags = set(["table", "tr", "@section"])
+
+    def __init__(self, parsers, fuse=True, timings=None):
         self.parsers = parsers
+        self.fuse = fuse
+        self.timings = timings
 
-    def __call__(self, tokens, xopts):
-        parsers = list(self.parsers)
-
-        default_walker = get_token_walker(skip_tags=set(["table", "tr", "@section"]))
-        
-        while parsers:
-            p = parsers.pop()
+    def schedule(self):
+        """return a list of (need_walker, parsers) tuples in the order
+        in which they are run"""
 
+        res = []
+        for p in reversed(self.parsers):
             need_walker = getattr(p, "need_walker", True)
+            local = self.fuse and need_walker and getattr(p, "local", False)
+            if local and res and res[-1][1]:
+                res[-1][2].append(p)
+            else:
+                res.append((need_walker, local, [p]))
+        return [(need_walker, parsers) for need_walker, local, parsers in res]
+
+    def _timed(self, p):
+        if self.timings is None:
+            return p
+
+        name = getattr(p, "__name__", None) or repr(p)
+        timings = self.timings
+
+        def timed(tokens, xopts):
+            stime = time.time()
+            p(tokens, xopts)
+            timings[name] = timings.get(name, 0.0) + time.time() - stime
+        return timed
+
+    def _new_lists(self, tokens, seen):
+        # return the token lists below tokens, which are not in seen
+        res = []
+        todo = [tokens]
+        while todo:
+            for x in todo.pop():
+                children = x.children
+                if children and id(children) not in seen:
+                    seen[id(children)] = children
+                    todo.append(children)
+                    if x.tagname not in self.skip_tags:
+                        res.append(children)
+        return res
+
+    def _run_walker(self, parsers, lists, xopts):
+        if self.fuse:
+            types = [getattr(p, "types", None) for p in parsers]
+        else:
+            types = [None] * len(parsers)
+        parsers = [self._timed(p) for p in parsers]
+        last = len(parsers) - 1
+        if last:
+            seen = dict((id(x), x) for x in lists)
+
+        todo = [(x, 0) for x in reversed(lists)]
+        while todo:
+            tokens, start = todo.pop()
+            present = None
+            for i in range(start, last + 1):
+                if types[i] is not None:
+                    if present is None:
+                        present = set([x.type for x in tokens])
+                    if present.isdisjoint(types[i]):
+                        continue
+                parsers[i](tokens, xopts)
+                present = None
+                if i < last:
+                    for x in self._new_lists(tokens, seen):
+                        todo.append((x, i + 1))
+
+    def __call__(self, tokens, xopts):
+        default_walker = get_token_walker(skip_tags=self.skip_tags)
+
+        for need_walker, parsers in self.schedule():
             if need_walker:
-                # print "using default token walker for", p
-                walker = default_walker
-                for x in walker(tokens):
-                    p(x, xopts)
+                self._run_walker(parsers, default_walker(tokens), xopts)
             else:
-                p(tokens, xopts)
-                
+                self._timed(parsers[0])(tokens, xopts)
+
+
+style_tags = set("abbr tt strike ins del small sup sub b strong cite i u em big font s var kbd".split())
 
 def mark_style_tags(tokens, xopts):
-    tags = set("abbr tt strike ins del small sup sub b strong cite i u em big font s var kbd".split())
+    tags = style_tags
 
     todo = [(0, dict(), tokens)]
 
@@ -723,6 +855,9 @@ def mark_style_tags(tokens, xopts):
 mark_style_tags.need_walker = False
 
 class parse_uniq(object):
+    local = True
+    types = set([T.t_uniq])
+
     def __init__(self, tokens, xopts):
         self.tagextensions=tagext.default_registry
 
@@ -927,6 +1062,8 @@ def fix_named_url_double_brackets(tokens, xopt):
             tokens[idx+1].type = T.t_urllink
         idx += 1
     fix_urllink_inside_link(tokens, xopt)
+fix_named_url_double_brackets.local = True
+fix_named_url_double_brackets.types = set([T.t_2box_open, T.t_urllink])
     
     
 def fix_break_between_pre(tokens, xopt):
@@ -938,6 +1075,8 @@ def fix_break_between_pre(tokens, xopt):
             idx += 2
         else:
             idx+=1
+fix_break_between_pre.local = True
+fix_break_between_pre.types = set([T.t_break])
 
 def fixlitags(tokens, xopts):
     root = T(type=T.t_complex_tag, tagname="div")
@@ -963,29 +1102,10 @@ def fixlitags(tokens, xopts):
                 todo.append((t, t.children))
 fixlitags.need_walker = False
 
-def parse_txt(txt, xopts=None, **kwargs):
-    if xopts is None:
-        xopts = XBunch(**kwargs)
-    else:
-        xopts.__dict__.update(**kwargs)
-
-    if xopts.expander is None:
-        from mwlib.expander import Expander,  DictDB    
-        xopts.expander = Expander("", "pagename", wikidb=DictDB())
-            
-    if xopts.nshandler is None:
-        xopts.nshandler = nshandling.get_nshandler_for_lang(xopts.lang or 'en')
-    
-    xopts.imagemod = util.ImageMod(xopts.magicwords)
-
-    uniquifier = xopts.uniquifier
-    if uniquifier is None:
-        uniquifier = uniq.Uniquifier()
-        txt = uniquifier.replace_tags(txt)
-        xopts.uniquifier = uniquifier
+def get_parsers():
+    """return a new list of the parsers run by parse_txt. the parsers
+    are run in reverse order"""
 
-    tokens = tokenize(txt, uniquifier=uniquifier)
-    
     td2 =  tagparser()
     a = td2.add
     
@@ -1013,7 +1133,8 @@ def parse_txt(txt, xopts=None, **kwargs):
         td_parse_h.add("h%s" % i, i)
         
         
-    parsers = [fixlitags,
+    parsers = [attach_fragments,
+               fixlitags,
                mark_style_tags,
                parse_singlequote,
                parse_preformatted,
@@ -1027,12 +1148,216 @@ def parse_txt(txt, xopts=None, **kwargs):
                parse_inputbox,
                td_parse_h, 
                parse_sections,
+               detach_fragments,
                remove_table_garbage, 
                fix_tables, 
                parse_tables,
                parse_uniq,
                fix_named_url_double_brackets, 
                fix_break_between_pre]
+    return parsers
+
+# parsers run on the whole token list before it is split into sections.
+# parse_uniq uses the expander and its wikidb, which stay in the parent
+# process
+pre_section_parsers = [parse_uniq, fix_named_url_double_brackets, fix_break_between_pre]
+
+def run_parsers(tokens, xopts, parsers):
+    combined_parser(parsers, fuse=not xopts.nofuse, timings=xopts.timings)(tokens, xopts)
+
+def split_sections(tokens):
+    """split tokens before section headings, which can be refined
+    independently of the tokens before them: the heading starts a
+    line and is not inside of a table, a link, an external link or an
+    html tag. misnested html tags or style tags, which may be moved
+    out of a table by remove_table_garbage, stop splitting. return a
+    list of token lists
+    """
+
+    res = []
+    start = 0
+    stuck = False
+    stack = []  # open html tags, "table" for tables
+    saved = []  # state outside of the open tables
+    boxes = 0
+    url = row = cell = False
+
+    for i, t in enumerate(tokens):
+        tp = t.type
+        if tp == T.t_section:
+            if i > start and not (stuck or stack or boxes or url) and tokens[i - 1].type == T.t_newline:
+                res.append(tokens[start:i])
+                start = i
+        elif tp == T.t_begintable or (tp == T.t_html_tag and t.rawtagname == "table"):
+            stack.append("table")
+            saved.append((boxes, url, row, cell))
+            boxes = 0
+            url = row = cell = False
+        elif tp == T.t_endtable or (tp == T.t_html_tag_end and t.rawtagname == "table"):
+            if saved:
+                while stack.pop() != "table":
+                    pass
+                boxes, url, row, cell = saved.pop()
+        elif tp == T.t_row or (tp == T.t_html_tag and t.rawtagname == "tr"):
+            row = True
+            cell = False
+        elif tp == T.t_column or (tp == T.t_html_tag and t.rawtagname in ("td", "th")):
+            row = cell = True
+        elif tp == T.t_html_tag_end and t.rawtagname in ("tr", "td", "th"):
+            row = t.rawtagname != "tr"
+            cell = False
+        elif tp == T.t_2box_open:
+            boxes += 1
+        elif tp == T.t_2box_close:
+            if boxes:
+                boxes -= 1
+            url = False
+        elif tp == T.t_urllink:
+            url = True
+        elif tp == T.t_special and t.text == "]":
+            url = False
+        elif tp == T.t_html_tag or tp == T.t_html_tag_end:
+            name = t.rawtagname
+            if name in style_tags and row and not cell:
+                stuck = True
+            if tp == T.t_html_tag_end:
+                if stack and stack[-1] == name:
+                    stack.pop()
+                elif name in stack:
+                    stuck = True
+            elif not t.tag_selfClosing and name not in ("br", "hr"):
+                stack.append(name)
+
+    res.append(tokens[start:])
+    return res
+
+def stitch_sections(chunks):
+    """join the refined token lists returned by split_sections and nest
+    their sections like parse_sections does"""
+
+    res = []
+    sections = []
+    for tokens in chunks:
+        for t in tokens:
+            if t.type != T.t_complex_section:
+                res.append(t)
+                continue
+
+            while sections and t.level <= sections[-1].level:
+                sections.pop()
+            if sections:
+                sections[-1].children.append(t)
+            else:
+                res.append(t)
+
+            sections.append(t)
+            while t.children[-1].type == T.t_complex_section:
+                t = t.children[-1]
+                sections.append(t)
+    return res
+
+def _section_end():
+    # a level 1 heading ending the last section of a chunk like the
+    # heading starting the next chunk does
+    return [T(type=T.t_section, text=u"="), T(type=T.t_section_end, text=u"=")]
+
+def _refine_chunk(job, tokens):
+    options, parsers = job
+    xopts = XBunch(**options)
+    xopts.processes = None
+    if xopts.timings is not None:
+        xopts.timings = {}
+    run_parsers(tokens, xopts, parsers)
+    return tokens, xopts.timings
+
+def _refine_chunks_parallel(chunks, xopts, parsers, source):
+    """refine the chunks in the worker processes of the context. returns
+    None if xopts cannot be pickled"""
+
+    pool = xopts.context.get_pool(xopts.processes)
+    shared = [source, xopts.nshandler, xopts.expander, xopts.wikidb, xopts.uniquifier]
+    try:
+        results = pool.imap(_refine_chunk, (xopts.__dict__, parsers), chunks, shared)
+    except (TypeError, cPickle.PicklingError):
+        return None
+
+    res = [None] * len(chunks)
+    for i, (tokens, timings) in results:
+        res[i] = tokens
+        if timings:
+            for name, seconds in timings.items():
+                xopts.timings[name] = xopts.timings.get(name, 0.0) + seconds
+    return res
+
+def refine_sections(tokens, xopts):
+    """refine tokens section by section like parse_txt would. the
+    sections are refined in xopts.processes worker processes of the
+    context, if it is greater than 1"""
+
+    parsers = xopts.context.parsers
+    pre = [p for p in parsers if p in pre_section_parsers]
+    parsers = [p for p in parsers if p not in pre_section_parsers]
+    source = tokens[0].source if tokens else None
+
+    run_parsers(tokens, xopts, pre)
+    chunks = split_sections(tokens)
+    if len(chunks) == 1:
+        run_parsers(tokens, xopts, parsers)
+        return tokens
+
+    for x in chunks[:-1]:
+        x.extend(_section_end())
+
+    refined = None
+    if xopts.processes > 1:
+        refined = _refine_chunks_parallel(chunks, xopts, parsers, source)
+    if refined is None:
+        for x in chunks:
+            run_parsers(x, xopts, parsers)
+    else:
+        chunks = refined
+
+    for x in chunks[:-1]:
+        end = x.pop()
+        assert end.type == T.t_complex_section and end.level == 1, "chunk does not end with a section"
+    return stitch_sections(chunks)
+
+def parse_txt(txt, xopts=None, **kwargs):
+    if xopts is None:
+        xopts = XBunch(**kwargs)
+    else:
+        xopts.__dict__.update(**kwargs)
+
+    context = xopts.context
+    if context is None:
+        from mwlib.refine.context import get_context
+        context = xopts.context = get_context(lang=xopts.lang or 'en', magicwords=xopts.magicwords)
+
+    if xopts.expander is None:
+        xopts.expander = context.get_expander()
+            
+    if xopts.nshandler is None:
+        xopts.nshandler = context.nshandler
     
-    combined_parser(parsers)(tokens, xopts)
+    xopts.imagemod = context.imagemod
+
+    uniquifier = xopts.uniquifier
+    if uniquifier is None:
+        uniquifier = uniq.Uniquifier()
+        txt = uniquifier.replace_tags(txt)
+        xopts.uniquifier = uniquifier
+        # the spans refer to the text before replace_tags
+        xopts.template_spans = None
+
+    if xopts.template_spans and xopts.template_source is None:
+        # and not to the texts of nested parse_txt calls, e.g. for refs
+        xopts.template_source = txt
+
+    tokens = tokenize(txt, uniquifier=uniquifier)
+
+    if xopts.split_sections:
+        return refine_sections(tokens, xopts)
+
+    run_parsers(tokens, xopts, context.parsers)
     return tokens
+
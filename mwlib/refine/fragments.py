@@ -0,0 +1,184 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""reuse the parsed tables of template expansions
+
+Navigation boxes and footers expand to the same tables in many articles
+of a book. parse_txt gets the spans of the outermost template expansions
+in its input (Expander.template_spans) and a FragmentCache, which is
+shared by the articles (RefineContext.fragments).
+
+A table filling such a span and starting a line is refined as usual the
+first time and its children are stored in the cache. In later articles
+detach_fragments replaces the children of a table with the same text by
+an empty node after parse_tables. The remaining parsers treat this table
+like the full one, and attach_fragments finally sets a copy of the
+cached children.
+"""
+
+import re
+
+from mwlib import lrucache
+from mwlib.utoken import token as T
+
+
+class FragmentCache(object):
+    """text of a table -> its refined children. the children are copies
+    with source set to the text of the table and start relative to it.
+    the least recently used tables are dropped, when more than
+    max_entries are stored"""
+
+    # tables shorter than this are parsed again
+    min_size = 1000
+    max_entries = 500
+
+    def __init__(self):
+        self.fragments = lrucache.lrucache(self.max_entries)
+        self.wikidb = None
+
+    def __len__(self):
+        return len(self.fragments.cache)
+
+    def clear(self):
+        self.fragments = lrucache.lrucache(self.max_entries)
+
+    def check_wikidb(self, wikidb):
+        # link urls come from the wikidb
+        if wikidb is not self.wikidb:
+            self.clear()
+            self.wikidb = wikidb
+
+    def get(self, txt, source, start):
+        """return a copy of the children stored for txt, which starts at
+        start in source, or None"""
+
+        try:
+            children = self.fragments[txt]
+        except KeyError:
+            return None
+        return clone_tokens(children, start, source)
+
+    def put(self, txt, children, start):
+        self.fragments[txt] = clone_tokens(children, -start, txt)
+
+
+def clone_tokens(tokens, delta, source):
+    """return a copy of the token tree tokens. start is moved by delta
+    and source is replaced by source"""
+
+    res = []
+    new = object.__new__
+    for t in tokens:
+        c = new(t.__class__)
+        c.type = t.type
+        start = t.start
+        c.start = start + delta if start is not None else None
+        c.len = t.len
+        c.source = source if t.source is not None else None
+        # the text may differ from the source, e.g. for entities
+        c._text = getattr(t, "_text", None)
+        d = t.__dict__
+        if d:
+            d = c.__dict__ = d.copy()
+            children = d.get("children")
+            if children:
+                d["children"] = clone_tokens(children, delta, source)
+            vlist = d.get("vlist")
+            if vlist:
+                vlist = d["vlist"] = dict(vlist)
+                if isinstance(vlist.get("style"), dict):
+                    vlist["style"] = dict(vlist["style"])
+        res.append(c)
+    return res
+
+
+def _get_source(tokens):
+    todo = [tokens]
+    while todo:
+        for t in todo.pop():
+            if t.source is not None:
+                return t.source
+            if t.children:
+                todo.append(t.children)
+    return None
+
+
+# links to subpages depend on the title of the article
+_unsafe_rx = re.compile(r"\[\[\s*/|\x7f")
+
+
+def _candidates(tokens, xopts):
+    # yield (index, text, source) of tables filling a template span
+    spans = xopts.template_spans
+    fragments = xopts.fragments
+    if not spans or fragments is None or not tokens:
+        return
+
+    source = _get_source(tokens)
+    if source is None or source is not xopts.template_source:
+        return
+
+    starts = {}
+    for start, end, name in spans:
+        if end - start < fragments.min_size:
+            continue
+        txt = source[start:end]
+        start += len(txt) - len(txt.lstrip())
+        end = start + len(txt.strip())
+        if start and source[start - 1] != "\n":
+            continue
+        starts[start] = end
+
+    if not starts:
+        return
+
+    for i, t in enumerate(tokens):
+        if t.type != T.t_complex_table or t.start not in starts:
+            continue
+        end = starts[t.start]
+        if i + 1 < len(tokens):
+            if tokens[i + 1].start != end:
+                continue
+        elif end != len(source):
+            continue
+
+        txt = source[t.start:end]
+        if _unsafe_rx.search(txt):
+            continue
+        yield i, txt, source
+
+
+def detach_fragments(tokens, xopts):
+    fragments = xopts.fragments
+    if fragments is None:
+        return
+    fragments.check_wikidb(xopts.wikidb)
+
+    todo = []
+    for i, txt, source in _candidates(tokens, xopts):
+        t = tokens[i]
+        # copy the children now, the entry may be dropped before
+        # attach_fragments
+        cached = fragments.get(txt, source, t.start)
+        if cached is not None:
+            # parsers look at tables with children only
+            t.children = [T(type=T.t_complex_node)]
+        todo.append((t, txt, source, cached))
+    if todo:
+        xopts.detached_fragments = (xopts.detached_fragments or []) + todo
+detach_fragments.need_walker = False
+
+
+def attach_fragments(tokens, xopts):
+    todo = xopts.detached_fragments
+    if not todo:
+        return
+    xopts.detached_fragments = None
+
+    fragments = xopts.fragments
+    for t, txt, source, cached in todo:
+        if cached is not None:
+            t.children = cached
+        elif t.children:
+            fragments.put(txt, t.children, t.start)
+attach_fragments.need_walker = False
@@ -5,6 +5,7 @@
 
 from mwlib.utoken import show, token as T
 from mwlib.refine import util
+from mwlib.refine.tokenbuffer import spliced
 
 class parse_table_cells(object):
     def __init__(self, tokens, xopts):
@@ -127,6 +128,7 @@ class parse_table_rows(object):
     def is_table_cell_start(self, token):
         return token.type==T.t_column or (token.type==T.t_html_tag and token.rawtagname in ("td", "th"))
     
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -193,6 +195,9 @@ class parse_table_rows(object):
             parse_table_cells(sub, self.xopts)
         
 class parse_tables(object):
+    local = True
+    types = set([T.t_begintable, T.t_html_tag])
+
     def __init__(self, tokens, xopts):
         self.xopts = xopts
         self.tokens = tokens
@@ -260,6 +265,7 @@ class parse_tables(object):
                 
             i += 1
             
+    @spliced
     def run(self):
         tokens = self.tokens
         i = 0
@@ -299,6 +305,8 @@ class parse_tables(object):
             maketable()
         
 class fix_tables(object):
+    local = True
+
     def __init__(self, tokens, xopts):
         self.xopts = xopts
         self.tokens = tokens
@@ -6,6 +6,12 @@
 
 import sys
 from mwlib.utoken import token as T
+from mwlib.refine.tokenbuffer import spliced
+
+try:
+    from mwlib.refine import _core
+except ImportError:
+    _core = None
 
 class taginfo(object):
     def __init__(self, tagname=None, prio=None, blocknode=False,  nested=True):
@@ -16,6 +22,9 @@ class taginfo(object):
         self.blocknode = blocknode
                  
 class tagparser(object):
+    local = True
+    types = set([T.t_html_tag, T.t_html_tag_end])
+
     def __init__(self, tags=[]):
         self.name2tag = name2tag = {}
         for t in tags:
@@ -23,6 +32,9 @@ class tagparser(object):
 
         self.guard = (None, taginfo(tagname="", prio=sys.maxint, nested=True, blocknode=False))
 
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, " ".join(sorted(self.name2tag)))
+
     def add(self, tagname=None,  prio=None, blocknode=False, nested=True):
         t = taginfo(tagname=tagname, prio=prio, blocknode=blocknode, nested=nested)
         self.name2tag[t.tagname] = t
@@ -64,6 +76,12 @@ class tagparser(object):
     
     
     def __call__(self, tokens,  xopts):
+        self.tokens = tokens
+        self.run()
+
+    @spliced
+    def run(self):
+        tokens = self.tokens
         pos=0
         self.stack = stack = [self.guard]
         get = self.name2tag.get
@@ -100,3 +118,10 @@ class tagparser(object):
                     pos += 1
                     
         self.close_stack(1, tokens, pos)
+
+    py_run = run
+
+    if _core is not None:
+        @spliced
+        def run(self):
+            _core.parse_tags(self.tokens, self.name2tag, self.guard)
@@ -2,9 +2,10 @@
 # Copyright (c) 2007-2009 PediaPress GmbH
 # See README.rst for additional licensing information.
 
-from mwlib import expander, nshandling, metabook
+from mwlib import expander, metabook, conf
 from mwlib.log import Log
 from mwlib.refine import core, compat
+from mwlib.refine.context import get_context
 
 log = Log('refine.uparser')
 
@@ -15,8 +16,14 @@ def parseString(
     revision=None,
     lang=None,
     magicwords=None,
-    expandTemplates=True):
-    """parse article with title from raw mediawiki text"""
+    expandTemplates=True,
+    context=None,
+    lazy=False):
+    """parse article with title from raw mediawiki text. context is the
+    refine.context.RefineContext to use, by default the one for the
+    siteinfo of wikidb. with lazy=True the nodes are converted to
+    parser.nodes classes when they are first accessed, see
+    refine.compat.LazyChildren"""
 
     uniquifier = None
     siteinfo = None
@@ -31,10 +38,22 @@ def parseString(
         assert raw is not None, "cannot get article %r" % (title,)
     input = raw
     te = None
+    template_spans = None
     if wikidb:
         if expandTemplates:
             te = expander.Expander(raw, pagename=title, wikidb=wikidb)
-            input = te.expandTemplates(True)
+            te.record_template_spans = conf.reuse_fragments
+            store = None
+            if hasattr(wikidb, "get_expansion_store"):
+                store = wikidb.get_expansion_store()
+            input = None
+            if store is not None:
+                input = store.get(te, raw)
+            if input is None:
+                input = te.expandTemplates(True)
+                template_spans = te.template_spans
+                if store is not None:
+                    store.put(te, raw, input)
             uniquifier = te.uniquifier
         if hasattr(wikidb, 'get_siteinfo'):
             siteinfo = wikidb.get_siteinfo()
@@ -55,19 +74,27 @@ def parseString(
             else:
                 magicwords = src.get('magicwords')
 
-    if siteinfo is None:
-        nshandler = nshandling.get_nshandler_for_lang(lang)
-    else:
-        nshandler = nshandling.nshandler(siteinfo)
-    a = compat.parse_txt(input, title=title, wikidb=wikidb, nshandler=nshandler, lang=lang, magicwords=magicwords, uniquifier=uniquifier, expander=te)
+    if context is None:
+        context = get_context(siteinfo=siteinfo, lang=lang, magicwords=magicwords)
+    fragments = None
+    if template_spans:
+        fragments = context.fragments
+    from mwlib.old_uparser import postprocessors, children_postprocessors
+    hooks = ()
+    if lazy:
+        hooks = children_postprocessors
+
+    a = compat.parse_txt(input, title=title, wikidb=wikidb, nshandler=context.nshandler, lang=lang, magicwords=magicwords, uniquifier=uniquifier, expander=te, context=context,
+                         split_sections=conf.split_sections, processes=conf.refine_processes,
+                         template_spans=template_spans, fragments=fragments, lazy=lazy, hooks=hooks)
 
     a.caption = title
     if te and te.magic_displaytitle:
         a.caption = te.magic_displaytitle
 
-    from mwlib.old_uparser import postprocessors
-    for x in postprocessors:
-        x(a, title=title, revision=revision, wikidb=wikidb, lang=lang)
+    if not lazy:
+        for x in postprocessors:
+            x(a, title=title, revision=revision, wikidb=wikidb, lang=lang)
 
     return a
 
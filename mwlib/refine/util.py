@@ -6,18 +6,18 @@ import re
 import htmlentitydefs
 
 paramrx = re.compile(r"(?P<name>\w+)\s*=\s*(?P<value>(?:(?:\".*?\")|(?:\'.*?\')|(?:(?:\w|[%:#])+)))", re.DOTALL)
+def style2dict(s):
+    res = {}
+    for x in s.split(';'):
+        if ':' in x:
+            var, value = x.split(':', 1)
+            var = var.strip().lower()
+            value = value.strip()
+            res[var] = value
+
+    return res
+
 def parseParams(s):
-    def style2dict(s):
-        res = {}
-        for x in s.split(';'):
-            if ':' in x:
-                var, value = x.split(':', 1)
-                var = var.strip().lower()
-                value = value.strip()
-                res[var] = value
-
-        return res
-    
     def maybeInt(v):
         try:
             return int(v)
@@ -66,6 +66,7 @@ class ImageMod(object):
 
     def __init__(self, magicwords=None):        
         self.alias_map = {}
+        self.alias_rx = None
         self.initAliasMap(self.default_magicwords)
         if magicwords is not None:
             self.initAliasMap(magicwords)
@@ -84,11 +85,13 @@ class ImageMod(object):
             elif name in ['img_alt', 'img_link']:
                 aliases_regexp = aliases_regexp.replace('\\$1', '(.*)')
             self.alias_map[name] = aliases_regexp
+        self.alias_rx = None
 
     def parse(self, mod):
         mod = mod.lower().strip()
-        for mod_type, mod_reg in self.alias_map.items():
-            rx = re.compile(mod_reg, re.IGNORECASE)
+        if self.alias_rx is None:
+            self.alias_rx = [(mod_type, re.compile(mod_reg, re.IGNORECASE)) for mod_type, mod_reg in self.alias_map.items()]
+        for mod_type, rx in self.alias_rx:
             mo = rx.match(mod)
             if mo:
                 for match in  mo.groups()[::-1]:
@@ -0,0 +1,142 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""limit the work done when expanding the templates of an article
+
+ExpansionBudget limits the number of nodes evaluated, the number of
+characters produced by templates and the wall time per article. The
+cost of every template invocation (excluding the templates it calls
+itself) is accounted per template name. Once the budget is exhausted,
+further template invocations produce no output.
+"""
+
+import time
+
+from mwlib.templ import log
+
+
+class ExpansionBudget(object):
+    reported = False  # set by the Expander after logging report()
+
+    def __init__(self, max_nodes=0, max_output=0, max_time=0):
+        # 0 means no limit
+        self.max_nodes = max_nodes
+        self.max_output = max_output
+        self.max_time = max_time
+
+        self.starttime = time.time()
+        self.output = 0
+        self.exhausted = None   # reason, once the budget is exhausted
+        self.costs = {}         # template name -> [calls, nodes, output, seconds]
+        self.skipped = {}       # template name -> number of invocations skipped
+        self.stack = []
+
+    def __repr__(self):
+        return "<%s exhausted=%r output=%s>" % (self.__class__.__name__, self.exhausted, self.output)
+
+    def _check(self, expander):
+        if self.max_nodes and expander.node_count > self.max_nodes:
+            self.exhausted = "more than %s nodes evaluated" % (self.max_nodes,)
+        elif self.max_output and self.output > self.max_output:
+            self.exhausted = "more than %s characters produced" % (self.max_output,)
+        elif self.max_time and time.time() - self.starttime > self.max_time:
+            self.exhausted = "expansion took more than %ss" % (self.max_time,)
+
+        if self.exhausted is not None:
+            log.warn("expansion budget of %r exhausted: %s" % (expander.pagename, self.exhausted))
+
+    def _measure(self, frame, res):
+        # add the length of the items appended to res since the last
+        # call to frame's output. the items are measured once, the
+        # callees add their output to the caller when they leave
+        n = len(res)
+        pos = frame[4]
+        if pos < n:
+            frame[5] += sum(map(len, res[pos:n]))
+        frame[4] = n
+
+    def enter(self, name, expander, res):
+        """called before template name is expanded to res. return False,
+        if the budget is exhausted and the template must be skipped"""
+
+        if self.exhausted is None:
+            self._check(expander)
+        if self.exhausted is not None:
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return False
+
+        if self.stack:
+            caller = self.stack[-1]
+            if caller[3] is res:
+                self._measure(caller, res)
+
+        # name, nodes, time, res, measured position and output, and
+        # nodes, time and output of all callees
+        self.stack.append([name, expander.node_count, time.time(), res, len(res), 0, 0, 0.0, 0])
+        return True
+
+    def leave(self, expander, res):
+        """called after the template passed to the matching enter call
+        has been expanded"""
+
+        frame = self.stack.pop()
+        self._measure(frame, res)
+        name, nodes, stime, res, pos, output, callee_nodes, callee_time, callee_output = frame
+        nodes = expander.node_count - nodes
+        seconds = time.time() - stime
+
+        if self.stack:
+            caller = self.stack[-1]
+            caller[6] += nodes
+            caller[7] += seconds
+            caller[8] += output
+            if caller[3] is res:
+                # the caller measures the items appended after this call
+                caller[4] = len(res)
+                caller[5] += output
+
+        output -= callee_output
+        self.output += output
+
+        try:
+            cost = self.costs[name]
+        except KeyError:
+            cost = self.costs[name] = [0, 0, 0, 0.0]
+        cost[0] += 1
+        cost[1] += nodes - callee_nodes
+        cost[2] += output
+        cost[3] += seconds - callee_time
+
+    def get_stats(self):
+        return dict(exhausted=self.exhausted, output=self.output,
+                    seconds=time.time() - self.starttime,
+                    skipped=sum(self.skipped.values()))
+
+    def report(self, limit=10):
+        """return a description of the templates, which consumed most
+        of the budget"""
+
+        lines = []
+        if self.exhausted is not None:
+            lines.append("expansion budget exhausted: %s" % (self.exhausted,))
+        costs = sorted(self.costs.items(), key=lambda x: (-x[1][1], x[0]))
+        for name, (calls, nodes, output, seconds) in costs[:limit]:
+            lines.append("%-30r calls=%-6s nodes=%-8s output=%-8s time=%.2fs" % (name, calls, nodes, output, seconds))
+        if self.skipped:
+            lines.append("skipped: %s" % (", ".join("%r (%s)" % x for x in sorted(self.skipped.items())),))
+        return "\n".join(lines)
+
+
+def get_default_budget():
+    """return a budget with the limits configured via the
+    expander.max_nodes, expander.max_output and expander.max_time
+    settings (MWLIB_EXPANDER_MAX_NODES, ...) or None, if all of them
+    are 0"""
+
+    from mwlib import conf
+    max_nodes = conf.get("expander", "max_nodes", 20000000, int)
+    max_output = conf.get("expander", "max_output", 32 * 1024 * 1024, int)
+    max_time = conf.get("expander", "max_time", 120, float)
+    if not (max_nodes or max_output or max_time):
+        return None
+    return ExpansionBudget(max_nodes=max_nodes, max_output=max_output, max_time=max_time)
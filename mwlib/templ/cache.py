@@ -0,0 +1,250 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""persistent, content-addressed cache of parsed templates
+
+The cache maps a hash of a template's raw text, the magic word aliases
+of the siteinfo used for parsing, the included flag and the set of
+registered tag extensions to the optimized templ.nodes tree. Trees are
+kept in an in-process lrucache and pickled to a directory, which may be
+shared between processes on the same machine.
+
+Parsing a template replaces tags with uniq markers. Cached trees are
+therefore parsed with a uniquifier whose random string is derived from
+the cache key, and the replacements are stored along with the tree.
+The dispatch tables of #switch nodes are built before a tree is stored.
+"""
+
+import os
+import cPickle
+import tempfile
+import threading
+from hashlib import sha1
+
+from mwlib import lrucache, uniq
+
+format_version = 2
+
+
+def magicwords_fingerprint(siteinfo):
+    if siteinfo is None:
+        from mwlib.siteinfo import get_siteinfo
+        siteinfo = get_siteinfo("en")
+
+    res = []
+    for d in siteinfo.get("magicwords", []):
+        res.append(u"%s=%s" % (d["name"], u"|".join(d["aliases"])))
+    res.sort()
+    return u"\n".join(res)
+
+
+def tagext_fingerprint():
+    from mwlib import tagext
+    return u" ".join(sorted(tagext.default_registry.names()))
+
+
+class TemplateCache(object):
+    """cache parsed templates in memory and in directory path
+
+    at most maxsize bytes are kept on disk. the least recently used
+    files are removed when this limit is exceeded.
+    """
+
+    def __init__(self, path, maxsize=256 * 1024 * 1024, memsize=2000):
+        self.path = path
+        self.maxsize = maxsize
+        self.mem = lrucache.mt_lrucache(memsize)
+        self.lock = threading.Lock()
+        self.disksize = None
+        self._siteinfo_fingerprints = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+
+    def __repr__(self):
+        return "<%s %r hits=%s disk_hits=%s misses=%s>" % (
+            self.__class__.__name__, self.path, self.hits, self.disk_hits, self.misses)
+
+    def get_stats(self):
+        return dict(hits=self.hits, disk_hits=self.disk_hits,
+                    misses=self.misses, evictions=self.evictions)
+
+    def make_key(self, raw, included=True, siteinfo=None):
+        try:
+            fp = self._siteinfo_fingerprints[id(siteinfo)][1]
+        except KeyError:
+            fp = magicwords_fingerprint(siteinfo)
+            # keep a reference to siteinfo, so that its id is not reused
+            self._siteinfo_fingerprints[id(siteinfo)] = (siteinfo, fp)
+
+        h = sha1()
+        h.update("%s\0%s\0" % (format_version, int(bool(included))))
+        h.update(fp.encode("utf-8"))
+        h.update("\0")
+        h.update(tagext_fingerprint().encode("utf-8"))
+        h.update("\0")
+        h.update(raw.encode("utf-8"))
+        return h.hexdigest()
+
+    def _getpath(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def __getitem__(self, key):
+        try:
+            res = self.mem[key]
+            self.hits += 1
+            return res
+        except KeyError:
+            pass
+
+        fn = self._getpath(key)
+        try:
+            data = open(fn, "rb").read()
+            res = cPickle.loads(data)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            self.misses += 1
+            raise KeyError(key)
+
+        try:
+            os.utime(fn, None)
+        except OSError:
+            pass
+
+        self.disk_hits += 1
+        self.mem[key] = res
+        return res
+
+    def __setitem__(self, key, value):
+        self.mem[key] = value
+
+        data = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+        fn = self._getpath(key)
+        dirname = os.path.dirname(fn)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            os.rename(tmp, fn)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return
+
+        self.lock.acquire()
+        try:
+            if self.disksize is None:
+                self.disksize = self._scan_size()
+            else:
+                self.disksize += len(data)
+            if self.disksize > self.maxsize:
+                self.purge()
+        finally:
+            self.lock.release()
+
+    def _listfiles(self):
+        res = []
+        for d in os.listdir(self.path):
+            dirname = os.path.join(self.path, d)
+            if not os.path.isdir(dirname):
+                continue
+            for fn in os.listdir(dirname):
+                if fn.startswith("."):
+                    continue
+                fn = os.path.join(dirname, fn)
+                try:
+                    st = os.stat(fn)
+                except OSError:
+                    continue
+                res.append((st.st_mtime, st.st_size, fn))
+        return res
+
+    def _scan_size(self):
+        return sum(size for mtime, size, fn in self._listfiles())
+
+    def purge(self):
+        """remove least recently used files until the cache uses at
+        most 80% of maxsize bytes"""
+
+        files = self._listfiles()
+        files.sort()
+        size = sum(size for mtime, size, fn in files)
+        limit = self.maxsize * 0.8
+        for mtime, fsize, fn in files:
+            if size <= limit:
+                break
+            try:
+                os.unlink(fn)
+            except OSError:
+                continue
+            size -= fsize
+            self.evictions += 1
+        self.disksize = size
+
+    def parse(self, raw, uniquifier, included=True, siteinfo=None):
+        """parse template source raw and register the uniq markers
+        contained in the result with uniquifier"""
+
+        from mwlib.templ import parser, nodes
+
+        key = self.make_key(raw, included=included, siteinfo=siteinfo)
+        try:
+            tree, uniq2repl = self[key]
+        except KeyError:
+            u = uniq.Uniquifier(random_string=key[:16])
+            tree = parser.parse(raw, included=included, replace_tags=u.replace_tags, siteinfo=siteinfo)
+            # share #switch tables between expanders and processes
+            nodes.init_switchnodes(tree)
+            uniq2repl = u.uniq2repl
+            self[key] = (tree, uniq2repl)
+
+        if uniq2repl:
+            uniquifier.uniq2repl.update(uniq2repl)
+        return tree
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path, maxsize=256 * 1024 * 1024):
+    """return the TemplateCache for directory path. all callers in
+    this process share the same instance"""
+
+    path = os.path.abspath(path)
+    _caches_lock.acquire()
+    try:
+        try:
+            return _caches[path]
+        except KeyError:
+            c = _caches[path] = TemplateCache(path, maxsize=maxsize)
+            return c
+    finally:
+        _caches_lock.release()
+
+
+def get_default_cache():
+    """return the cache configured via the expander.template_cache_dir
+    setting (MWLIB_EXPANDER_TEMPLATE_CACHE_DIR) or None"""
+
+    from mwlib import conf
+    path = conf.get("expander", "template_cache_dir", None)
+    if not path:
+        return None
+    maxsize = conf.get("expander", "template_cache_size", 256 * 1024 * 1024, int)
+    return get_cache(path, maxsize=maxsize)
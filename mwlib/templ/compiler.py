@@ -0,0 +1,189 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""compile parsed templates to a flat list of instructions
+
+evaluate.flatten walks the parsed tree recursively. Program runs an
+instruction list instead, where nested lists, tuples and plain Nodes
+are inlined and #if and {{{variables}}} get their own instructions.
+Every other node is called via its flatten method. The arguments of
+templates with a constant name are compiled as well.
+
+Each instruction records the recursion depth at which flatten would
+have been called for its node, relative to the recursion count on
+entry to Program.flatten. The expander's recursion_count is set to the
+same value the recursive walk would use before leaving the instruction
+list, so the output, including recursion limit handling, is exactly
+the same as with the recursive walk.
+"""
+
+from mwlib.templ.nodes import Node, IfNode, Variable, Template
+from mwlib.templ.evaluate import flatten, equalsplit, _insert_implicit_newlines, maybe_newline, dummy_mark
+
+# opcodes
+LIT = 0     # (LIT, text)
+VAR = 1     # (VAR, depth, name, default)
+IF = 2      # (IF, depth, cond, then, else)
+CALL = 3    # (CALL, depth, node)
+
+_ebad = unichr(0xebad)
+
+
+class CompiledTemplate(Template):
+    """template with a constant name, whose arguments are compiled"""
+
+    def _get_args(self):
+        try:
+            return self.args
+        except AttributeError:
+            pass
+        self.args = tuple(compile(x) for x in self[1])
+        return self.args
+
+
+class _compiler(object):
+    def __init__(self):
+        self.maxdepth = -1
+
+    def compile_sub(self, node, depth):
+        """compile node as passed to flatten"""
+        code = []
+        self.compile_node(node, depth, code)
+        return code
+
+    def compile_node(self, node, depth, code):
+        if isinstance(node, (unicode, str)):
+            code.append((LIT, node))
+            return
+
+        if depth > self.maxdepth:
+            self.maxdepth = depth
+
+        t = type(node)
+        if t is list or t is tuple or t is Node:
+            for x in node:
+                self.compile_node(x, depth + 1, code)
+        elif t is Variable:
+            name = node[0]
+            if not isinstance(name, unicode) or len(name) > 256 * 1024:
+                code.append((CALL, depth, node))
+                return
+            if len(node) > 1:
+                default = self.compile_sub(node[1], depth + 1)
+            else:
+                default = None
+            code.append((VAR, depth, name.strip(), default))
+        elif t is IfNode:
+            cond = self.compile_sub(node[0], depth + 1)
+            then = otherwise = None
+            if len(node) > 1:
+                then = self.compile_sub(node[1], depth + 1)
+            if len(node) > 2:
+                otherwise = self.compile_sub(node[2], depth + 1)
+            code.append((IF, depth, cond, then, otherwise))
+        elif t is Template and isinstance(node[0], unicode) and u":" not in node[0]:
+            # magic nodes like #switch get their arguments unchanged, which
+            # is only possible for names containing a colon
+            code.append((CALL, depth, CompiledTemplate(node)))
+        else:
+            code.append((CALL, depth, node))
+
+
+def run(code, expander, variables, res, count):
+    """execute instruction list code. count is the recursion count on
+    entry to Program.flatten"""
+
+    for op in code:
+        opcode = op[0]
+        if opcode is LIT:
+            res.append(op[1])
+            continue
+
+        expander.recursion_count = count + op[1] + 1
+        expander.node_count += 1
+        if opcode is CALL:
+            op[2].flatten(expander, variables, res)
+        elif opcode is VAR:
+            v = variables.get(op[2], None)
+            if v is None:
+                if op[3] is None:
+                    res.append(u"{{{%s}}}" % (op[2],))
+                else:
+                    run(op[3], expander, variables, res, count)
+            else:
+                res.append(v)
+        elif opcode is IF:
+            cond = []
+            run(op[2], expander, variables, cond, count)
+            cond = u"".join(cond).strip()
+            cond = cond.strip(_ebad)
+
+            res.append(maybe_newline)
+            tmp = []
+            if cond:
+                if op[3] is not None:
+                    run(op[3], expander, variables, tmp, count)
+            else:
+                if op[4] is not None:
+                    run(op[4], expander, variables, tmp, count)
+            _insert_implicit_newlines(tmp)
+            res.append(u"".join(tmp).strip())
+            res.append(dummy_mark)
+
+
+class Program(object):
+    """compiled template or template argument. flatten(program, ...)
+    produces the same result as flatten(program.tree, ...)"""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.split = None
+        c = _compiler()
+        # flatten has already checked the recursion limit for tree
+        # when it calls our flatten method
+        self.code = c.compile_sub(tree, -1)
+        self.maxdepth = c.maxdepth
+
+    def __repr__(self):
+        return "<%s %s instructions>" % (self.__class__.__name__, len(self.code))
+
+    def flatten(self, expander, variables, res):
+        # called from evaluate.flatten, which has already incremented
+        # the recursion count
+        count = expander.recursion_count
+
+        # flatten catches TemplateRecursion for small recursion
+        # counts and the recursion limit is checked per node. the
+        # recursive walk handles both cases.
+        if count < 2 or count + self.maxdepth > expander.recursion_limit:
+            t = type(self.tree)
+            if t is list or t is tuple:
+                for x in self.tree:
+                    flatten(x, expander, variables, res)
+            else:
+                self.tree.flatten(expander, variables, res)
+            return
+
+        try:
+            run(self.code, expander, variables, res, count)
+        finally:
+            expander.recursion_count = count
+
+    def equalsplit(self):
+        """same as evaluate.equalsplit(self.tree) with compiled parts"""
+        if self.split is None:
+            name, value = equalsplit(self.tree)
+            if name is None:
+                self.split = (None, self)
+            else:
+                self.split = (compile(name), compile(value))
+        return self.split
+
+
+def compile(tree):
+    """return a Program for tree. strings and empty nodes are returned
+    unchanged"""
+
+    if isinstance(tree, basestring) or not tree:
+        return tree
+    return Program(tree)
@@ -4,7 +4,7 @@
 
 from mwlib.templ import magics, log, DEBUG, parser, mwlocals
 from mwlib.uniq import Uniquifier
-from mwlib import nshandling, siteinfo, metabook
+from mwlib import nshandling, siteinfo, metabook, conf
 
 class TemplateRecursion(Exception): pass
 
@@ -19,6 +19,7 @@ def flatten(node, expander, variables, res):
     
     
     expander.recursion_count += 1
+    expander.node_count += 1
     try:
         before = variables.count
         oldlen = len(res)
@@ -47,6 +48,10 @@ def equalsplit(node):
     if isinstance(node, basestring):
         return None, node
 
+    if hasattr(node, "equalsplit"):
+        # templ.compiler.Program
+        return node.equalsplit()
+
     try:
         idx = node.index(eqmark)
     except ValueError:
@@ -59,6 +64,9 @@ def equalsplit_25(node):
     if isinstance(node, basestring):
         return None, node
 
+    if hasattr(node, "equalsplit"):
+        return node.equalsplit()
+
     try:
         idx = list(node).index(eqmark)
     except ValueError:
@@ -83,8 +91,9 @@ class ArgumentList(object):
         self.varnum = 0
         
         self.namedargs = {}
+        self.expanded = {}  # positional index -> expanded value
         self.count = 0
-            
+
     def __len__(self):
         self.count += 1
         return len(self.args)
@@ -106,13 +115,20 @@ class ArgumentList(object):
                 return default
             if isinstance(a, unicode):
                 return a.strip()
+            try:
+                tmp = self.expanded[n]
+                self.expander.argument_cache_hits += 1
+                return tmp
+            except KeyError:
+                pass
             tmp = []
             flatten(a, self.expander, self.variables, tmp)
             _insert_implicit_newlines(tmp)
             tmp = u"".join(tmp).strip()
+            self.expander.argument_expansions += 1
             if len(tmp)>256*1024:
                 raise MemoryLimitError("template argument too long: %s bytes" % len(tmp))
-            # FIXME: cache value ???
+            self.expanded[n] = tmp
             return tmp
 
         assert isinstance(n, basestring), "expected int or string"
@@ -144,6 +160,8 @@ class ArgumentList(object):
         try:
             do_strip, val = self.namedargs[n]
             if isinstance(val, unicode):
+                if n in self.expanded:
+                    self.expander.argument_cache_hits += 1
                 return val
         except KeyError:
             return default
@@ -154,8 +172,10 @@ class ArgumentList(object):
         tmp=u"".join(tmp)
         if do_strip:
             tmp = tmp.strip()
-            
+        self.expander.argument_expansions += 1
+
         self.namedargs[n] = (do_strip, tmp)
+        self.expanded[n] = tmp
         return tmp
     
 def is_implicit_newline(raw):
@@ -192,10 +212,48 @@ def _insert_implicit_newlines(res, maybe_newline=maybe_newline):
                     res[i] = '\n'
     del res[-2:]
 
+
+def _template_spans(res):
+    # (start, end, name) of the outermost mark_start/mark_end pairs
+    spans = []
+    pos = 0
+    depth = 0
+    start = name = None
+    for x in res:
+        cls = x.__class__
+        if cls is mark_start:
+            if not depth:
+                start = pos
+                name = x.msg
+            depth += 1
+        elif cls is mark_end:
+            if depth:
+                depth -= 1
+                if not depth:
+                    spans.append((start, pos, name))
+        else:
+            pos += len(x)
+    return spans
+
     
 class Expander(object):
     magic_displaytitle = None   # set via {{DISPLAYTITLE:...}}
-    def __init__(self, txt, pagename="", wikidb=None, recursion_limit=100):
+    compile_templates = True    # run templates via templ.compiler
+
+    # number of template arguments expanded and number of times an
+    # ArgumentList returned an already expanded value
+    argument_expansions = 0
+    argument_cache_hits = 0
+
+    node_count = 0  # number of nodes evaluated, see templ.budget
+
+    # set record_template_spans to get the (start, end, name) of the
+    # outermost template expansions in the expanded text as
+    # template_spans
+    record_template_spans = False
+    template_spans = None
+
+    def __init__(self, txt, pagename="", wikidb=None, recursion_limit=100, template_cache=None):
         assert wikidb is not None, "must supply wikidb argument in Expander.__init__"
         self.pagename = pagename
         self.db = wikidb
@@ -244,6 +302,23 @@ class Expander(object):
         self.parsed = parser.parse(txt, included=False, replace_tags=self.replace_tags, siteinfo=self.siteinfo)
         #show(self.parsed)
         self.parsedTemplateCache = {}
+        self.dependencies = {}  # (name, namespace) -> page or None, see templ.expansions
+        self.switch_tables = {}  # see nodes.SwitchNode._get_promoted
+
+        if template_cache is None:
+            from mwlib.templ import cache
+            template_cache = cache.get_default_cache()
+        self.template_cache = template_cache
+
+        from mwlib.templ import budget
+        self.budget = budget.get_default_budget()
+
+        memo_size = conf.get("expander", "template_memo_size", 1000, int)
+        if memo_size > 0:
+            from mwlib.templ import memo
+            self.template_memo = memo.TemplateMemo(self, maxsize=memo_size)
+        else:
+            self.template_memo = None
 
     def resolve_magic_alias(self, name):
         return self.aliasmap.resolve_magic_alias(name)
@@ -268,6 +343,7 @@ class Expander(object):
             pass
 
         page = self.db.normalize_and_get_page(name, ns)
+        self.dependencies[(name, ns)] = page
         if page:
             raw = page.rawtext
         else:
@@ -277,11 +353,16 @@ class Expander(object):
             res = None
         else:
             res = self._parse_raw_template(name=name, raw=raw)
-                
+            if self.compile_templates:
+                from mwlib.templ import compiler
+                res = compiler.compile(res)
+
         self.parsedTemplateCache[name] = res
         return res
 
     def _parse_raw_template(self, name, raw):
+        if self.template_cache is not None:
+            return self.template_cache.parse(raw, self.uniquifier)
         return parser.parse(raw, replace_tags=self.replace_tags)
     
     def _expand(self, parsed, keep_uniq=False):
@@ -289,7 +370,13 @@ class Expander(object):
         flatten(parsed, self, ArgumentList(expander=self), res)
         _insert_implicit_newlines(res)
         res[0] = u''
+        if self.record_template_spans:
+            self.template_spans = _template_spans(res)
         res = u"".join(res)
+        budget = self.budget
+        if budget is not None and budget.exhausted is not None and not budget.reported:
+            budget.reported = True
+            log.warn("expanding %r:\n%s" % (self.pagename, budget.report()))
         if not keep_uniq:
             res=self.uniquifier.replace_uniq(res)
         return res
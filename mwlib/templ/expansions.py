@@ -0,0 +1,117 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""store expanded articles together with the templates they use
+
+The Expander records every page it looks up as a template in
+Expander.dependencies. ExpansionStore saves the expanded text of an
+article together with the revisions of these pages and the state of
+the uniquifier. A later expansion of the same article text reuses the
+stored text, if none of the templates has changed. Expansions, which
+used magics depending on anything else (like the current time or
+#ifexist), are not stored.
+"""
+
+import os
+from hashlib import sha1
+
+import sqlite3dbm
+
+from mwlib import myjson as json
+from mwlib._version import version
+from mwlib.uniq import Uniquifier
+
+format_version = 1
+
+
+def page_version(page):
+    """return the revision id of page, a hash of its text, if it has no
+    revision id, or None if the page does not exist"""
+
+    if not page:
+        return None
+    revid = getattr(page, "revid", None)
+    if revid is not None:
+        return revid
+    return sha1(page.rawtext.encode("utf-8")).hexdigest()
+
+
+class ExpansionStore(object):
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._open()
+
+    def _open(self):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.db = sqlite3dbm.open(self.path, "c")
+        self.db.conn.execute("PRAGMA synchronous = 0")
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["db"]
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__ = d
+        self._open()
+
+    def __repr__(self):
+        return "<%s %r hits=%s misses=%s>" % (self.__class__.__name__, self.path, self.hits, self.misses)
+
+    def get_stats(self):
+        return dict(hits=self.hits, misses=self.misses)
+
+    def _key(self, title, raw):
+        h = sha1("%s\0%s\0" % (format_version, version))
+        h.update((u"%s\0%s" % (title, raw)).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, expander, raw):
+        """return the stored expansion of raw for expander or None, if
+        there is none or one of the templates has changed. on success,
+        the expander's uniquifier is replaced with the stored one"""
+
+        data = self.db.get(self._key(expander.pagename, raw), None)
+        if data is not None:
+            data = json.loads(data)
+            db = expander.db
+            for name, ns, v in data["dependencies"]:
+                if page_version(db.normalize_and_get_page(name, ns)) != v:
+                    data = None
+                    break
+
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        uniquifier = Uniquifier(random_string=data["random_string"])
+        uniquifier.uniq2repl = data["uniq2repl"]
+        expander.uniquifier = uniquifier
+        expander.magic_displaytitle = data["displaytitle"]
+        return data["text"]
+
+    def put(self, expander, raw, txt):
+        """store txt as expansion of raw, unless expander used volatile
+        magics or exhausted its budget"""
+
+        if expander.resolver.volatile:
+            return
+        if expander.budget is not None and expander.budget.exhausted is not None:
+            return
+
+        dependencies = []
+        for (name, ns), page in expander.dependencies.items():
+            dependencies.append((name, ns, page_version(page)))
+
+        uniquifier = expander.uniquifier
+        data = dict(dependencies=dependencies,
+                    text=txt,
+                    random_string=uniquifier.random_string,
+                    uniq2repl=uniquifier.uniq2repl,
+                    displaytitle=expander.magic_displaytitle)
+        self.db[self._key(expander.pagename, raw)] = json.dumps(data)
@@ -31,6 +31,7 @@ class Time(nodes.Node):
             d = None
 
         from mwlib.templ import magic_time
+        expander.resolver.volatile = True  # may depend on the current time
         res.append(magic_time.time(format, d))
 
 
@@ -540,6 +540,7 @@ class DummyResolver(object):
 
 class MagicResolver(TimeMagic, LocaltimeMagic, PageMagic, NumberMagic, StringMagic, ParserFunctions, OtherMagic, DummyResolver):
     local_values = None
+    volatile = False  # set, when a magic from volatile_magics was used
 
     def __call__(self, name, args):
         try:
@@ -559,6 +560,9 @@ class MagicResolver(TimeMagic, LocaltimeMagic, PageMagic, NumberMagic, StringMag
         if m is None:
             return None
 
+        if upper in volatile_magics:
+            self.volatile = True
+
         if isinstance(m, basestring):
             return m
 
@@ -576,6 +580,19 @@ class MagicResolver(TimeMagic, LocaltimeMagic, PageMagic, NumberMagic, StringMag
         return m is not None
 
 
+def _volatile_magics():
+    """return the names of magics, whose value does not only depend on
+    the page text and the templates used"""
+
+    res = set(["#IFEXIST"])
+    for klass in (TimeMagic, LocaltimeMagic):
+        res.update(x for x in dir(klass) if x.isupper())
+    res.update(x for x in dir(PageMagic) if x.startswith("REVISION"))
+    return res
+
+volatile_magics = _volatile_magics()
+
+
 magic_words = ['basepagename', 'basepagenamee', 'contentlanguage', 'currentday', 'currentday2', 'currentdayname', 'currentdow', 'currenthour', 'currentmonth', 'currentmonthabbrev', 'currentmonthname', 'currentmonthnamegen', 'currenttime', 'currenttimestamp', 'currentversion', 'currentweek', 'currentyear', 'defaultsort', 'directionmark', 'displaytitle', 'fullpagename', 'fullpagenamee', 'language', 'localday', 'localday2', 'localdayname', 'localdow', 'localhour', 'localmonth', 'localmonthabbrev', 'localmonthname', 'localmonthnamegen', 'localtime', 'localtimestamp', 'localweek', 'localyear', 'namespace', 'namespacee', 'newsectionlink', 'numberofadmins', 'numberofarticles', 'numberofedits', 'numberoffiles', 'numberofpages', 'numberofusers', 'pagename', 'pagenamee', 'pagesinnamespace', 'revisionday', 'revisionday2', 'revisionid', 'revisionmonth', 'revisiontimestamp', 'revisionyear', 'scriptpath', 'server', 'servername', 'sitename', 'subjectpagename', 'subjectpagenamee', 'subjectspace', 'subjectspacee', 'subpagename', 'subpagenamee', 'talkpagename', 'talkpagenamee', 'talkspace', 'talkspacee', 'urlencode']
 
 
@@ -19,4 +19,8 @@ class _eqmark(unicode):
     def __eq__(self, other):
         return self is other
 
+    def __reduce__(self):
+        # unpickle as the eqmark singleton, equality is by identity
+        return "eqmark"
+
 eqmark = _eqmark("=")
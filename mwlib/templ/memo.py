@@ -0,0 +1,276 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""memoize expansions of pure templates
+
+A template is pure, if its expansion only depends on its arguments:
+it may only use the magics listed in pure_magics and pure_magic_nodes,
+must not resolve relative names and must not call impure templates.
+Unknown parser functions like {{#invoke:...}} or {{int:...}} are
+impure.
+TemplateMemo expands the arguments of calls to pure templates eagerly
+and caches the expansion per (template name, expanded arguments).
+"""
+
+from mwlib import lrucache
+from mwlib.templ import magic_nodes
+from mwlib.templ.nodes import Node, Variable, IfNode, IfeqNode, SwitchNode, Template
+from mwlib.templ.evaluate import flatten, equalsplit, ArgumentList, TemplateRecursion, \
+     MemoryLimitError, _insert_implicit_newlines
+
+
+# magics of the MagicResolver, whose output only depends on their
+# arguments and the site configuration. this is a whitelist: time, page
+# name and revision magics, NUMBEROF*, #language, #ifexist (see
+# magics.volatile_magics) and dummy magics are impure
+pure_magics = set(["LC", "UC", "LCFIRST", "UCFIRST", "PADLEFT", "PADRIGHT", "URLENCODE",
+                   "NS", "LOCALURL", "LOCALURLE", "FULLURL",
+                   "#EXPR", "#IFEXPR", "#IFERROR", "#TITLEPARTS"])
+
+# magic nodes, whose output only depends on their arguments
+pure_nodes = set([tuple, list, Node, Variable, IfNode, IfeqNode, SwitchNode,
+                  magic_nodes.Subst, magic_nodes.Anchorencode, magic_nodes.NoOutput,
+                  magic_nodes.Defaultsort, magic_nodes.Formatnum])
+
+pure_magic_nodes = set([IfNode, IfeqNode, magic_nodes.make_switchnode, magic_nodes.Subst,
+                        magic_nodes.Anchorencode, magic_nodes.NoOutput, magic_nodes.Defaultsort,
+                        magic_nodes.Formatnum])
+
+
+class TemplateMemo(object):
+    def __init__(self, expander, maxsize=1000):
+        self.expander = expander
+        self.cache = lrucache.lrucache(maxsize)
+        self.template_purity = {}
+        self.node_purity = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return "<%s hits=%s misses=%s skipped=%s>" % (
+            self.__class__.__name__, self.hits, self.misses, self.skipped)
+
+    def get_stats(self):
+        return dict(hits=self.hits, misses=self.misses, skipped=self.skipped)
+
+    def is_pure_node(self, node):
+        if isinstance(node, basestring):
+            return True
+
+        tree = getattr(node, "tree", None)  # templ.compiler.Program
+        if tree is not None:
+            node = tree
+
+        key = id(node)
+        try:
+            return self.node_purity[key][1]
+        except KeyError:
+            pass
+
+        t = type(node)
+        if t in pure_nodes:
+            res = True
+            for x in node:
+                if not self.is_pure_node(x):
+                    res = False
+                    break
+        elif issubclass(t, Template) and t is not magic_nodes.Safesubst:
+            name = node[0]
+            if isinstance(name, unicode):
+                res = self.is_pure_call(name.strip())
+            elif name and isinstance(name[0], unicode) and u":" in name[0]:
+                # e.g. {{lc:{{{1}}}}}, where the magic is known statically
+                res = self.is_pure_call(name[0].lstrip(), dynamic=True) and self.is_pure_node(name)
+            else:
+                res = False
+            if res:
+                for x in node[1]:
+                    if not self.is_pure_node(x):
+                        res = False
+                        break
+        else:
+            res = False
+
+        # keep a reference to node, so that its id is not reused
+        self.node_purity[key] = (node, res)
+        return res
+
+    def is_pure_call(self, name, dynamic=False):
+        """check if {{name|...}} is pure, given pure arguments. this
+        follows the name resolution in nodes.Template._flatten. if
+        dynamic is true, name is only the start of the real name.
+        templates called with a namespace prefix, e.g.
+        {{Template:Foo}}, are treated as impure like unknown parser
+        functions"""
+
+        expander = self.expander
+        if ":" in name:
+            try_name, try_remainder = name.split(":", 1)
+            try_name = expander.resolve_magic_alias(try_name) or try_name
+            klass = magic_nodes.registry.get(try_name)
+            if klass is not None:
+                return klass in pure_magic_nodes
+            if expander.resolver.has_magic(try_name):
+                name = try_name
+                dynamic = False
+            else:
+                return False
+
+        if dynamic:
+            return False
+
+        try:
+            upper = str(name).upper()
+        except UnicodeEncodeError:
+            upper = None
+
+        if upper is not None:
+            local_values = expander.resolver.local_values
+            if local_values and upper in local_values:
+                return True
+            if getattr(expander.resolver, upper, None) is not None:
+                return upper in pure_magics
+
+        return self.is_pure_template(name)
+
+    def is_pure_template(self, name):
+        try:
+            return self.template_purity[name]
+        except KeyError:
+            pass
+
+        if name.startswith("/"):
+            # relative to the current page
+            res = False
+        else:
+            # recursive templates are not pure
+            self.template_purity[name] = False
+            p = self.expander.getParsedTemplate(name)
+            res = not p or self.is_pure_node(p)
+
+        self.template_purity[name] = res
+        return res
+
+    def _is_order_independent(self, variables):
+        """check if the result of variables.get(name) does not depend
+        on the order of calls. this is the case if all argument names
+        are constant and unique"""
+
+        if variables is None or variables.varnum >= len(variables.args):
+            return True
+
+        try:
+            return variables.memo_order_independent
+        except AttributeError:
+            pass
+
+        names = set()
+        varcount = 1
+        res = True
+        for arg in variables.args:
+            name, val = equalsplit(arg)
+            if name is None:
+                name = str(varcount)
+                varcount += 1
+            else:
+                tree = getattr(name, "tree", None)
+                if tree is not None:
+                    name = tree
+                if len(name) != 1 or not isinstance(name[0], unicode):
+                    res = False
+                    break
+                name = name[0].strip()
+            if name in names:
+                res = False
+                break
+            names.add(name)
+        variables.memo_order_independent = res
+        return res
+
+    def _expand(self, node, variables):
+        tmp = []
+        flatten(node, self.expander, variables, tmp)
+        _insert_implicit_newlines(tmp)
+        return u"".join(tmp)
+
+    def _expand_args(self, var):
+        """return the named arguments of var, as ArgumentList would
+        compute them, or None if argument names are not unique"""
+
+        namedargs = {}
+        varcount = 1
+        for arg in var.args:
+            name, val = equalsplit(arg)
+            if name is not None:
+                name = self._expand(name, var.variables).strip()
+                if isinstance(val, unicode):
+                    val = val.strip()
+                else:
+                    val = self._expand(val, var.variables).strip()
+            else:
+                name = str(varcount)
+                varcount += 1
+                if not isinstance(val, unicode):
+                    val = self._expand(val, var.variables)
+
+            if name in namedargs:
+                return None, None
+            namedargs[name] = (True, val)
+        return namedargs, varcount
+
+    def flatten(self, name, p, var, res):
+        """expand template name with parsed body p and arguments var
+        to res. return False, if the expansion cannot be memoized"""
+
+        expander = self.expander
+        count = expander.recursion_count
+
+        # flatten catches TemplateRecursion for small recursion counts
+        if count < 2 or not self.is_pure_template(name):
+            self.skipped += 1
+            return False
+
+        for x in var.args:
+            if not self.is_pure_node(x):
+                self.skipped += 1
+                return False
+
+        if not self._is_order_independent(var.variables):
+            self.skipped += 1
+            return False
+
+        try:
+            namedargs, varcount = self._expand_args(var)
+        except (TemplateRecursion, MemoryLimitError, RuntimeError):
+            # let the normal expansion handle it
+            namedargs = None
+
+        if namedargs is None:
+            self.skipped += 1
+            return False
+
+        key = (name, tuple(sorted((k, v[1]) for k, v in namedargs.items())))
+        try:
+            items, maxcount = self.cache[key]
+        except KeyError:
+            pass
+        else:
+            # the expansion succeeded at recursion count maxcount, so
+            # it does not hit the recursion limit at this count either
+            if count <= maxcount:
+                self.hits += 1
+                res.extend(items)
+                return True
+
+        self.misses += 1
+        args = ArgumentList(args=var.args, expander=expander, variables=var.variables)
+        args.namedargs = namedargs
+        args.varnum = len(var.args)
+        args.varcount = varcount
+
+        start = len(res)
+        flatten(p, expander, args, res)
+        self.cache[key] = (tuple(res[start:]), count)
+        return True
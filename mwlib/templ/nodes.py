@@ -140,6 +140,36 @@ class SwitchNode(Node):
         self.fast = fast
         self.sentinel = (len(self.unresolved)+1, None)
         
+    def _get_promoted(self, expander):
+        """return the per expander state of unresolved keys: a list with
+        the expansion of each key, its recursion count or None, and a
+        dict mapping constant keys to their index"""
+        try:
+            return expander.switch_tables[id(self)][1:]
+        except KeyError:
+            pass
+        keys = [None] * len(self.unresolved)
+        promoted = {}
+        # keep a reference to self, so that its id is not reused
+        expander.switch_tables[id(self)] = (self, keys, promoted)
+        return keys, promoted
+
+    def _promote_key(self, expander, keys, promoted, idx, key, k):
+        """remember the expansion key of unresolved key k, if it does not
+        depend on variables and has no side effects. the expansion is
+        reused at the same or a smaller recursion count only"""
+        memo = expander.template_memo
+        if memo is None or not memo.is_pure_node(k):
+            keys[idx] = False
+            return
+
+        keys[idx] = (key, expander.recursion_count)
+        if key not in promoted:
+            promoted[key] = idx
+        num_key = maybe_numeric(key)
+        if num_key is not None and num_key not in promoted:
+            promoted[num_key] = idx
+
     def flatten(self, expander, variables, res):
         if self.unresolved is None:
             self._init()
@@ -158,11 +188,32 @@ class SwitchNode(Node):
         
         if pos is None:
             pos = len(self.unresolved)+1
-        
-        for k, v in self.unresolved[:pos]:
+
+        unresolved = self.unresolved
+        if unresolved:
+            keys, promoted = self._get_promoted(expander)
+            idx = promoted.get(val, pos)
+            if num_val is not None:
+                idx = min(idx, promoted.get(num_val, pos))
+            if idx < pos and keys[idx][1] >= expander.recursion_count:
+                pos = idx
+                retval = unresolved[idx][1]
+        else:
+            keys = ()
+
+        count = expander.recursion_count
+        for idx, (k, v) in enumerate(unresolved[:pos]):
+            key = keys[idx]
+            if key and key[1] >= count:
+                # constant key, which does not match. otherwise it
+                # would have been found in promoted
+                continue
+
             tmp = []
-            flatten(k, expander, variables, tmp)
+            is_constant = flatten(k, expander, variables, tmp)
             tmp = u"".join(tmp).strip()
+            if is_constant and key is not False:
+                self._promote_key(expander, keys, promoted, idx, tmp, k)
             if tmp==val:
                 retval = v
                 break
@@ -283,18 +334,45 @@ class Template(Node):
         else:            
             p = expander.getParsedTemplate(name)
             if p:
+                budget = expander.budget
+                if budget is not None and not budget.enter(name, expander, res):
+                    return
                 if DEBUG:
                     msg = "EXPANDING %r %r  ===> " % (name, var)
                     oldidx = len(res)
                 res.append(mark_start(repr(name)))
                 res.append(maybe_newline)
-                flatten(p, expander, var, res)
+                try:
+                    memo = expander.template_memo
+                    if memo is None or not memo.flatten(name, p, var, res):
+                        flatten(p, expander, var, res)
+                finally:
+                    if budget is not None:
+                        budget.leave(expander, res)
                 res.append(mark_end(repr(name)))
 
                 if DEBUG:
                     msg += repr("".join(res[oldidx:]))
                     print msg
 
+def init_switchnodes(node):
+    """build the dispatch tables of all SwitchNodes in node, e.g. before
+    a parsed template is cached"""
+    if isinstance(node, basestring):
+        return
+
+    if isinstance(node, SwitchNode):
+        if node.unresolved is None:
+            node._init()
+        for pos, value in node.fast.values():
+            init_switchnodes(value)
+        for key, value in node.unresolved:
+            init_switchnodes(key)
+            init_switchnodes(value)
+
+    for x in node:
+        init_switchnodes(x)
+
 def show(node, indent=0, out=None):
     import sys
     
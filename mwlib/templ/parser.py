@@ -4,7 +4,7 @@
 
 import re
 from mwlib.templ.nodes import Node, Variable, Template, IfNode, SwitchNode
-from mwlib.templ.scanner import symbols, tokenize
+from mwlib.templ.scanner import symbols, tokenize_offsets
 from mwlib.templ.marks import eqmark
 
 from hashlib import sha1 as digest
@@ -111,6 +111,9 @@ class Parser(object):
     def getToken(self):
         return self.tokens[self.pos]
 
+    def getText(self, start, length):
+        return self.src[start:start + length]
+
     def setToken(self, tok):
         self.tokens[self.pos] = tok
 
@@ -129,10 +132,10 @@ class Parser(object):
         return Variable(v)
         
     def _eatBrace(self, num):
-        ty, txt = self.getToken()
+        ty, start, length = self.getToken()
         assert ty == symbols.bra_close
-        assert len(txt)>= num
-        newlen = len(txt)-num
+        assert length>= num
+        newlen = length-num
         if newlen==0:
             self.pos+=1
             return
@@ -140,8 +143,7 @@ class Parser(object):
         if newlen==1:
             ty = symbols.txt
 
-        txt = txt[:newlen]
-        self.setToken((ty, txt))
+        self.setToken((ty, start, newlen))
 
     def _strip_ws(self, cond):
         if isinstance(cond, unicode):
@@ -267,23 +269,23 @@ class Parser(object):
         return Template([name, tuple(args)])
         
     def parseOpenBrace(self):
-        ty, txt = self.getToken()
+        ty, start, length = self.getToken()
         n = []
 
-        numbraces = len(txt)
+        numbraces = length
         self.pos += 1
 
         linkcount = 0
         
         while 1:
-            ty, txt = self.getToken()
+            ty, start, length = self.getToken()
 
             if ty==symbols.bra_open:
                 n.append(self.parseOpenBrace())
             elif ty is None:
                 break
             elif ty==symbols.bra_close and linkcount==0:
-                closelen = len(txt)
+                closelen = length
                 if closelen==2 or numbraces==2:
                     t=self.templateFromChildren(n)
                     n=[]
@@ -302,6 +304,7 @@ class Parser(object):
             elif ty==symbols.noi:
                 self.pos += 1 # ignore <noinclude>
             else: # link, txt
+                txt = self.getText(start, length)
                 if txt=="[[":
                     linkcount += 1
                 elif txt=="]]" and linkcount>0:
@@ -324,12 +327,12 @@ class Parser(object):
                 pass
         
         
-        self.tokens = tokenize(self.txt, included=self.included, replace_tags=self.replace_tags)
+        self.src, self.tokens = tokenize_offsets(self.txt, included=self.included, replace_tags=self.replace_tags)
         self.pos = 0
         n = []
         
         while 1:
-            ty, txt = self.getToken()
+            ty, start, length = self.getToken()
             if ty==symbols.bra_open:
                 n.append(self.parseOpenBrace())
             elif ty is None:
@@ -337,7 +340,7 @@ class Parser(object):
             elif ty==symbols.noi:
                 self.pos += 1   # ignore <noinclude>
             else: # bra_close, link, txt                
-                n.append(txt)
+                n.append(self.getText(start, length))
                 self.pos += 1
 
         n=optimize(n)
@@ -5,6 +5,11 @@
 import re
 from mwlib.templ import pp
 
+try:
+    from mwlib import _expander
+except ImportError:
+    _expander = None
+
 splitpattern = """
 ({{+)                     # opening braces
 |(}}+)                    # closing braces
@@ -31,25 +36,44 @@ class symbols:
     noi = 4
     txt = 5
 
-def tokenize(txt, included=True, replace_tags=None):
+def scan_rx(txt):
+    """split txt into a list of (type, start, len) tokens using splitrx"""
+    tokens = []
+    for m in splitrx.finditer(txt):
+        start, end = m.span()
+        if end > start:
+            tokens.append((m.lastindex, start, end - start))
+    return tokens
+
+
+def scan(txt):
+    """split txt into a list of (type, start, len) tokens. uses the C
+    tokenizer from mwlib._expander if available, which returns the
+    same tokens as scan_rx"""
+
+    if _expander is None or not isinstance(txt, unicode):
+        return scan_rx(txt)
+    return _expander.scan(txt)
+
+
+def tokenize_offsets(txt, included=True, replace_tags=None):
+    """preprocess txt and return (txt, tokens). the tokens are offsets
+    into the preprocessed txt as returned by scan, terminated by
+    (None, len(txt), 0)"""
+
     txt = pp.preprocess(txt, included=included)
 
-    if replace_tags is not None:        
+    if replace_tags is not None:
         txt = replace_tags(txt)
-    
-    tokens = []
-    for (v1, v2, v3, v4, v5) in splitrx.findall(txt):
-        if v5:
-            tokens.append((5, v5))        
-        elif v4:
-            tokens.append((4, v4))
-        elif v3:
-            tokens.append((3, v3))
-        elif v2:
-            tokens.append((2, v2))
-        elif v1:
-            tokens.append((1, v1))
-
-    tokens.append((None, ''))
-    
-    return tokens
+
+    tokens = scan(txt)
+    tokens.append((None, len(txt), 0))
+
+    return txt, tokens
+
+
+def tokenize(txt, included=True, replace_tags=None):
+    """like tokenize_offsets, but return a list of (type, text) tokens"""
+
+    txt, tokens = tokenize_offsets(txt, included=included, replace_tags=replace_tags)
+    return [(t, txt[start:start + length]) for t, start, length in tokens[:-1]] + [(None, '')]
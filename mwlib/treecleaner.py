@@ -5,7 +5,9 @@
 # See README.rst for additional licensing information.
 
 import sys
+import copy
 import unicodedata
+import cPickle
 
 from mwlib.advtree import removeNewlines
 from mwlib.advtree import (Article, ArticleLink, Big, Blockquote, Book, BreakingReturn, Caption, CategoryLink, Cell, Center, Chapter,
@@ -16,7 +18,7 @@ from mwlib.advtree import (Article, ArticleLink, Big, Blockquote, Book, Breaking
                            Underline, URL, Var)
 
 from mwlib.treecleanerhelper import getNodeHeight, splitRow
-from mwlib import parser
+from mwlib import parser, nshandling, workers
 from mwlib.writer import styleutils, miscutils
 
 def show(n):
@@ -41,6 +43,35 @@ def _any(list):
     return False
 
 
+def _childlessCopy(node, parent):
+    c = copy.copy(node)
+    c.children = []
+    c.parent = parent
+    c._nodeIndex = None
+    return c
+
+
+def _cleanBookChild(job, item):
+    """Clean child i of the book in a worker process of TreeCleaner._cleanParallel.
+
+    Return the nodes replacing the child in the book and the reports.
+    """
+    tc, cleanerNames, standins = job
+    i, child = item
+    book = tc.tree
+    book.children = list(standins)
+    book.children[i] = child
+    book._shift = 0
+    for (j, c) in enumerate(book.children):
+        c._index = j
+    tc.reports = []
+    tc._cleanChild(child, [(getattr(tc, name), needs) for (name, needs) in cleanerNames])
+
+    # the child may have been removed or replaced in the book
+    others = set(id(x) for x in standins if x is not standins[i])
+    return [x for x in book.children if id(x) not in others], tc.reports
+
+
 class TreeCleaner(object):
 
     """The TreeCleaner object cleans the parse tree to optimize writer output.
@@ -113,10 +144,13 @@ class TreeCleaner(object):
     skipMethods = []
 
 
-    def __init__(self, tree, save_reports=False, nesting_strictness='loose', status_cb=None, rtl=False):
+    def __init__(self, tree, save_reports=False, nesting_strictness='loose', status_cb=None, rtl=False, processes=None):
         """Init with parsetree.
 
         The input tree needs to be an AdvancedTree, generated by advtree.buildAdvancedTree
+
+        The children of a Book are cleaned in processes worker processes, if it is greater
+        than 1. It defaults to the treecleaner.processes setting of mwlib.conf.
         """
 
         self.tree = tree
@@ -130,6 +164,10 @@ class TreeCleaner(object):
 
         self.status_cb=status_cb
         self.rtl = rtl
+        if processes is None:
+            from mwlib import conf
+            processes = conf.treecleaner_processes
+        self.processes = processes
         # list of nodes which do not require child nodes
         self.childlessOK = [ArticleLink, BreakingReturn, CategoryLink, Cell, Chapter, Code,
                             HorizontalRule, ImageLink, ImageMap, InterwikiLink, LangLink, Link, Math,
@@ -249,11 +287,15 @@ class TreeCleaner(object):
 
     def clean(self, cleanerMethods):
         """Clean parse tree using cleaner methods in the methodList."""
+        cleanerNodeClasses = self.getCleanerNodeClasses()
         cleanerList = []
         for method in cleanerMethods:
             f = getattr(self, method, None)
             if f:
-                cleanerList.append(f)
+                needs = cleanerNodeClasses.get(method)
+                if needs is not None and f.im_func is not getattr(TreeCleaner, method).im_func:
+                    needs = None # overridden in a subclass
+                cleanerList.append((f, needs))
             else:
                 raise 'TreeCleaner has no method: %r' % method
 
@@ -262,24 +304,156 @@ class TreeCleaner(object):
         # --> if chapters are used, whole chapters are cleaned which slows things down
 
         if self.tree.__class__ == Book :
-            children = self.tree.children
+            # cleaners may remove children of the book
+            children = list(self.tree.children)
         else:
             children = [self.tree]
 
+        if self.processes > 1 and len(children) > 1 and self._cleanParallel(children, cleanerList):
+            return
+
         total_children = len(children)
         for (i, child) in enumerate(children):
-            for cleaner in cleanerList:
-                try:
-                    cleaner(child)
-                except Exception, e:
-                    self.report('ERROR:', e)
-                    print 'TREECLEANER ERROR in %s: %r' % (getattr(child, 'caption', u'').encode('utf-8'),
-                                                           repr(e))
-                    import traceback
-                    traceback.print_exc()
+            self._cleanChild(child, cleanerList)
             if self.status_cb:
                 self.status_cb(progress=100*i/total_children)
 
+    def _cleanChild(self, child, cleanerList):
+        classes = None
+        for (cleaner, needs) in cleanerList:
+            if needs is not None:
+                if classes is None:
+                    classes = self._getNodeClasses(child)
+                if not _any([_all([klass in classes for klass in group]) for group in needs]):
+                    continue
+            # cleaners also change children and __class__ directly
+            classes = None
+            try:
+                cleaner(child)
+            except Exception, e:
+                self.report('ERROR:', e)
+                print 'TREECLEANER ERROR in %s: %r' % (getattr(child, 'caption', u'').encode('utf-8'),
+                                                       repr(e))
+                import traceback
+                traceback.print_exc()
+
+    def _cleanParallel(self, children, cleanerList):
+        """Clean the children of the book in self.processes worker processes.
+
+        The workers clean each child in a copy of the book, whose other children are copies
+        without children. The book and the nshandlers of the links are shared with the
+        workers. Return False if the TreeCleaner cannot be pickled.
+        """
+
+        book = self.tree
+        stub = _childlessCopy(book, None)
+        standins = [_childlessCopy(c, stub) for c in children]
+        shared = [book]
+        remote = [stub]
+        seen = set()
+        for node in book.allchildren():
+            nshandler = getattr(node, 'nshandler', None)
+            if isinstance(nshandler, nshandling.nshandler) and id(nshandler) not in seen:
+                seen.add(id(nshandler))
+                shared.append(nshandler)
+                remote.append(nshandler)
+
+        tc = copy.copy(self)
+        tc.tree = stub
+        tc.status_cb = None
+        tc.reports = []
+        job = (tc, [(f.__name__, needs) for (f, needs) in cleanerList], standins)
+        try:
+            results = workers.get_pool(self.processes).imap(_cleanBookChild, job, list(enumerate(children)),
+                                                            shared, remote)
+        except (TypeError, cPickle.PicklingError):
+            return False
+
+        total_children = len(children)
+        cleaned = [None] * total_children
+        for (done, (i, result)) in enumerate(results):
+            cleaned[i] = result
+            if self.status_cb:
+                self.status_cb(progress=100*done/total_children)
+
+        newchildren = []
+        for (nodes, reports) in cleaned:
+            newchildren.extend(nodes)
+            self.reports.extend(reports)
+        book.children[:] = newchildren
+        # the indices cached by advtree._idIndex
+        book._shift = 0
+        for (i, c) in enumerate(newchildren):
+            c._index = i
+        return True
+
+    def getCleanerNodeClasses(self):
+        """Return a dict for cleaner methods, which only change the tree if it contains nodes of certain classes.
+
+        The values are lists of tuples of classes. A cleaner is skipped unless all classes of one
+        of the tuples are found in the article.
+        """
+        res = {
+            'markInfoboxes': [(Table,)],
+            'removeEditLinks': [(NamedURL,)],
+            'removeEmptyTextNodes': [(Text,)],
+            'removeInvisibleLinks': [(CategoryLink,), (LangLink,)],
+            'cleanSectionCaptions': [(Section,)],
+            'removeListOnlyParagraphs': [(Paragraph,)],
+            'removeInvalidFiletypes': [(ImageLink,)],
+            'fixParagraphs': [(Paragraph, Section)],
+            'simplifyBlockNodes': [(Paragraph,)],
+            'galleryFix': [(Gallery, Table)],
+            'fixRegionListTables': [(Div,)],
+            'removeTrainTemplates': [(ImageLink, Table)],
+            'unNestEndingCellContent': [(Table,)],
+            'removeCriticalTables': [(Table,)],
+            'removeTextlessStyles': [(klass,) for klass in self.style_nodes],
+            'removeBrokenChildren': [(klass, parent) for klass, parents in self.removeNodes.items() for parent in parents],
+            'fixTableColspans': [(Table,)],
+            'removeEmptyTrailingTableRows': [(Table,)],
+            'splitTableLists': [(Row,)],
+            'transformSingleColTables': [(Table,)],
+            'splitTableToColumns': [(Table,)],
+            'linearizeWideNestedTables': [(Table,)],
+            'removeBreakingReturns': [(BreakingReturn,)],
+            'removeEmptyReferenceLists': [(ReferenceList,)],
+            'swapNodes': [(klass, parent) for klass, parents in self.swapNodesMap.items() for parent in parents],
+            'removeBigSectionsFromCells': [(Cell, Section)],
+            'transformNestedTables': [(Table,)],
+            'splitBigTableCells': [(Row,)],
+            'limitImageCaptionsize': [(ImageLink, BreakingReturn)],
+            'removeDuplicateLinksInReferences': [(Reference,)],
+            'fixItemLists': [(ItemList,)],
+            'fixSubSup': [(Sup,), (Sub,)],
+            'removeLeadingParaInList': [(Item, Paragraph), (Reference, Paragraph)],
+            'removeSeeAlso': [(Section,)],
+            'buildDefinitionLists': [(DefinitionTerm,), (DefinitionDescription,)],
+            'restrictChildren': [(klass,) for klass in self.allowedChildren],
+            'fixReferenceNodes': [(Reference,)],
+            'fixMathDir': [(Math,)],
+            'fixPreFormatted': [(PreFormatted,)],
+            'fixListNesting': [(ItemList,)],
+            'removeEmptySections': [(Section,)],
+            'markShortParagraph': [(Paragraph,)],
+            }
+        if self.nesting_strictness == 'loose':
+            res['fixNesting'] = [(klass, parent) for klass, parents in self.forbidden_parents.items() for parent in parents]
+        return res
+
+    def _getNodeClasses(self, node):
+        """Return the classes and base classes of node and all its children"""
+        seen = set()
+        todo = [node]
+        while todo:
+            n = todo.pop()
+            seen.add(n.__class__)
+            todo.extend(n.children)
+        classes = set()
+        for klass in seen:
+            classes.update(klass.__mro__)
+        return classes
+
     def cleanAll(self, skipMethods=[]):
         """Clean parse tree using all available cleaner methods."""
         skipMethods = skipMethods or self.skipMethods
@@ -435,11 +609,10 @@ class TreeCleaner(object):
         # "not 'box' in node.attr(class)" is a hack to detect infoboxes and thelike. they are not split into divs.
         # tables like this should be detected and marked in a separate module probably
         single_col = node.__class__ == Table and node.numcols == 1
-        is_long = len(node.getAllDisplayText()) > 2500
-
-        contains_gallery = len(node.getChildNodesByClass(Gallery)) > 0
         many_cells = False
         if single_col:
+            is_long = len(node.getAllDisplayText()) > 2500
+            contains_gallery = len(node.getChildNodesByClass(Gallery)) > 0
             all_images = True
             many_cells = len(node.getChildNodesByClass(Cell)) > 200
             for row in node.children:
@@ -448,8 +621,8 @@ class TreeCleaner(object):
                         if item.__class__ != ImageLink:
                             all_images = False
         else:
-            all_images = False
-        if node.__class__ == Table:
+            is_long = contains_gallery = all_images = False
+        if single_col:
             nested_tables = node.getChildNodesByClass(Table)
             nested_rows = 0
             for t in nested_tables:
@@ -5,12 +5,53 @@
 import os
 import re
 
+uniq_rx = re.compile("\x7fUNIQ-[a-z0-9]+-\\d+-[a-f0-9]+-QINU\x7f")
+
+# the lookahead lets the regular expression engine skip text, which
+# can't start a match, faster
+_tags_rx_template = """
+    (?=[\\n<])
+    (?:
+    (?P<comment> (\\n[ ]*)?<!--.*?-->([ ]*\\n)?) |
+    (?:
+    <(?P<tagname> NAMES)
+    (?P<vlist> \\s[^<>]*)?
+    (/>
+     |
+     (?<!/) >
+    (?P<inner>.*?)
+    </(?P=tagname)\\s*>)))
+"""
+
+# frozenset of tag names -> compiled regular expression
+_tags_rx = {}
+
+
+def get_tags_rx():
+    """return the regular expression matching comments and the tags
+    handled by the Uniquifier. it is compiled once for every set of tag
+    extensions registered in tagext.default_registry"""
+
+    from mwlib import tagext
+    tags = set("nowiki math imagemap gallery source pre ref timeline poem pages".split())
+    tags.update(tagext.default_registry.names())
+    tags = frozenset(tags)
+
+    rx = _tags_rx.get(tags)
+    if rx is None:
+        rx = _tags_rx_template.replace("NAMES", "|".join(sorted(tags)))
+        rx = _tags_rx[tags] = re.compile(rx, re.VERBOSE | re.DOTALL | re.IGNORECASE)
+    return rx
+
+
 class Uniquifier(object):
     random_string = None
     rx = None
-    def __init__(self):
+    def __init__(self, random_string=None):
         self.uniq2repl = {}
-        if self.random_string is None:
+        if random_string is not None:
+            self.random_string = random_string
+        elif self.random_string is None:
             import binascii
             r=os.urandom(8)
             self.__class__.random_string = binascii.hexlify(r)
@@ -30,9 +71,9 @@ class Uniquifier(object):
         return t["complete"]
 
     def replace_uniq(self, txt):
-        rx=re.compile("\x7fUNIQ-[a-z0-9]+-\\d+-[a-f0-9]+-QINU\x7f")
-        txt = rx.sub(self._repl_from_uniq, txt)
-        return txt
+        if "\x7fUNIQ-" not in txt:
+            return txt
+        return uniq_rx.sub(self._repl_from_uniq, txt)
     
     def _repl_to_uniq(self, mo):
         tagname = mo.group("tagname")
@@ -57,27 +98,11 @@ class Uniquifier(object):
         return self.get_uniq(r, tagname)
     
     def replace_tags(self, txt):
+        if "<" not in txt:
+            return txt
         self.txt = txt
         rx = self.rx
         if rx is None:
-            tags = set("nowiki math imagemap gallery source pre ref timeline poem pages".split())
-            from mwlib import tagext
-            tags.update(tagext.default_registry.names())
-
-            rx = """
-                (?P<comment> (\\n[ ]*)?<!--.*?-->([ ]*\\n)?) |
-                (?:
-                <(?P<tagname> NAMES)
-                (?P<vlist> \\s[^<>]*)?
-                (/>
-                 |
-                 (?<!/) >
-                (?P<inner>.*?)
-                </(?P=tagname)\\s*>))
-            """
-
-            rx = rx.replace("NAMES", "|".join(list(tags)))
-            rx = re.compile(rx, re.VERBOSE | re.DOTALL | re.IGNORECASE)
-            self.rx = rx 
+            rx = self.rx = get_tags_rx()
         newtxt = rx.sub(self._repl_to_uniq, txt)
         return newtxt
@@ -7,8 +7,15 @@
 
 import sys
 import re
+import htmlentitydefs
 import _uscan as _mwscan
-from mwlib.refine.util import resolve_entity, parseParams
+from mwlib.refine.util import resolve_entity, parseParams, style2dict
+
+# flags of html tags returned by _mwscan.scan_ex
+_tag_selfclosing = 1
+_tag_end = 2
+_tag_uniq = 4
+_tag_style = 8
 
 def walknode(node, filt=lambda x: True):
     if not isinstance(node, token):
@@ -56,7 +63,16 @@ class _show(object):
         else:
             return lambda out=None: show(obj, out=out)
             
+# the fields of a token stored in slots. they are not part of the
+# __dict__ and must be copied explicitly, e.g. when pickling a token
+token_fields = ("type", "start", "len", "source", "_text")
+
 class token(object):
+    # scanner tokens only need the slots, the __dict__ of a token is
+    # created when another attribute is set. subclasses must not
+    # define __slots__, since refine changes __class__ to parser nodes
+    __slots__ = token_fields + ("__dict__", "__weakref__")
+
     caption = ''
     vlist = None
     target = None
@@ -110,16 +126,20 @@ class token(object):
     t_html_tag_end = 100
     
     token2name = {}
-    _text = None
 
     @staticmethod
     def join_as_text(tokens):
         return u"".join([x.text or u"" for x in tokens])
     
     def _get_text(self):
-        if self._text is None and self.source is not None:
-            self._text = self.source[self.start:self.start+self.len]
-        return self._text
+        try:
+            text = self._text
+        except AttributeError:
+            # parser nodes not initialized by token.__init__
+            text = None
+        if text is None and self.source is not None:
+            text = self._text = self.source[self.start:self.start+self.len]
+        return text
     
     def _set_text(self, t):
         self._text = t
@@ -131,10 +151,24 @@ class token(object):
         self.start = start
         self.len = len
         self.source = source
-        if text is not None:
-            self.text = text
-            
-        self.__dict__.update(kw)
+        self._text = text
+        if kw:
+            self.__dict__.update(kw)
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        for name in token_fields:
+            try:
+                d[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return d
+
+    def __setstate__(self, d):
+        for name in token_fields:
+            if name in d:
+                setattr(self, name, d.pop(name))
+        self.__dict__.update(d)
 
     def __repr__(self):
         if type(self) is token:
@@ -227,7 +261,6 @@ def dump_tokens(text, tokens):
         print type, repr(text[start:start+len])
            
 def scan(text):
-    text += u"\0"*32    
     return _mwscan.scan(text)
                          
 class _compat_scanner(object):
@@ -248,15 +281,47 @@ startfeed strike strong sub sup caption table td th tr tt u ul var dl dt dd
         if isinstance(text, str):
             text = unicode(text)
             
-        tokens = scan(text)
+        # the scanner resolves entities and classifies and splits html
+        # tags, see py_scan_ex in _uscan.re
+        tokens = _mwscan.scan_ex(text, self.allowed_tags, htmlentitydefs.name2codepoint)
 
         res = []
 
         def g():
             return text[start:start+tlen]
 
-        for type,  start, tlen in tokens:
-            
+        for x in tokens:
+            type = x[0]
+            if type==token.t_html_tag or type==token.t_html_tag_end:
+                type, start, tlen, name, flags, vlist = x
+                if flags & _tag_uniq:
+                    t = token(type=token.t_html_tag, start=start, len=tlen, source=text)
+                    if uniquifier:
+                        t.text = uniquifier.replace_uniq(g())
+                    _analyze_html_tag(t)
+                    if t.rawtagname in self.allowed_tags:
+                        res.append(t)
+                    else:
+                        res.append(token(type=token.t_text, start=start, len=tlen, source=text))
+                    continue
+
+                if flags & _tag_style:
+                    vlist["style"] = style2dict(vlist["style"])
+                t = token(type=type, start=start, len=tlen, source=text)
+                t.vlist = vlist
+                t.rawtagname = name
+                t.tag_selfClosing = bool(flags & _tag_selfclosing)
+                t.tag_isEndToken = bool(flags & _tag_end)
+                res.append(t)
+                continue
+
+            if len(x) == 4:
+                # resolved entity
+                type, start, tlen, txt = x
+                res.append(token(type=type, start=start, len=tlen, source=text, text=txt))
+                continue
+
+            type, start, tlen = x
             if type==token.t_begintable:
                 txt = g()
                 count = txt.count(":")
@@ -264,29 +329,8 @@ startfeed strike strong sub sup caption table td th tr tt u ul var dl dt dd
                     res.append(token(type=token.t_colon, start=start, len=count, source=text))
                 tlen -= count
                 start += count
-                    
-                
-                
-            t = token(type=type, start=start, len=tlen, source=text)
-
-            if type==token.t_entity:
-                t.text = resolve_entity(g())
-                t.type = token.t_text
-                res.append(t)
-            elif type==token.t_html_tag:
-                s = g()
-                if uniquifier:
-                    s=uniquifier.replace_uniq(s)
-                    t.text = s
-                _analyze_html_tag(t)
-                tagname = t.rawtagname
-                
-                if tagname in self.allowed_tags:
-                    res.append(t)
-                else:
-                    res.append(token(type=token.t_text, start=start, len=tlen, source=text))
-            else:
-                res.append(t)
+
+            res.append(token(type=type, start=start, len=tlen, source=text))
 
         return res
         
@@ -0,0 +1,122 @@
+# Copyright (c) 2007-2011 PediaPress GmbH
+# See README.rst for additional licensing information.
+
+"""worker processes for jobs on token lists and parse trees
+
+A WorkerPool keeps its multiprocessing pool for many jobs.
+WorkerPool.imap calls func(job, item) for each item in the worker
+processes. The job and the items are pickled in the parent, the results
+in the workers. Objects known to both sides are pickled as references:
+
+ - resident objects are passed to the pool when it is created and the
+   workers inherit them when they are forked (e.g. a RefineContext)
+ - shared objects are sent to the workers along with the job. Items and
+   results referencing them are unpickled with the objects of the
+   receiving side (e.g. the source of the tokens, the book of the
+   articles)
+
+Each worker unpickles a job once and keeps it for the following items of
+the job.
+"""
+
+import cPickle
+import cStringIO
+import itertools
+import multiprocessing
+
+
+def _dumps(obj, objects):
+    ids = dict((id(x), n) for n, x in enumerate(objects) if x is not None)
+    f = cStringIO.StringIO()
+    p = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+    if [x for x in objects if type(x) in (str, unicode, tuple, list, dict)]:
+        p.persistent_id = lambda obj: ids.get(id(obj))
+    else:
+        # faster, only called for instances, not for strings, lists, dicts etc.
+        p.inst_persistent_id = lambda obj: ids.get(id(obj))
+    p.dump(obj)
+    return f.getvalue()
+
+
+def _loads(data, objects):
+    u = cPickle.Unpickler(cStringIO.StringIO(data))
+    u.persistent_load = objects.__getitem__
+    return u.load()
+
+
+# the resident objects of the pool and the last job of a worker process
+_resident = None
+_current = None
+
+
+def _init(resident):
+    global _resident
+    _resident = resident
+
+
+def _call(args):
+    global _current
+    serial, jobdata, i, itemdata = args
+    if _current is None or _current[0] != serial:
+        _current = None
+        func, job, shared = _loads(jobdata, _resident)
+        _current = (serial, func, job, _resident + shared)
+    serial, func, job, objects = _current
+    res = func(job, _loads(itemdata, objects))
+    return i, _dumps(res, objects)
+
+
+class WorkerPool(object):
+    """multiprocessing pool of processes workers. resident is the list of
+    objects the workers inherit, see the module docstring"""
+
+    def __init__(self, processes, resident=()):
+        self.processes = processes
+        self.resident = list(resident)
+        self._pool = None
+        self._serial = itertools.count()
+
+    def imap(self, func, job, items, shared=(), remote=None):
+        """yield (index, func(job, items[index])) in the order the items are
+        finished. func must be a module level function. remote are the
+        objects sent to the workers for the shared objects (default:
+        shared itself), e.g. a node without its children.
+
+        Raises TypeError or cPickle.PicklingError before starting any
+        work, if the job or the items cannot be pickled.
+        """
+
+        if remote is None:
+            remote = shared
+        shared = list(shared)
+        local = self.resident + shared
+        jobdata = _dumps((func, job, list(remote)), self.resident)
+        serial = self._serial.next()
+        tasks = [(serial, jobdata, i, _dumps(x, local)) for (i, x) in enumerate(items)]
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes, _init, (self.resident,))
+        return self._results(tasks, local)
+
+    def _results(self, tasks, local):
+        for (i, data) in self._pool.imap_unordered(_call, tasks):
+            yield i, _loads(data, local)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+_pools = {}
+
+
+def get_pool(processes):
+    """return the WorkerPool of this process with processes workers
+    and without resident objects"""
+
+    pool = _pools.get(processes)
+    if pool is None:
+        pool = _pools[processes] = WorkerPool(processes)
+    return pool
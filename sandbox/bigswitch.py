@@ -2161,11 +2161,47 @@ einwohnerzahlen = u"""
 [[Kategorie:Vorlage:Bevölkerungszahlen (Frankreich)]]
 """
 
+# a language name template with computed keys
+langnames = u"{{#switch:{{{1}}}\n%s\n|#default={{{1}}}}}" % (
+    u"\n".join(u"|{{lc:L%04d}}=Language %d" % (i, i) for i in range(1000)),)
+
+
 import time
+import shutil
+import tempfile
 from mwlib import expander
-db = expander.DictDB(einwohnerzahlen=einwohnerzahlen)
-stime=time.time()
-for i in range(5):
-    expander.expandstr("{{einwohnerzahlen|68384}}", wikidb=db)
-print (time.time()-stime)/5
+from mwlib.templ import cache
+
+db = expander.DictDB(einwohnerzahlen=einwohnerzahlen, langnames=langnames)
+article = u"{{einwohnerzahlen|68384}} {{einwohnerzahlen|64001 (Name)}} " + u" ".join(
+    u"{{langnames|l%04d}}" % i for i in range(900, 1000, 5))
+num_articles = 20
+
+
+def run(template_cache, promote_keys=True):
+    stime = time.time()
+    for i in range(num_articles):
+        e = expander.Expander(article, pagename="test", wikidb=db, template_cache=template_cache)
+        if not promote_keys:
+            # constant #switch keys are only promoted with a template memo
+            e.template_memo = None
+        res = e.expandTemplates()
+    return (time.time() - stime) / num_articles, res
+
+
+def main():
+    before, r1 = run(None, promote_keys=False)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cached, r2 = run(cache.TemplateCache(tmpdir), promote_keys=False)
+        after, r3 = run(cache.TemplateCache(tmpdir))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    assert r1 == r2 == r3
+    print "per article, before:                      %.4fs" % before
+    print "with shared switch tables:                %.4fs (%.1fx)" % (cached, before / cached)
+    print "with shared tables and promoted keys:     %.4fs (%.1fx)" % (after, before / after)
 
+if __name__ == "__main__":
+    main()
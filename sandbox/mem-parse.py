@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+report peak memory and time for parsing a long article (a synthetic
+one or the file given on the command line) into an advanced tree,
+i.e. the parsing part of mw-render
+
+usage: mem-parse.py [FILE]
+"""
+
+import gc
+import resource
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib import advtree
+from mwlib.expander import Expander, DictDB
+from mwlib.refine import compat
+from mwlib.utoken import token
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]], a [[File:Foo.jpg|thumb|left|caption with [[link]]]]
+and an external link [http://example.com/%(i)s example].<ref>A reference with [[link]] and ''style''</ref>
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+# numbered
+; term : definition
+
+=== Subsection ===
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|-
+| <div>div in cell</div> || http://example.org
+|}
+ preformatted line
+ another one
+<blockquote>quoted <b>text</b></blockquote>
+<center>centered</center>
+"""
+
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+    if len(sys.argv) > 1:
+        txt = unicode(open(sys.argv[1], "rb").read(), "utf-8")
+    else:
+        txt = u"".join(section % dict(i=i) for i in range(530))
+    start_rss = maxrss()
+
+    stime = time.time()
+    te = Expander(txt, pagename=u"Article", wikidb=DictDB())
+    raw = te.expandTemplates(True)
+    tree = compat.parse_txt(raw, lang="en", expander=te, uniquifier=te.uniquifier)
+    parsed = time.time() - stime
+    parse_rss = maxrss()
+    advtree.buildAdvancedTree(tree)
+    total = time.time() - stime
+
+    ntokens = sum(1 for x in gc.get_objects() if isinstance(x, token))
+    print "%s characters, %s tokens alive" % (len(txt), ntokens)
+    print "parse:    %.2fs, peak RSS %.1fMB (+%.1fMB)" % (parsed, parse_rss, parse_rss - start_rss)
+    print "advtree:  %.2fs, peak RSS %.1fMB (+%.1fMB)" % (total, maxrss(), maxrss() - start_rss)
+
+if __name__ == "__main__":
+    main()
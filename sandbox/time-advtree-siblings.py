@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure sibling navigation and child removal in advtree and
+TreeCleaner.cleanAll on an article with a list of 10000 items
+"""
+
+import time
+from mwlib.templ import nodes
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib.advtree import buildAdvancedTree, ItemList
+from mwlib.treecleaner import TreeCleaner
+
+
+def getTree(n):
+    txt = u"".join(u"* item %d with [[link %d]]<br/>\n" % (i, i) for i in range(n))
+    tree = parseString(title=u"t", raw=txt, wikidb=DummyDB())
+    buildAdvancedTree(tree)
+    return tree
+
+
+def walkNext(tree):
+    item = tree.getChildNodesByClass(ItemList)[0].children[0]
+    while item is not None:
+        item = item.next
+
+
+def walkPrevious(tree):
+    item = tree.getChildNodesByClass(ItemList)[0].children[-1]
+    while item is not None:
+        item = item.previous
+
+
+def siblings(tree):
+    for item in tree.getChildNodesByClass(ItemList)[0].children[:1000]:
+        item.siblings
+
+
+def removeHalf(tree):
+    lst = tree.getChildNodesByClass(ItemList)[0]
+    for item in lst.children[::2]:
+        lst.removeChild(item)
+
+
+def cleanAll(tree):
+    TreeCleaner(tree).cleanAll()
+
+
+def main():
+    n = 10000
+    for f in [walkNext, walkPrevious, siblings, removeHalf, cleanAll]:
+        tree = getTree(n)
+        stime = time.time()
+        f(tree)
+        print "%-15s %.3fs" % (f.__name__, time.time() - stime)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure expanding templates nested 40 levels deep, which append many
+items to the output, with and without an ExpansionBudget
+"""
+
+import time
+from mwlib.templ import nodes
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.misc import DictDB
+from mwlib.templ.budget import ExpansionBudget
+
+
+def run(raw, templates, budget, n=3):
+    best = None
+    for i in range(n):
+        te = Expander(raw, pagename=u"p", wikidb=DictDB(**templates))
+        te.budget = ExpansionBudget() if budget else None
+        stime = time.time()
+        te.expandTemplates(True)
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best
+
+
+def main():
+    depth = 40
+    templates = dict((u"t%d" % i, u"{{t%d|{{{1}}}}}" % (i + 1) + u"{{{1}}} " * 200) for i in range(depth))
+    templates[u"t%d" % depth] = u"{{{1}}}"
+    raw = u"".join(u"{{t0|%d}}\n" % i for i in range(20))
+    t_none = run(raw, templates, False)
+    t_budget = run(raw, templates, True)
+    print "no budget: %.3fs budget: %.3fs" % (t_none, t_budget)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+"""
+compare the compiled refine passes in mwlib.refine._core with their
+python versions on a long article (default: the synthetic one from
+time-refine.py, or the file given on the command line)
+"""
+
+import os
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib.refine import core, tagparser
+
+compiled = [(core.parse_singlequote, "run"),
+            (core.parse_lines, "analyze"),
+            (core.parse_paragraphs, "run"),
+            (tagparser.tagparser, "run")]
+
+
+def run(txt, n=5):
+    best = None
+    timings = {}
+    for i in range(n):
+        t = {}
+        stime = time.time()
+        core.parse_txt(txt, timings=t)
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+            timings = t
+    return best, timings
+
+
+def main():
+    if core._core is None:
+        sys.exit("mwlib.refine._core not built")
+
+    if len(sys.argv) > 1:
+        txt = unicode(open(sys.argv[1], "rb").read(), "utf-8")
+    else:
+        g = {}
+        execfile(os.path.join(os.path.dirname(__file__), "time-refine.py"), g)
+        txt = u"".join(g["section"] % dict(i=i) for i in range(300))
+    print "%s characters" % len(txt)
+
+    t_compiled, timings_compiled = run(txt)
+    saved = [(cls, name, getattr(cls, name)) for cls, name in compiled]
+    for cls, name in compiled:
+        setattr(cls, name, getattr(cls, "py_" + name))
+    try:
+        t_python, timings_python = run(txt)
+    finally:
+        for cls, name, meth in saved:
+            setattr(cls, name, meth)
+
+    print "python:   %.3fs" % t_python
+    print "compiled: %.3fs (%.2fx)" % (t_compiled, t_python / t_compiled)
+    for name in ["parse_singlequote", "parse_lines", "parse_paragraphs"] + sorted(x for x in timings_python if x.startswith("<tagparser")):
+        print "  %-40s %.3fs -> %.3fs" % (name, timings_python.get(name, 0), timings_compiled.get(name, 0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure AdvancedNode.copy and copy.deepcopy on a table with 300 rows
+"""
+
+import copy
+import time
+from mwlib.templ import nodes
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib.advtree import buildAdvancedTree, Table
+
+row = u"""|-
+| style="background:#eee; text-align:left" | [[link %(i)s|label]] || '''bold''' ''italic'' || [http://example.com/%(i)s ex] || <span class="x">%(i)s</span> || [[File:x%(i)s.jpg|20px]] || text %(i)s<ref>ref %(i)s</ref>
+"""
+
+
+def deepcopyNode(node):
+    p = node.parent
+    try:
+        node.parent = None
+        return copy.deepcopy(node)
+    finally:
+        node.parent = p
+
+
+def run(f, node, n=5):
+    best = None
+    for i in range(n):
+        stime = time.time()
+        f(node)
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best
+
+
+def main():
+    txt = u'{| class="wikitable"\n' + u"".join(row % dict(i=i) for i in range(300)) + u"|}\n"
+    tree = parseString(title=u"t", raw=txt, wikidb=DummyDB())
+    buildAdvancedTree(tree)
+    table = tree.getChildNodesByClass(Table)[0]
+    print "%d nodes" % len(list(table.allchildren()))
+    t_deepcopy = run(deepcopyNode, table)
+    t_copy = run(lambda node: node.copy(), table)
+    print "deepcopy: %.3fs copy: %.3fs (%.1fx)" % (t_deepcopy, t_copy, t_deepcopy / t_copy)
+
+if __name__ == "__main__":
+    main()
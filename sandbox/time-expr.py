@@ -1,15 +1,48 @@
 #! /usr/bin/env python
+"""
+measure #expr evaluation on a corpus of expressions captured from
+test pages (one repr'ed expression per line, default: expr.txt)
+"""
 
+import os
 import sys
 import time
 from mwlib import expr
 
-e = []
-for x in sys.stdin:
-    e.append(eval(x))
 
-print "have %s expressions" % len(e)
-stime=time.time()
-for x in e:
-    expr.expr(u"1+2")
-print "needed", time.time()-stime
+def load(fn):
+    return [eval(x) for x in open(fn) if x.strip()]
+
+
+def run(fun, exprs):
+    stime = time.time()
+    res = []
+    for x in exprs:
+        try:
+            res.append(fun(x))
+        except Exception, err:
+            res.append(repr(err))
+    return time.time() - stime, res
+
+
+def main():
+    if len(sys.argv) > 1:
+        fn = sys.argv[1]
+    else:
+        fn = os.path.join(os.path.dirname(__file__), "expr.txt")
+    exprs = load(fn)
+    print "have %s expressions, %s different" % (len(exprs), len(set(exprs)))
+
+    t_parse, r_parse = run(lambda x: expr.Expr().parse_expr(x), exprs)
+    print "parse_expr:     %.3fs" % (t_parse,)
+
+    t_comp, r_comp = run(expr.evaluate, exprs)
+    assert r_comp == r_parse, "compiled expressions produce different results"
+    print "compiled:       %.3fs (%.2fx)" % (t_comp, t_parse / t_comp)
+
+    t_cached, r_cached = run(expr.expr, exprs)
+    assert r_cached == r_parse
+    print "cached results: %.3fs (%.2fx)" % (t_cached, t_parse / t_cached)
+
+if __name__ == "__main__":
+    main()
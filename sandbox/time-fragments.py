@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure parsing articles, which share a large navigation box, with and
+without reusing the parsed table (refine.fragments.FragmentCache)
+"""
+
+import re
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib.expander import Expander, DictDB
+from mwlib.refine import core, fragments
+
+article = u"""'''Article %(i)s''' is about [[topic %(i)s]] with ''some'' text.
+
+== Section ==
+* item [[a]]
+* item <span>b</span>
+
+{{navbox}}
+[[Category:Things]]
+"""
+
+navbox = u"""{| class="navbox" style="width:100%%"
+|-
+! colspan="2" | [[Topic]]
+%s
+|}"""
+
+row = u"""|-
+! [[Group %(i)s]]
+| """ + u" &middot; ".join(u"[[Item %(i)s" + str(k) + u"|''item'' " + str(k) + u"]]" for k in range(20)) + u"\n"
+
+addr = re.compile(" at 0x[0-9a-f]+")
+
+
+def dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, addr.sub("", repr(v))) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text", "nshandler"))
+        res.append((d, t.text, dump(t.children or [])))
+    return res
+
+
+def parse_all(db, n, cache):
+    res = []
+    stime = time.time()
+    for i in range(n):
+        e = Expander(article % dict(i=i), pagename=u"Article %s" % i, wikidb=db)
+        e.record_template_spans = True
+        txt = e.expandTemplates(True)
+        res.append(core.parse_txt(txt, uniquifier=e.uniquifier, expander=e,
+                                  template_spans=e.template_spans, fragments=cache))
+    return time.time() - stime, res
+
+
+def main():
+    n = 50
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    db = DictDB(navbox=navbox % u"".join(row % dict(i=i) for i in range(15)))
+    print "%s articles" % n
+
+    t_plain, r_plain = parse_all(db, n, None)
+    print "without cache: %.3fs" % t_plain
+    cache = fragments.FragmentCache()
+    t_cache, r_cache = parse_all(db, n, cache)
+    assert len(cache) == 1
+    assert [dump(x) for x in r_plain] == [dump(x) for x in r_cache], "reused tables differ"
+    print "with cache:    %.3fs (%.2fx)" % (t_cache, t_plain / t_cache)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure parseString with and without lazy conversion to parser.nodes
+(refine.compat.LazyChildren), when only the section headings are read
+and when the whole tree is walked
+"""
+
+import time
+from mwlib.templ import nodes
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib.parser import nodes as N
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]] and [http://example.com/%(i)s example].
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|}
+"""
+
+
+def headings(article):
+    return [x.children[0].asText() for x in article.children if isinstance(x, N.Section)]
+
+
+def walk(article):
+    return len(article.find(N.Text))
+
+
+def run(txt, lazy, read, n=3):
+    db = DummyDB()
+    best = None
+    for i in range(n):
+        stime = time.time()
+        read(parseString(title=u"t", raw=txt, wikidb=db, lazy=lazy))
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best
+
+
+def main():
+    txt = u"".join(section % dict(i=i) for i in range(300))
+    print "%s characters" % len(txt)
+    for name, read in [("headings", headings), ("whole tree", walk)]:
+        t_eager = run(txt, False, read)
+        t_lazy = run(txt, True, read)
+        print "%-10s eager: %.3fs lazy: %.3fs (%.2fx)" % (name, t_eager, t_lazy, t_eager / t_lazy)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure getChildNodesByClass on an article, TreeCleaner.cleanAll and
+buildAdvancedTree with and without the NodeIndex of the article
+"""
+
+import time
+from mwlib.templ import nodes
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib import advtree
+from mwlib.treecleaner import TreeCleaner
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]] and [http://example.com/%(i)s example].
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|}
+"""
+
+txt = u"".join(section % dict(i=i) for i in range(300))
+txt += u"\n<references/>\n[[File:x.jpg|thumb|image]]\n"
+
+queries = [advtree.Table, advtree.ImageLink, advtree.ReferenceList, advtree.Reference,
+           advtree.Gallery, advtree.Section, advtree.Math]
+
+
+def getTree(index):
+    tree = parseString(title=u"t", raw=txt, wikidb=DummyDB())
+    stime = time.time()
+    advtree.buildAdvancedTree(tree, index=index)
+    return tree, time.time() - stime
+
+
+def query(tree):
+    for i in range(10):
+        for klass in queries:
+            tree.getChildNodesByClass(klass)
+
+
+def cleanAll(tree):
+    TreeCleaner(tree).cleanAll()
+
+
+def main():
+    print "%s characters" % len(txt)
+    for index in (False, True):
+        tree, needed = getTree(index)
+        print "index=%-5s buildAdvancedTree %.3fs" % (index, needed)
+        for f in [query, cleanAll]:
+            tree, needed = getTree(index)
+            stime = time.time()
+            f(tree)
+            print "index=%-5s %-17s %.3fs" % (index, f.__name__, time.time() - stime)
+
+if __name__ == "__main__":
+    main()
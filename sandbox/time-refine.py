@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure the refine passes on a long article (default: a synthetic one
+built from typical markup, or the file given on the command line) with
+and without fusing local passes, and show the time spent per pass
+"""
+
+import re
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib.refine import core
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]], a [[File:Foo.jpg|thumb|left|caption with [[link]]]]
+and an external link [http://example.com/%(i)s example].<ref>A reference with [[link]] and ''style''</ref>
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+# numbered
+; term : definition
+
+=== Subsection ===
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|-
+| <div>div in cell</div> || http://example.org
+|}
+ preformatted line
+ another one
+<blockquote>quoted <b>text</b></blockquote>
+<center>centered</center>
+"""
+
+addr = re.compile(" at 0x[0-9a-f]+")
+
+
+def dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, addr.sub("", repr(v))) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text"))
+        res.append((d, t.text, dump(t.children or [])))
+    return res
+
+
+def run(txt, n=5, **kw):
+    best = None
+    for i in range(n):
+        stime = time.time()
+        res = core.parse_txt(txt, **kw)
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best, res
+
+
+def main():
+    if len(sys.argv) > 1:
+        txt = unicode(open(sys.argv[1], "rb").read(), "utf-8")
+    else:
+        txt = u"".join(section % dict(i=i) for i in range(300))
+    print "%s characters" % len(txt)
+
+    t_unfused, r_unfused = run(txt, nofuse=True)
+    print "unfused: %.3fs" % t_unfused
+    t_fused, r_fused = run(txt)
+    assert dump(r_unfused) == dump(r_fused), "fused passes produce a different tree"
+    print "fused:   %.3fs (%.2fx)" % (t_fused, t_unfused / t_fused)
+
+    timings = {}
+    core.parse_txt(txt, timings=timings)
+    for name, seconds in sorted(timings.items(), key=lambda x: -x[1]):
+        print "  %-40s %.3fs" % (name, seconds)
+
+if __name__ == "__main__":
+    main()
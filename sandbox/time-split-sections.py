@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+compare refining a long article (a synthetic one or the file given on
+the command line) in one piece with refining it section by section,
+in-process and in the worker processes of the refine context
+
+usage: time-split-sections.py [FILE] [PROCESSES]
+"""
+
+import re
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib.refine import core
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]], a [[File:Foo.jpg|thumb|left|caption with [[link]]]]
+and an external link [http://example.com/%(i)s example].<ref>A reference with [[link]] and ''style''</ref>
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+# numbered
+; term : definition
+
+=== Subsection ===
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|-
+| <div>div in cell</div> || http://example.org
+|}
+ preformatted line
+ another one
+<blockquote>quoted <b>text</b></blockquote>
+<center>centered</center>
+"""
+
+addr = re.compile(" at 0x[0-9a-f]+")
+
+
+def dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, addr.sub("", repr(v))) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text"))
+        res.append((d, t.text, dump(t.children or [])))
+    return res
+
+
+def run(txt, n=3, **kw):
+    best = None
+    for i in range(n):
+        stime = time.time()
+        res = core.parse_txt(txt, **kw)
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best, res
+
+
+def main():
+    args = sys.argv[1:]
+    processes = 4
+    if args and args[-1].isdigit():
+        processes = int(args.pop())
+    if args:
+        txt = unicode(open(args[0], "rb").read(), "utf-8")
+    else:
+        txt = u"".join(section % dict(i=i) for i in range(300))
+    print "%s characters, %s sections" % (len(txt), len(core.split_sections(core.tokenize(txt))))
+
+    t_mono, r_mono = run(txt)
+    print "monolithic:        %.3fs" % t_mono
+    expected = dump(r_mono)
+
+    t_split, r_split = run(txt, split_sections=True)
+    assert dump(r_split) == expected, "split sections produce a different tree"
+    print "split:             %.3fs (%.2fx)" % (t_split, t_mono / t_split)
+
+    t_proc, r_proc = run(txt, split_sections=True, processes=processes)
+    assert dump(r_proc) == expected, "worker processes produce a different tree"
+    print "%2d processes:      %.3fs (%.2fx)" % (processes, t_proc, t_mono / t_proc)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure template expansion performance of compiled templates
+against the recursive walk on an infobox heavy page
+"""
+
+import time
+from mwlib import expander
+
+rows = "name image caption country state district population area elevation website".split()
+
+infobox = u"""<includeonly>{| class="infobox"
+|-
+! colspan="2" | {{{name|{{PAGENAME}}}}}
+%s
+|}</includeonly><noinclude>[[Category:Infobox templates]]</noinclude>
+""" % (u"\n".join(u"{{#if:{{{%s|}}}|{{infobox row|%s|{{{%s}}}}}}}" % (r, r, r) for r in rows),)
+
+infobox_row = u"""<includeonly>
+|-
+! {{{1}}}
+| {{#if:{{{2|}}}|{{{2}}}|&nbsp;}}{{#if:{{{3|}}}|<br/>{{{3}}}}}</includeonly>"""
+
+flag = u"""<includeonly>{{#if:{{{1|}}}|[[Image:Flag of {{{1}}}.svg|20px]] [[{{{1}}}]]|{{{2|}}}}}</includeonly>"""
+
+snippet = u"""
+{{infobox|name=Foo|country={{flag|Germany}}|state={{flag|Bavaria}}|population=12345|area=12 km²|website=http://example.com}}
+{{flag|France}} {{flag|Italy}} {{flag||none}}
+"""
+
+db = expander.DictDB({"infobox": infobox, "infobox row": infobox_row, "flag": flag})
+
+
+def run(compile_templates, n=300):
+    e = expander.Expander(snippet * n, pagename="test", wikidb=db)
+    e.compile_templates = compile_templates
+    stime = time.time()
+    res = e.expandTemplates()
+    return time.time() - stime, res
+
+
+def main():
+    t_walk, r_walk = min(run(False) for i in range(10))
+    t_comp, r_comp = min(run(True) for i in range(10))
+    assert r_walk == r_comp, "compiled templates produce different output"
+    print "walk:     %.3fs" % t_walk
+    print "compiled: %.3fs (%.2fx)" % (t_comp, t_walk / t_comp)
+
+if __name__ == "__main__":
+    main()
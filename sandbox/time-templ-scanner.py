@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure the C template tokenizer against the splitrx fallback on a
+large country data like template
+"""
+
+import time
+from mwlib.templ import nodes, scanner
+
+row = u"""{{#switch:{{{1}}}|alias=Germany|flag alias=Flag of Germany.svg|flag alias-1919=Flag of Germany (3-2 aspect ratio).svg|name={{{name|Germany}}}|size={{{size|}}}}}<noinclude>[[Category:Country data templates]]</noinclude><nowiki>|</nowiki>[[Image:Flag.png|20px]]<ref name=x/>
+"""
+
+
+def run(scan, txt, n=10):
+    stime = time.time()
+    for i in range(n):
+        res = scan(txt)
+    return (time.time() - stime) / n, res
+
+
+def main():
+    txt = row * 2000
+    t_rx, r_rx = run(scanner.scan_rx, txt)
+    print "splitrx: %.4fs" % t_rx
+    if scanner._expander is None:
+        print "mwlib._expander not built"
+        return
+    t_c, r_c = run(scanner.scan, txt)
+    assert r_rx == r_c, "C tokenizer produces different tokens"
+    print "C:       %.4fs (%.2fx)" % (t_c, t_rx / t_c)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure parsing a synthetic article with long flat token lists (about
+100k tokens, or n times as many; n may be a fraction) with the refine parsers splicing
+python lists and tokenbuffers
+"""
+
+import gc
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib.refine import core, tokenbuffer
+
+para = u"<span>a</span> [[link|label]] ''b'' <div>c</div> [http://example.com d] "
+row = u"|-\n| cell [[a]] || cell ''b''\n"
+
+
+def run(txt, min_length):
+    tokenbuffer.min_length = min_length
+    timings = {}
+    gc.collect()
+    stime = time.time()
+    res = core.parse_txt(txt, timings=timings)
+    return time.time() - stime, timings, repr(list(core.walknode(res)))
+
+
+def main():
+    assert tokenbuffer.tokenbuffer is not None, "mwlib.refine._core not built"
+    n = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    txt = para * int(3000 * n) + u"\n{|\n" + row * int(2000 * n) + u"|}\n"
+    print "%s tokens, tokenbuffer: %s" % (len(core.tokenize(txt)), tokenbuffer.tokenbuffer)
+
+    t_list, timings_list, r_list = min(run(txt, sys.maxint) for i in range(3))
+    t_buf, timings_buf, r_buf = min(run(txt, 0) for i in range(3))
+    assert r_list == r_buf, "tokenbuffer produces a different tree"
+
+    print "%-40s %8s %8s" % ("", "list", "buffer")
+    for name in sorted(timings_list, key=lambda x: -timings_list[x])[:8]:
+        print "%-40s %7.3fs %7.3fs" % (name, timings_list[name], timings_buf.get(name, 0))
+    print "%-40s %7.3fs %7.3fs" % ("parse_txt", t_list, t_buf)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#! /usr/bin/env python
+"""
+measure utoken.tokenize on a long article (default: the synthetic one
+from mem-parse.py, or the file given on the command line) and on markup
+dense with html tags and entities, compared to the bare scanner
+"""
+
+import os
+import sys
+import time
+from mwlib.templ import nodes
+from mwlib import utoken
+
+dense = u'<span style="color:red; font-weight:bold" class=x>a&amp;b&#160;c&nbsp;</span><td align="left" width=10>x</td><font color=#f00>y</font><br/><abc>z</abc>&#x41; '
+
+
+def best(f, n=5):
+    res = None
+    for i in range(n):
+        stime = time.time()
+        f()
+        needed = time.time() - stime
+        if res is None or needed < res:
+            res = needed
+    return res
+
+
+def main():
+    if len(sys.argv) > 1:
+        txt = unicode(open(sys.argv[1], "rb").read(), "utf-8")
+    else:
+        g = {}
+        execfile(os.path.join(os.path.dirname(__file__), "mem-parse.py"), g)
+        txt = u"".join(g["section"] % dict(i=i) for i in range(530))
+
+    for name, s in [("article", txt), ("dense", dense * 8000)]:
+        t_scan = best(lambda: utoken.scan(s))
+        t_tokenize = best(lambda: utoken.tokenize(s))
+        print "%-8s %8d characters: scan %.3fs, tokenize %.3fs" % (name, len(s), t_scan, t_tokenize)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+measure TreeCleaner.cleanAll with and without skipping the cleaners,
+whose node classes are not in the article (TreeCleaner.getCleanerNodeClasses),
+and for a book cleaned in 1 and in cpu_count() processes
+"""
+
+import time
+import multiprocessing
+from mwlib.templ import nodes
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib.advtree import buildAdvancedTree, Book
+from mwlib.treecleaner import TreeCleaner
+
+section = u"""== Section %(i)s ==
+'''Bold''' and ''italic'' text with a [[link|label]] and [http://example.com/%(i)s example].
+
+* item 1 <span>inline</span>
+** item 1.1 with '''bold'''
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|}
+"""
+
+
+class NoSkipTreeCleaner(TreeCleaner):
+    def getCleanerNodeClasses(self):
+        return {}
+
+
+def run(txt, klass, n=3):
+    db = DummyDB()
+    best = None
+    for i in range(n):
+        tree = parseString(title=u"t", raw=txt, wikidb=db)
+        buildAdvancedTree(tree)
+        stime = time.time()
+        klass(tree).cleanAll()
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best
+
+
+def run_book(txt, articles, processes, n=3):
+    db = DummyDB()
+    best = None
+    for i in range(n):
+        book = Book()
+        for k in range(articles):
+            book.children.append(parseString(title=u"t%d" % k, raw=txt, wikidb=db))
+        buildAdvancedTree(book)
+        stime = time.time()
+        TreeCleaner(book, processes=processes).cleanAll()
+        needed = time.time() - stime
+        if best is None or needed < best:
+            best = needed
+    return best
+
+
+def main():
+    txt = u"".join(section % dict(i=i) for i in range(300))
+    print "%s characters" % len(txt)
+    t_all = run(txt, NoSkipTreeCleaner)
+    t_skip = run(txt, TreeCleaner)
+    print "all cleaners: %.3fs skipping: %.3fs (%.2fx)" % (t_all, t_skip, t_all / t_skip)
+
+    txt = u"".join(section % dict(i=i) for i in range(30))
+    processes = multiprocessing.cpu_count()
+    t_one = run_book(txt, 100, 1)
+    t_many = run_book(txt, 100, processes)
+    print "book of 100 articles, 1 process: %.3fs %d processes: %.3fs (%.2fx)" % (t_one, processes, t_many, t_one / t_many)
+
+if __name__ == "__main__":
+    main()
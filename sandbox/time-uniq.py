@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+"""
+measure the Uniquifier on a page with thousands of <ref> tags, on text
+without refs and on many short strings with new Uniquifiers (like template
+arguments and parse_txt calls without an uniquifier)
+"""
+
+import re
+import sys
+import time
+from mwlib import uniq
+
+
+def best(f, n=5):
+    res = None
+    for i in range(n):
+        stime = time.time()
+        f()
+        needed = time.time() - stime
+        if res is None or needed < res:
+            res = needed
+    return res
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    refs = u"".join(u"Sentence %d.<ref name=\"r%d\">Source %d, ''p. %d'' [http://example.com/%d]</ref> More<ref name=\"r%d\"/> text.\n" % (i, i, i, i, i, i) for i in range(count))
+    refs += u"<references/>\n"
+    plain = u"plain text with <b>some</b> words and [[links]] here.\n" * 20000
+
+    def tags_and_uniq(txt):
+        u = uniq.Uniquifier()
+        u.replace_uniq(u.replace_tags(txt))
+
+    print "%d refs (%d characters): %.3fs" % (count, len(refs), best(lambda: tags_and_uniq(refs)))
+    print "text without refs (%d characters): %.3fs" % (len(plain), best(lambda: tags_and_uniq(plain)))
+
+    def short_strings():
+        for i in range(1000):
+            # other modules fill the re module's cache
+            if i % 50 == 0:
+                re.purge()
+            tags_and_uniq(u"a <b>short</b> string")
+    print "1000 short strings: %.3fs" % best(short_strings)
+
+if __name__ == "__main__":
+    main()
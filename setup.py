@@ -49,6 +49,7 @@ def main():
 
     ext_modules = []
     ext_modules.append(Extension("mwlib._uscan", ["mwlib/_uscan.cc"]))
+    ext_modules.append(Extension("mwlib._expander", ["mwlib/_expander.cc"]))
 
     for x in glob.glob("mwlib/*/*.c"):
         modname = x[:-2].replace("/", ".")
@@ -51,6 +51,37 @@ def test_copy():
     _check(r, c)
 
 
+def test_copyNotShared():
+    raw = u"""
+{| class="wikitable"
+|-
+| style="background:#eee" | [[Foo|bar]] || [[File:x.jpg|20px]] '''bold'''
+|}
+"""
+    r = parseString(title="X33", raw=raw, wikidb=DummyDB())
+    buildAdvancedTree(r)
+    cell = r.getChildNodesByClass(Cell)[0]
+    c = cell.copy()
+    assert c.parent is None
+    _treesanity(c)
+
+    for n1, n2 in zip([cell] + list(cell.allchildren()), [c] + list(c.allchildren())):
+        assert n1 is not n2
+        assert n1.__class__ is n2.__class__
+        assert n1.caption == n2.caption
+        assert n1.children is not n2.children
+        for k in ("vlist", "style"):
+            v = getattr(n1, k, None)
+            if v:
+                assert getattr(n2, k) == v
+                assert getattr(n2, k) is not v
+        if getattr(n1, "nshandler", None) is not None:
+            assert n2.nshandler is n1.nshandler
+
+    c.vlist["style"]["background"] = "#fff"
+    assert cell.vlist["style"]["background"] == "#eee"
+
+
 def test_removeNewlines():
 
     # test no action within preformattet
@@ -264,3 +295,111 @@ Image:Cassini Saturn Orbit Insertion.jpg|''[[Cassini–Huygens]]''<br>First Satu
     assert len(images) == 9
     for image in images:
         assert image.render_caption == True
+
+
+def _scanIndex(lst, el):
+    for i, e in enumerate(lst):
+        if e is el:
+            return i
+    return None
+
+
+def test_cachedIndex():
+    import random
+    from mwlib.advtree import Article, Paragraph
+
+    r = random.Random(42)
+    article = Article()
+    for i in range(20):
+        article.appendChild(Paragraph())
+    for i in range(1000):
+        children = article.children
+        c = r.choice(children)
+        op = r.randrange(7)
+        if op == 0:
+            article.appendChild(Paragraph())
+        elif op == 1 and len(children) > 5:
+            article.removeChild(c)
+        elif op == 2 and len(children) > 5:
+            article.replaceChild(c, [Paragraph() for k in range(r.randrange(3))])
+        elif op == 3:
+            target = r.choice(children)
+            if target is not c:
+                c.moveto(target, prefix=r.choice([True, False]))
+        elif op == 4:
+            Paragraph().moveto(c, prefix=r.choice([True, False]))
+        elif op == 5:
+            # children changed without the methods of AdvancedNode
+            n = Paragraph()
+            n.parent = article
+            children.insert(r.randrange(len(children)), n)
+            if len(children) > 5:
+                children.pop(r.randrange(len(children))).parent = None
+        elif op == 6:
+            for x in children[::2]:
+                if len(children) > 5:
+                    article.removeChild(x)
+
+        _treesanity(article)
+        for x in r.sample(article.children, 5):
+            i = _scanIndex(article.children, x)
+            assert _idIndex(article.children, x) == i
+            assert article.hasChild(x)
+            assert x.previous is (article.children[i-1] if i > 0 else None)
+            assert x.next is (article.children[i+1] if i + 1 < len(article.children) else None)
+            assert x.siblings == [y for y in article.children if y is not x]
+
+
+def test_nodeIndex():
+    from mwlib.advtree import Article, Paragraph, Table
+
+    raw = u"""
+== Section ==
+text [[File:x.jpg|thumb|image]]
+{|
+|-
+| cell [[File:y.jpg]]
+{|
+|-
+| nested
+|}
+|}
+* item [[File:z.jpg]]
+"""
+    tree = parseString(title="X33", raw=raw, wikidb=DummyDB())
+    buildAdvancedTree(tree, index=True)
+    assert tree._nodeIndex is not None
+
+    def check(tree):
+        for klass in (ImageLink, Table, Cell, Section, Paragraph, Text):
+            res = tree.getChildNodesByClass(klass)
+            walk = [x for x in tree.getAllChildren() if x.__class__ == klass]
+            assert len(res) == len(walk)
+            assert all(a is b for a, b in zip(res, walk))
+
+    check(tree)
+    assert len(tree.getChildNodesByClass(ImageLink)) == 3
+    assert len(tree.getChildNodesByClass(Table)) == 2
+
+    images = tree.getChildNodesByClass(ImageLink)
+    images[0].parent.removeChild(images[0])
+    check(tree)
+    images[2].moveto(tree.children[0], prefix=True)
+    check(tree)
+    tables = tree.getChildNodesByClass(Table)
+    tables[0].parent.replaceChild(tables[0], [Paragraph(), tables[1]])
+    check(tree)
+    p = Paragraph()
+    p.appendChild(Cell())
+    tree.children[-1].appendChild(p)
+    check(tree)
+    # removed without the methods of AdvancedNode
+    del p.children[:]
+    check(tree)
+
+    other = parseString(title="X34", raw=u"text", wikidb=DummyDB())
+    buildAdvancedTree(other, index=True)
+    tree.getChildNodesByClass(Table)[0].moveto(other.children[0])
+    check(tree)
+    check(other)
+    assert len(other.getChildNodesByClass(Table)) == 1
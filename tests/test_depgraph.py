@@ -0,0 +1,53 @@
+#! /usr/bin/env py.test
+
+import os
+from mwlib import nshandling
+from mwlib.siteinfo import get_siteinfo
+from mwlib.net import depgraph
+
+nshandler = nshandling.nshandler(get_siteinfo("en"))
+
+
+def test_get_dependencies():
+    raw = u"{{foo}}{{Template:Bar_baz|x}}{{lc:{{{1}}}}}{{#if:1|{{qux}}}}{{/sub}}{{:Main}}{{ {{{1}}} }}{{Navbox}}"
+    deps = depgraph.get_dependencies(raw, u"Template:Navbox", nshandler)
+    assert deps == set([u"Template:Foo", u"Template:Bar baz", u"Template:Qux", u"Template:Navbox/sub", u"Main"])
+
+
+def test_closure():
+    g = depgraph.template_graph()
+    g.update(u"Template:A", u"{{B}}{{C}}", nshandler)
+    g.update(u"Template:B", u"{{D}}", nshandler)
+    g.update(u"Template:D", u"{{B}}", nshandler)
+    assert g.get(u"Template:A") == [u"Template:B", u"Template:C"]
+    assert g.closure([u"Template:A"]) == set([u"Template:A", u"Template:B", u"Template:C", u"Template:D"])
+    assert g.closure([u"Template:B", u"Template:X"]) == set([u"Template:B", u"Template:D", u"Template:X"])
+
+
+def test_save_merges(tmpdir):
+    path = tmpdir.join("graph.json").strpath
+    g1 = depgraph.template_graph(path)
+    g2 = depgraph.template_graph(path)
+    g1.update(u"Template:A", u"{{B}}", nshandler)
+    g2.update(u"Template:B", u"{{C}}", nshandler)
+    g1.save()
+    g2.save()
+
+    g = depgraph.template_graph(path)
+    assert len(g) == 2
+    assert g.closure([u"Template:A"]) == set([u"Template:A", u"Template:B", u"Template:C"])
+
+
+def test_get_graph(tmpdir):
+    assert depgraph.get_graph("http://en.wikipedia.org/w/api.php").path is None
+
+    os.environ["MWLIB_FETCH_TEMPLATE_GRAPH_DIR"] = tmpdir.strpath
+    try:
+        g = depgraph.get_graph("http://en.wikipedia.org/w/api.php")
+        g.update(u"Template:A", u"{{B}}", nshandler)
+        g.save()
+        assert os.path.dirname(g.path) == tmpdir.strpath
+        assert depgraph.get_graph("http://en.wikipedia.org/w/api.php").get(u"Template:A") == [u"Template:B"]
+        assert len(depgraph.get_graph("http://de.wikipedia.org/w/api.php")) == 0
+    finally:
+        del os.environ["MWLIB_FETCH_TEMPLATE_GRAPH_DIR"]
@@ -716,3 +716,30 @@ def test_safesubst():
     yield expandstr, "{{safesubst:#expr:1+2}}", "3"
     yield expandstr, "{{{{{|safesubst:}}}#expr:1+3}}", "4"
     yield expandstr, "{{safesubst:#if: 1| yes | no}}", "yes"
+
+
+def test_argument_cache():
+    db = DictDB(a=u"{{{1}}}{{{1}}}{{#if:{{{x}}}|{{{x}}}{{{x}}}}}", b=u"B")
+    e = expander.Expander(u"{{a|{{b}}|x={{b}}}}", wikidb=db)
+    e.template_memo = None
+    assert e.expandTemplates() == u"BBBB"
+    assert e.argument_expansions == 2
+    assert e.argument_cache_hits == 3
+
+    args = expander.ArgumentList(args=[expander.parse(u"{{b}}")], expander=e, variables=expander.ArgumentList(expander=e))
+    assert args[0] == u"B"
+    assert args.get(0, None) == u"B"
+    assert e.argument_expansions == 3
+    assert e.argument_cache_hits == 4
+
+
+def test_switch_promoted_keys():
+    db = DictDB(s=u"{{#switch:{{{1}}}|{{lc:A}}=first|a=second|{{{2|}}}=arg|{{uc:b}}|1.0=one|{{#expr:1+1}}=two|#default=D}}")
+    e = expander.Expander(u"{{s|a}} {{s|B}} {{s|b}} {{s|x|x}} {{s|1}} {{s|2.0}} {{s|a}} {{s|B}} {{s|2}}", wikidb=db)
+    e.template_memo.cache.maxsize = 0
+    assert e.expandTemplates() == u"first one D arg one two first one two"
+
+    (node, keys, promoted), = e.switch_tables.values()
+    assert promoted[u"a"] == 0
+    assert promoted[2] == 3
+    assert keys[1] is None  # depends on {{{2}}}
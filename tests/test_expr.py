@@ -163,3 +163,27 @@ def test_braindamaged_scientific():
     yield expandstr, "{{#expr:1e2e3}}", "100000"
     yield ee, "{{#expr:2*e}}", 2 * math.e
     yield ee, "{{#expr: e E E}}", 1420.9418661882
+
+
+def _parse_expr(f, s):
+    try:
+        res = f(s)
+        return repr(res), type(res)
+    except Exception, err:
+        return type(err), str(err)
+
+
+def test_compiled_same_as_parse_expr():
+    for s in ["1", " -5 ", "+.5", "1.5", "3*1000", "7 mod 3", "2 ^ 10", "5 round 2", "1<2", "1 <> 1",
+              "(1+2)*3", "-2^4", "abs(-5) + pi", "1e2e3", "2 e 3", "(-1)e(-0.5)", "1.2.3", "1 2", "(1",
+              "1)", "1/0", "1/0)", "1 +", "*3", "(1)(2)", "1 foo 2", "1.", "1 , 2", "not 0 and 1 or 0", ""]:
+        expected = _parse_expr(lambda x: expr.Expr().parse_expr(x), s)
+        assert _parse_expr(expr.evaluate, s) == expected, "different result for %r" % (s,)
+        assert _parse_expr(expr.evaluate, s) == expected, "different result for %r" % (s,)
+
+
+def test_compiled_shapes():
+    assert expr.evaluate("(3*1000)+1") == 3001
+    assert expr.evaluate("(7*1000)+2.5") == 7002.5
+    f = expr.compile_expr("(3*1000)+1")
+    assert f(["12", "10", "0.5"]) == 120.5
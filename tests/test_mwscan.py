@@ -47,3 +47,127 @@ def test_table_bol_end_code():
 
 def test_table_bol_end():
     _check_table_markup("foo |} bar")
+
+
+def test_token_slots():
+    t, tag = mwscan.tokenize(u"abc<b>")
+    assert not t.__dict__
+    assert t.text == u"abc"
+    assert tag.rawtagname == u"b"
+    t.tagname = "x"
+    assert t.__dict__ == dict(tagname="x")
+
+
+def test_token_change_class():
+    from mwlib.parser import nodes
+    t = mwscan.token(type=mwscan.token.t_text, text=u"abc", caption=u"abc")
+    t.__class__ = nodes.Text
+    assert t.text == u"abc"
+    assert t.caption == u"abc"
+
+
+def test_token_pickle():
+    import copy
+    import cPickle
+    t = mwscan.tokenize(u"<b>")[0]
+    for protocol in (0, 2):
+        t2 = cPickle.loads(cPickle.dumps(t, protocol))
+        assert (t2.type, t2.text, t2.rawtagname) == (t.type, t.text, t.rawtagname)
+    t2 = copy.deepcopy(t)
+    assert (t2.type, t2.text, t2.start, t2.vlist) == (t.type, t.text, t.start, t.vlist)
+
+
+def test_token_fields():
+    from mwlib.utoken import token, token_fields
+    assert set(token.__slots__) == set(token_fields + ("__dict__", "__weakref__"))
+    t = token(type=token.t_text, start=1, len=2, source=u"abcd", text=u"bc", x=3)
+    d = t.__getstate__()
+    assert [d[x] for x in token_fields] == [token.t_text, 1, 2, u"abcd", u"bc"]
+
+
+def test_scan_entities():
+    toks = mwscan.tokenize(u"&amp;&#65;&#x42;&nope;&#x110000;")
+    assert [t.type for t in toks] == [mwscan.token.t_text] * 5
+    assert [t.text for t in toks] == [u"&", u"A", u"B", u"&nope;", u"&#x110000;"]
+
+
+def test_scan_html_tags():
+    toks = mwscan.tokenize(u"<B>x</B ><br/></br><xyz><a/b>")
+    b, x, end_b, br, end_br, xyz, ab = toks
+    assert (b.type, b.rawtagname, b.tag_isEndToken, b.tag_selfClosing) == (mwscan.token.t_html_tag, u"b", False, False)
+    assert (end_b.type, end_b.rawtagname, end_b.tag_isEndToken) == (mwscan.token.t_html_tag_end, u"b", True)
+    assert (br.type, br.rawtagname, br.tag_selfClosing) == (mwscan.token.t_html_tag, u"br", True)
+    assert (end_br.type, end_br.tag_isEndToken) == (mwscan.token.t_html_tag, False)
+    assert (xyz.type, xyz.text) == (mwscan.token.t_text, u"<xyz>")
+    assert (ab.type, ab.text) == (mwscan.token.t_text, u"<a/b>")
+
+
+def test_scan_html_tag_attributes():
+    from mwlib.refine.util import parseParams
+    attrs = u""" class="a b" Style='color: red;X:y' width=12 height = " 3 " x=%:#y nope =+ id="" """
+    t = mwscan.tokenize(u"<div%s>" % attrs)[0]
+    assert t.vlist == parseParams(attrs)
+    assert t.vlist == {u"class": u"a b", "style": {u"color": u"red", u"x": u"y"},
+                       u"width": 12, u"height": 3, u"x": u"%:#y", u"id": u""}
+
+
+def test_scan_html_tag_uniq():
+    from mwlib.uniq import Uniquifier
+    u = Uniquifier()
+    marker = u.replace_tags(u"<nowiki>x</nowiki>")
+    t = mwscan.tokenize(u"<span title=%s>" % marker, uniquifier=u)[0]
+    assert t.rawtagname == u"span"
+    assert t.text == u"<span title=x>"
+
+
+def _tokenize_py(text, uniquifier=None):
+    """tokenize with the html tags and entities classified in python,
+    the way _compat_scanner did before scan_ex"""
+    res = []
+    for type, start, tlen in mwscan.scan(text):
+        if type == mwscan.token.t_begintable:
+            count = text[start:start + tlen].count(":")
+            if count:
+                res.append(mwscan.token(type=mwscan.token.t_colon, start=start, len=count, source=text))
+            tlen -= count
+            start += count
+        t = mwscan.token(type=type, start=start, len=tlen, source=text)
+        if type == mwscan.token.t_entity:
+            t.text = mwscan.resolve_entity(t.text)
+            t.type = mwscan.token.t_text
+        elif type == mwscan.token.t_html_tag:
+            if uniquifier:
+                t.text = uniquifier.replace_uniq(t.text)
+            mwscan._analyze_html_tag(t)
+            if t.rawtagname not in mwscan.compat_scan.allowed_tags:
+                t = mwscan.token(type=mwscan.token.t_text, start=start, len=tlen, source=text)
+        res.append(t)
+    return res
+
+
+def _dump(toks):
+    return [(t.type, t.start, t.len, t.text, t.rawtagname, t.vlist,
+             getattr(t, "tag_selfClosing", None), getattr(t, "tag_isEndToken", None)) for t in toks]
+
+
+def test_scan_random():
+    from mwlib.uniq import Uniquifier
+    import random
+    u = Uniquifier()
+    markers = [u.replace_tags(u"<nowiki>x</nowiki>"), u.replace_tags(u"<nowiki>b></nowiki>")]
+    parts = [u"<", u">", u"/", u"b", u"span", u"br", u"xyz", u" ", u"=", u'"', u"'", u"\n", u"\0",
+             u"&", u"#", u"x", u"4", u"2", u";", u"amp", u"style=", u"color:red", u":", u"{|",
+             u"<span%s>" % markers[0], u"<%s" % markers[1]] + markers
+    r = random.Random(23)
+    for i in range(3000):
+        txt = u"".join(r.choice(parts) for j in range(r.randint(0, 20)))
+        for uniquifier in (None, u):
+            assert _dump(mwscan.tokenize(txt, uniquifier=uniquifier)) == _dump(_tokenize_py(txt, uniquifier)), repr(txt)
+
+
+def test_scan_html_tag_uniq_not_allowed():
+    from mwlib.uniq import Uniquifier
+    u = Uniquifier()
+    marker = u.replace_tags(u"<nowiki>x</nowiki>")
+    t = mwscan.tokenize(u"<span%s>" % marker, uniquifier=u)[0]
+    assert t.type == mwscan.token.t_text
@@ -655,3 +655,128 @@ def test_newline_in_link_text():
     core.show(r)
     links = core.walknodel(r, lambda x: x.type == T.t_complex_link)
     assert links, "no links found"
+
+
+def _dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, v) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text", "nshandler"))
+        res.append((d, t.text, _dump(t.children or [])))
+    return res
+
+
+def test_fused_passes_same_result():
+    s = """== Section ==
+'''Bold''' and ''italic'' with a [[link|label]], [[File:Foo.jpg|thumb|caption [[link]]]]
+and [http://example.com example].<ref>A reference with [[link]] and ''style''</ref>
+* item <span>inline</span>
+** item with '''bold'''
+; term : definition
+=== Subsection ===
+{| class="wikitable"
+|-
+! header 1 !! header 2
+|-
+| cell [[a]] || cell ''b''
+|-
+| <div>div in cell</div> || http://example.org
+|}
+ preformatted
+<blockquote>quoted <b>text</b></blockquote>
+<references/>
+"""
+    unfused = core.parse_txt(s, nofuse=True)
+    fused = core.parse_txt(s)
+    assert _dump(fused) == _dump(unfused)
+
+
+def test_combined_parser_schedule():
+    calls = []
+
+    def local1(tokens, xopts):
+        calls.append(("local1", len(tokens)))
+    local1.local = True
+
+    def local2(tokens, xopts):
+        calls.append(("local2", len(tokens)))
+    local2.local = True
+
+    def walker(tokens, xopts):
+        calls.append(("walker", len(tokens)))
+    walker.need_walker = False
+
+    p = core.combined_parser([local2, local1, walker])
+    assert p.schedule() == [(False, [walker]), (True, [local1, local2])]
+    p = core.combined_parser([local2, local1, walker], fuse=False)
+    assert p.schedule() == [(False, [walker]), (True, [local1]), (True, [local2])]
+
+    tokens = tokenize("[[a|b]]")
+    core.combined_parser([local2, local1, walker])(tokens, empty())
+    assert calls == [("walker", 5), ("local1", 5), ("local2", 5)]
+
+
+def test_parse_txt_timings():
+    timings = {}
+    core.parse_txt("== a ==\n[[b]] ''c'' <div>d</div>", timings=timings)
+    assert "parse_links" in timings
+    assert "parse_singlequote" in timings
+    assert "<tagparser div>" in timings
+
+
+def test_split_sections():
+    s = u"""intro
+== a ==
+x <div>
+== in div ==
+</div>
+{|
+|-
+|
+== in table ==
+|}
+=== b ===
+[[link
+== in link ==
+]]
+== c ==
+"""
+    chunks = core.split_sections(tokenize(s))
+    assert [T.join_as_text(c) for c in chunks] == [
+        u"intro\n",
+        u"== a ==\nx <div>\n== in div ==\n</div>\n{|\n|-\n|\n== in table ==\n|}\n",
+        u"=== b ===\n[[link\n== in link ==\n]]\n",
+        u"== c ==\n"]
+
+
+_sections = u"""intro with <b>bold
+=== deep ===
+text</b> and ''italic''
+== one ==
+* item
+== broken
+ preformatted
+==== four ====
+{|
+|-
+| cell
+|}
+=== three ===
+[http://example.com example] <span>span</span>
+= top =
+text<ref>ref with [[link]]</ref>
+== two ==
+<references/>
+"""
+
+
+def test_split_sections_same_result():
+    monolithic = core.parse_txt(_sections)
+    assert len(core.split_sections(tokenize(_sections))) > 3
+    split = core.parse_txt(_sections, split_sections=True)
+    assert _dump(split) == _dump(monolithic)
+
+
+def test_split_sections_processes():
+    monolithic = core.parse_txt(_sections)
+    split = core.parse_txt(_sections, split_sections=True, processes=2)
+    assert _dump(split) == _dump(monolithic)
@@ -0,0 +1,84 @@
+#! /usr/bin/env py.test
+
+import ast
+import os
+import re
+import pytest
+from mwlib.templ import nodes
+from mwlib.refine import core, tagparser, tokenbuffer
+
+if core._core is None:
+    pytest.skip("mwlib.refine._core not built")
+
+# (class, name of the method with a compiled version)
+compiled = [(core.parse_singlequote, "run"),
+            (core.parse_lines, "analyze"),
+            (core.parse_paragraphs, "run"),
+            (tagparser.tagparser, "run")]
+
+
+def _corpus():
+    res = set()
+    here = os.path.dirname(__file__)
+    for fn in ["test_parser.py", "test_refine.py", "test_table.py", "test_advtree.py"]:
+        tree = ast.parse(open(os.path.join(here, fn)).read())
+        for n in ast.walk(tree):
+            if isinstance(n, ast.Str) and len(n.s) > 3:
+                s = n.s
+                if isinstance(s, str):
+                    s = s.decode("utf-8", "replace")
+                res.add(s)
+    res = sorted(res)
+    # combinations of the snippets
+    res.extend(u"\n".join(res[i::97]) for i in range(97))
+    return res
+
+
+_addr = re.compile(" at 0x[0-9a-f]+")
+
+
+def _dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, _addr.sub("", repr(v))) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text", "nshandler"))
+        res.append((d, t.text, _dump(t.children or [])))
+    return res
+
+
+def _parse_all(corpus):
+    res = []
+    for s in corpus:
+        try:
+            res.append(_dump(core.parse_txt(s)))
+        except Exception, err:
+            res.append(repr(err))
+    return res
+
+
+def _use_python(monkeypatch):
+    for cls, name in compiled:
+        monkeypatch.setattr(cls, name, getattr(cls, "py_" + name))
+
+
+def test_compiled_passes_selected():
+    for cls, name in compiled:
+        assert getattr(cls, name) != getattr(cls, "py_" + name)
+
+
+def test_compiled_passes_same_result(monkeypatch):
+    corpus = _corpus()
+    assert len(corpus) > 500
+    res = _parse_all(corpus)
+    _use_python(monkeypatch)
+    expected = _parse_all(corpus)
+    for s, x, y in zip(corpus, res, expected):
+        assert x == y, "different result for %r" % (s,)
+
+
+def test_compiled_passes_tokenbuffer(monkeypatch):
+    s = u"\n".join([u"== a ==", u"* [[a|b]] ''c'' <div>d '''e'''</div>", u"# x <span>y", u"; t : d", u"", u"text ''x", u"<b>y</b>"] * 20)
+    res = _dump(core.parse_txt(s))
+    monkeypatch.setattr(tokenbuffer, "min_length", 0)
+    assert _dump(core.parse_txt(s)) == res
+    _use_python(monkeypatch)
+    assert _dump(core.parse_txt(s)) == res
@@ -0,0 +1,96 @@
+#! /usr/bin/env py.test
+
+import copy
+import cPickle
+from mwlib.templ import nodes
+from mwlib.refine import core
+from mwlib.refine.context import RefineContext, get_context
+from mwlib import siteinfo
+
+
+def test_get_context_cached():
+    si = siteinfo.get_siteinfo("en")
+    ctx = get_context(siteinfo=si, lang="en")
+    assert get_context(siteinfo=si, lang="en") is ctx
+    assert get_context(siteinfo=copy.deepcopy(si), lang="en") is ctx
+    assert get_context(siteinfo=si, lang="de") is not ctx
+    assert get_context(lang="en") is not ctx
+
+
+def test_parse_txt_keeps_context():
+    ctx = RefineContext(lang="en")
+    xopts = core.XBunch(context=ctx)
+    core.parse_txt(u"[[File:x.jpg|thumb|caption]]<ref>a ''b''</ref>", xopts)
+    assert xopts.context is ctx
+    assert xopts.nshandler is ctx.nshandler
+    assert xopts.imagemod is ctx.imagemod
+
+
+def test_default_expander_reset():
+    ctx = RefineContext(lang="en")
+    e = ctx.get_expander()
+    u = e.uniquifier
+    m = e.template_memo
+    e.node_count = 100
+    e.argument_expansions = 3
+    e.magic_displaytitle = u"x"
+    e.template_spans = [(0, 1, u"a")]
+    e.parsedTemplateCache[u"a"] = None
+    e.resolver.volatile = True
+    assert ctx.get_expander() is e
+    assert e.uniquifier is not u
+    assert e.template_memo is not m
+    assert e.node_count == 0
+    assert e.argument_expansions == 0
+    assert e.magic_displaytitle is None
+    assert e.template_spans is None
+    assert e.parsedTemplateCache == {}
+    assert not e.resolver.volatile
+
+
+def test_pickle():
+    ctx = get_context(siteinfo=siteinfo.get_siteinfo("de"), lang="de")
+    ctx2 = cPickle.loads(cPickle.dumps(ctx, 2))
+    assert ctx2.nshandler.siteinfo == ctx.nshandler.siteinfo
+    assert len(ctx2.parsers) == len(ctx.parsers)
+
+    raw = u"== a ==\n[[Bild:x.jpg|miniatur|links|caption]] <span>''b''</span>"
+    r1 = core.parse_txt(raw, context=ctx)
+    r2 = core.parse_txt(raw, context=ctx2)
+    img = r2[0].children[1].children[1]
+    assert img.ns == 6
+    assert img.align == "left"
+    assert core.T.join_as_text(r1) == core.T.join_as_text(r2)
+
+
+def test_pool_reused():
+    ctx = RefineContext(lang="en")
+    txt = u"== a ==\n[[x|y]] ''z''\n== b ==\n<ref>r</ref> [http://x.org u]\n"
+    expected = [repr(x) for x in core.walknode(core.parse_txt(txt, context=ctx))]
+    pool = ctx.get_pool(2)
+    try:
+        for i in range(2):
+            res = core.parse_txt(txt, context=ctx, split_sections=True, processes=2)
+            assert [repr(x) for x in core.walknode(res)] == expected
+            assert ctx.get_pool(2) is pool
+            assert pool._pool is not None
+        assert "_pool" not in ctx.__getstate__()
+    finally:
+        pool.close()
+
+
+def test_contexts_bounded(monkeypatch):
+    from mwlib import lrucache
+    from mwlib.refine import context
+    monkeypatch.setattr(context, "_contexts", lrucache.lrucache(4))
+    monkeypatch.setattr(context, "_recent", {})
+    ctx = get_context(lang="en")
+    pool = ctx.get_pool(1)
+    pool.imap(len, None, [])
+    assert pool._pool is not None
+    for lang in ["de", "fr", "nl", "it", "es"]:
+        get_context(lang=lang)
+    assert len(context._contexts.cache) <= 4
+    assert ctx._pool is None
+    assert pool._pool is None
+    assert get_context(lang="en") is not ctx
@@ -0,0 +1,141 @@
+#! /usr/bin/env py.test
+
+import re
+from mwlib.templ import nodes
+from mwlib.expander import Expander, DictDB
+from mwlib.refine import core, fragments
+from mwlib.refine.context import RefineContext
+from mwlib.uparser import parseString
+from mwlib.utoken import token as T
+
+navbox = u"""{| class="navbox" style="width:100%"
+|-
+! [[Topic]]
+|-
+| """ + u" &middot; ".join(u"[[Item %d|''item'' %d]]" % (i, i) for i in range(60)) + u"""
+|-
+| <span>x</span> [http://example.com ex] '''b'''
+|}"""
+
+class DB(DictDB):
+    def getURL(self, title, revision=None):
+        return None
+
+
+_addr = re.compile(" at 0x[0-9a-f]+")
+
+
+def _dump(tokens):
+    res = []
+    for t in tokens:
+        d = sorted((k, _addr.sub("", repr(v))) for k, v in t.__getstate__().items() if k not in ("children", "source", "_text", "nshandler"))
+        res.append((d, t.text, _dump(t.children or [])))
+    return res
+
+
+def _parse(raw, cache, **templates):
+    templates.setdefault("navbox", navbox)
+    e = Expander(raw, pagename=u"x", wikidb=DictDB(**templates))
+    e.record_template_spans = True
+    txt = e.expandTemplates(True)
+    return core.parse_txt(txt, uniquifier=e.uniquifier, expander=e, template_spans=e.template_spans, fragments=cache)
+
+
+def test_template_spans():
+    e = Expander(u"a {{x}} b {{y|{{x}}}}", pagename=u"p", wikidb=DictDB(x=u"X", y=u"<{{{1}}}>"))
+    assert e.template_spans is None
+    e.record_template_spans = True
+    txt = e.expandTemplates(True)
+    assert [txt[start:end] for start, end, name in e.template_spans] == [u"X", u"<X>"]
+
+
+def test_template_spans_newline():
+    e = Expander(u"a\n{{x}}", pagename=u"p", wikidb=DictDB(x=u"{|\n|b\n|}"))
+    e.record_template_spans = True
+    txt = e.expandTemplates(True)
+    # the span includes the newline inserted before the table
+    assert [txt[start:end] for start, end, name in e.template_spans] == [u"\n{|\n|b\n|}"]
+
+
+def test_reuse_same_result():
+    cache = fragments.FragmentCache()
+    for raw in [u"Intro ''a''\n\n{{navbox}}\n[[Category:x]]",
+                u"== S ==\n* list\n{{navbox}}",
+                u"{{navbox}}",
+                u"<div>\n{{navbox}}\n</div>"]:
+        cache.clear()
+        expected = _dump(_parse(raw, None))
+        assert _dump(_parse(raw, cache)) == expected
+        assert len(cache) == 1
+        assert _dump(_parse(raw, cache)) == expected
+
+
+def test_reuse_positions():
+    cache = fragments.FragmentCache()
+    _parse(u"{{navbox}}", cache)
+    assert len(cache) == 1
+    r = _parse(u"== a ==\nsome text\n{{navbox}}\n", cache)
+    count = 0
+    todo = [r]
+    while todo:
+        for t in todo.pop():
+            # entities are resolved
+            if t.type == T.t_text and t.start is not None and t.text != u"\xb7":
+                assert t.source[t.start:t.start + t.len] == t.text
+                count += 1
+            todo.append(t.children or [])
+    assert count > 100
+
+
+def test_no_reuse_partial():
+    cache = fragments.FragmentCache()
+    _parse(u"{{t}}\n|}", cache, t=navbox[:-2])
+    _parse(u"{{tbl}}", cache, tbl=u"{{navbox}}\nafter")
+    assert len(cache) == 0
+
+
+def test_no_reuse_small():
+    cache = fragments.FragmentCache()
+    _parse(u"{{t}}", cache, t=u"{|\n|a\n|}")
+    assert len(cache) == 0
+
+
+def test_no_reuse_subpage_links():
+    cache = fragments.FragmentCache()
+    _parse(u"{{t}}", cache, t=navbox.replace(u"[[Topic]]", u"[[/Topic]]"))
+    assert len(cache) == 0
+
+
+def test_parse_string_uses_context(monkeypatch):
+    monkeypatch.setenv("MWLIB_REFINE_REUSE_FRAGMENTS", "1")
+    ctx = RefineContext(lang="en")
+    db = DB(navbox=navbox)
+    r1 = parseString(title=u"a", raw=u"x\n{{navbox}}", wikidb=db, context=ctx)
+    assert len(ctx.fragments) == 1
+    r2 = parseString(title=u"a", raw=u"x\n{{navbox}}", wikidb=db, context=ctx)
+    assert r1.asText() == r2.asText()
+
+    ctx.fragments.clear()
+    parseString(title=u"c", raw=u"x\n{{navbox}}", wikidb=DB(navbox=navbox), context=ctx)
+    assert len(ctx.fragments) == 1
+    ctx.fragments.check_wikidb(db)
+    assert len(ctx.fragments) == 0
+
+
+def test_parse_string_reuse_disabled():
+    ctx = RefineContext(lang="en")
+    parseString(title=u"a", raw=u"x\n{{navbox}}", wikidb=DB(navbox=navbox), context=ctx)
+    assert len(ctx.fragments) == 0
+
+
+def test_cache_keeps_recently_used(monkeypatch):
+    monkeypatch.setattr(fragments.FragmentCache, "max_entries", 2)
+    cache = fragments.FragmentCache()
+    tables = [u"{|\n|%s\n|}" % x for x in "abc"]
+    for txt in tables[:2]:
+        cache.put(txt, core.parse_txt(txt)[0].children, 0)
+    assert cache.get(tables[0], tables[0], 0) is not None
+    cache.put(tables[2], core.parse_txt(tables[2])[0].children, 0)
+    assert len(cache) == 2
+    assert cache.get(tables[0], tables[0], 0) is not None
+    assert cache.get(tables[1], tables[1], 0) is None
@@ -0,0 +1,90 @@
+#! /usr/bin/env py.test
+
+import copy
+import cPickle
+from mwlib.templ import nodes
+from mwlib.refine import compat
+from mwlib.uparser import parseString
+from mwlib.dummydb import DummyDB
+from mwlib.parser import nodes as N
+
+raw = u"""intro '''bold''' [[link|label]] &amp; text
+== Section 1 ==
+* item ''a''
+* item [[File:x.jpg|thumb|caption]]
+<div>kept</div>
+
+{| class="wikitable"
+|+ caption
+|-
+! h1 !! h2
+|-
+| [http://example.com ex] || <span>x</span>
+|}
+=== Sub ===
+text<ref>a [[b]]</ref> more text
+<references/>
+[[Category:C]]
+"""
+
+
+def _dump(node):
+    return (node.__class__.__name__, node.caption, sorted((node.vlist or {}).items()),
+            [_dump(x) for x in node.children])
+
+
+def test_lazy_same_tree():
+    eager = compat.parse_txt(raw)
+    lazy = compat.parse_txt(raw, lazy=True)
+    assert isinstance(lazy.children, compat.LazyChildren)
+    assert _dump(lazy) == _dump(eager)
+
+
+def test_lazy_untouched():
+    lazy = compat.parse_txt(raw, lazy=True)
+    assert type(lazy.children) is compat.LazyChildren
+    sections = [x for x in lazy.children if isinstance(x, N.Section)]
+    assert type(lazy.children) is compat.ChildList
+    assert type(sections[0].children) is compat.LazyChildren
+    assert sections[0].children[0].asText() == u"Section 1 "
+
+
+def test_lazy_find():
+    eager = compat.parse_txt(raw)
+    for klass in (N.Section, N.ArticleLink, N.ImageLink, N.Cell, N.URL, N.Text):
+        lazy = compat.parse_txt(raw, lazy=True)
+        assert [_dump(x) for x in lazy.find(klass)] == [_dump(x) for x in eager.find(klass)]
+    lazy = compat.parse_txt(raw, lazy=True)
+    assert len(list(lazy.allchildren())) == len(list(eager.allchildren()))
+    assert [x.caption for x in lazy.filter(lambda x: isinstance(x, N.Text))] == [x.caption for x in eager.filter(lambda x: isinstance(x, N.Text))]
+
+
+def test_lazy_list_operations():
+    eager = compat.parse_txt(raw)
+    for op in [lambda c: c[1:3], lambda c: c[-1], lambda c: list(reversed(c)),
+               lambda c: [] + c, lambda c: c + [], lambda c: c * 1]:
+        lazy = compat.parse_txt(raw, lazy=True)
+        assert [_dump(x) for x in op(lazy.children)] == [_dump(x) for x in op(eager.children)]
+
+    lazy = compat.parse_txt(raw, lazy=True)
+    assert lazy == eager
+
+    lazy = compat.parse_txt(raw, lazy=True)
+    lazy.children.append(N.Text(u"x"))
+    assert lazy.children[-1].caption == u"x"
+    assert _dump(lazy.children[0]) == _dump(eager.children[0])
+
+
+def test_lazy_copy_and_pickle():
+    eager = compat.parse_txt(raw)
+    for cp in [copy.deepcopy, lambda x: cPickle.loads(cPickle.dumps(x, 2))]:
+        lazy = cp(compat.parse_txt(raw, lazy=True))
+        assert type(lazy.children) is list
+        assert _dump(lazy) == _dump(eager)
+
+
+def test_lazy_parse_string():
+    db = DummyDB()
+    eager = parseString(title=u"t", raw=raw, wikidb=db)
+    lazy = parseString(title=u"t", raw=raw, wikidb=db, lazy=True)
+    assert _dump(lazy) == _dump(eager)
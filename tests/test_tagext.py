@@ -15,6 +15,14 @@ def test_rot13():
     assert txt == [u'rot13(test) is grfg']
 
 
+def test_compat_token_fields():
+    r = parse(u"""<rot13>test</rot13>""")
+    t = r.find(parser.Text)[0]
+    assert t.type == t.t_text
+    assert (t.start, t.len) == (0, 19)
+    assert t.text == u'rot13(test) is grfg'
+
+
 def test_idl():
     stuff = u"\n\t\ta:=b '''c''' v"
     r = parse(u"""<idl>%s</idl>""" % stuff)
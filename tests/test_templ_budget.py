@@ -0,0 +1,77 @@
+#! /usr/bin/env py.test
+
+import os
+from mwlib.templ import nodes
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.budget import ExpansionBudget, get_default_budget
+from mwlib.templ.misc import DictDB
+
+
+def expand(raw, budget, **templates):
+    te = Expander(raw, pagename=u"thispage", wikidb=DictDB(**templates))
+    te.budget = budget
+    return te.expandTemplates(True)
+
+
+def test_unlimited():
+    budget = ExpansionBudget()
+    res = expand(u"{{a|1}}{{a|2}}", budget, a=u"{{{1}}}{{b}}", b=u"yy")
+    assert res == u"1yy2yy"
+    assert budget.exhausted is None
+    assert budget.costs[u"a"][0] == 2
+    assert budget.costs[u"a"][2] == 2
+    assert budget.costs[u"b"][2] == 4
+    assert budget.output == 6
+
+
+def test_output_nested():
+    budget = ExpansionBudget()
+    res = expand(u"{{a}}{{c}}", budget, a=u"x{{#if:1|{{b}}}}{{b}}z", b=u"yy", c=u"{{{1|}}}")
+    assert res == u"xyyyyz"
+    assert budget.costs[u"a"][2] == 2
+    assert budget.costs[u"b"] == [2, budget.costs[u"b"][1], 4, budget.costs[u"b"][3]]
+    assert budget.costs[u"c"][2] == 0
+    assert budget.output == 6
+    assert not budget.stack
+
+
+def test_max_nodes():
+    budget = ExpansionBudget(max_nodes=50)
+    res = expand(u"{{a}}" * 100, budget, a=u"{{#if:1|x}}")
+    assert budget.exhausted is not None
+    assert 0 < len(res) < 100
+    assert set(res) == set(u"x")
+    assert budget.skipped[u"a"] == 100 - len(res)
+
+
+def test_max_output():
+    budget = ExpansionBudget(max_output=1000)
+    res = expand(u"{{a}}" * 100, budget, a=u"x" * 100)
+    assert budget.exhausted is not None
+    assert 1000 < len(res) <= 1100
+
+
+def test_report():
+    budget = ExpansionBudget(max_nodes=200)
+    expand(u"{{cheap}}{{expensive}}{{cheap}}", budget,
+           cheap=u"x",
+           expensive=u"{{#if:1|{{#if:1|{{#if:1|y}}}}}}" * 100)
+    report = budget.report()
+    assert report.startswith("expansion budget exhausted")
+    assert report.split("\n")[1].startswith("u'expensive'")
+    assert budget.skipped == {u"cheap": 1}
+
+
+def test_get_default_budget():
+    assert get_default_budget() is not None
+    names = ["MWLIB_EXPANDER_MAX_NODES", "MWLIB_EXPANDER_MAX_OUTPUT", "MWLIB_EXPANDER_MAX_TIME"]
+    for n in names:
+        os.environ[n] = "0"
+    try:
+        assert get_default_budget() is None
+        te = Expander(u"{{a}}", pagename=u"thispage", wikidb=DictDB(a=u"x"))
+        assert te.budget is None
+        assert te.expandTemplates() == u"x"
+    finally:
+        for n in names:
+            del os.environ[n]
@@ -0,0 +1,72 @@
+#! /usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import cPickle
+from mwlib.templ import nodes, parser, cache, marks
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.misc import DictDB
+
+
+def expand(s, db, template_cache):
+    te = Expander(s, pagename="thispage", wikidb=db, template_cache=template_cache)
+    return te.expandTemplates()
+
+
+def test_eqmark_pickle():
+    n = parser.parse(u"{{foo|a=b}}")
+    n2 = cPickle.loads(cPickle.dumps(n, cPickle.HIGHEST_PROTOCOL))
+    assert n2 == n
+    assert marks.eqmark in n2[1][0]
+
+
+def test_expand_same_result(tmpdir):
+    db = DictDB(
+        Infobox=u"{{#if:{{{name|}}}|<b>{{{name}}}</b>}}{{#switch:{{{1}}}|a=A|b=B|#default=X}}<ref>{{{name}}}</ref>",
+        Foo=u"<nowiki>{{{1}}}</nowiki>{{Infobox|{{{1}}}|name=foo}}")
+    s = u"{{Foo|a}} {{Infobox|b|name=bar}}"
+    expected = expand(s, db, None)
+
+    c = cache.TemplateCache(tmpdir.strpath)
+    assert expand(s, db, c) == expected
+    assert c.misses == 2
+    assert expand(s, db, c) == expected
+    assert c.hits == 2
+
+    # a second process shares the directory but not the memory
+    c2 = cache.TemplateCache(tmpdir.strpath)
+    assert expand(s, db, c2) == expected
+    assert c2.disk_hits == 2
+    assert c2.misses == 0
+
+
+def test_key():
+    c = cache.TemplateCache.__new__(cache.TemplateCache)
+    c._siteinfo_fingerprints = {}
+    from mwlib.siteinfo import get_siteinfo
+    k = c.make_key(u"{{foo}}")
+    assert k == c.make_key(u"{{foo}}")
+    assert k != c.make_key(u"{{foo}}", included=False)
+    assert k != c.make_key(u"{{bar}}")
+    assert k != c.make_key(u"{{foo}}", siteinfo=get_siteinfo("de"))
+
+
+def test_purge(tmpdir):
+    c = cache.TemplateCache(tmpdir.strpath, maxsize=4000)
+    for i in range(100):
+        c.parse(u"{{foo|%s}}" % (u"x" * i,), None)
+    assert c.evictions > 0
+    assert c._scan_size() <= 4000
+
+
+def test_switch_tables(tmpdir):
+    db = DictDB(s=u"{{#switch:{{{1}}}|a=A|b={{{2}}}|{{lc:C}}=c|#default=D}}")
+    c = cache.TemplateCache(tmpdir.strpath)
+    assert expand(u"{{s|a}}{{s|b|B}}{{s|c}}{{s|x}}", db, c) == u"ABcD"
+
+    c2 = cache.TemplateCache(tmpdir.strpath)
+    key = c2.make_key(db.d["s"])
+    tree, uniq2repl = c2[key]
+    assert isinstance(tree, nodes.SwitchNode)
+    assert tree.fast[u"a"] == (0, u"A")
+    assert len(tree.unresolved) == 1
+    assert expand(u"{{s|a}}{{s|b|B}}{{s|c}}{{s|x}}", db, c2) == u"ABcD"
@@ -0,0 +1,74 @@
+#! /usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from mwlib.templ import nodes, parser, compiler
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.misc import DictDB
+
+
+def expand_both(s, db, **kw):
+    res = []
+    for compile_templates in (False, True):
+        te = Expander(s, pagename="thispage", wikidb=db, **kw)
+        te.compile_templates = compile_templates
+        res.append(te.expandTemplates(keep_uniq=True))
+    print "EXPAND: %r -> %r" % (s, res[1])
+    assert res[0] == res[1], "compiled: %r, walked: %r" % (res[1], res[0])
+    return res[1]
+
+
+def test_compile_inlines_containers():
+    p = compiler.compile(parser.parse(u"a{{{1|{{{2}}}}}}b{{#if:{{{x|}}}|y|z}}{{foo}}"))
+    assert isinstance(p, compiler.Program)
+    ops = [op[0] for op in p.code]
+    assert ops == [compiler.LIT, compiler.VAR, compiler.LIT, compiler.IF, compiler.CALL]
+
+
+def test_compile_strings():
+    assert compiler.compile(u"foo") == u"foo"
+    assert compiler.compile(()) == ()
+
+
+def test_compile_template_args():
+    p = compiler.compile(parser.parse(u"{{foo|a|{{{1}}}|b={{{2}}}}}{{ {{{1}}} |a}}"))
+    (op1, d1, t1), (op2, d2, t2) = p.code
+    assert type(t1) is compiler.CompiledTemplate
+    assert type(t2) is nodes.Template
+    args = t1._get_args()
+    assert args[0] == u"a"
+    assert isinstance(args[1], compiler.Program)
+    name, value = args[2].equalsplit()
+    assert name.tree == (u"b",)
+
+
+def test_variables():
+    db = DictDB(T=u"[{{{1}}}|{{{2|default}}}|{{{ name |{{{1}}}}}}|{{{undefined}}}]",
+                U=u"{{T|{{{1}}}|{{{2|}}}| name = {{{3}}} }}")
+    assert expand_both(u"{{T|a|name=n}}{{T|b|c}}", db) == u"[a|default|n|{{{undefined}}}][b|c|b|{{{undefined}}}]"
+    expand_both(u"{{U|x|y|z}}{{U|x}}", db)
+
+
+def test_if_newlines():
+    db = DictDB(T=u"x{{#if:{{{1|}}}|\n* item|\n{|\n|}}}\n{{#if:{{{2|}}}|#a|:b}}")
+    expand_both(u"{{T|1}}{{T||2}}\n{{T}}", db)
+
+
+def test_nested_templates():
+    db = DictDB(A=u"{{B|{{{1}}}|{{C|{{{1}}}}}}}",
+                B=u"<b>{{{1}}}</b>{{{2}}}{{#switch:{{{1}}}|x=X|#default=D}}",
+                C=u"{{#ifeq:{{{1}}}|x|eq|ne}}<ref>{{{1}}}</ref>{{PAGENAME}}")
+    expand_both(u"{{A|x}} {{A|y}}", db)
+
+
+def test_recursion():
+    db = DictDB(A=u"a{{B}}", B=u"b{{A}}")
+    expand_both(u"{{A}}", db)
+    expand_both(u"x {{A}} y", db)
+
+
+def test_recursion_limit():
+    db = DictDB(T=u"[{{{1}}}{{#if:{{#ifexpr:{{{1}}}>0|1}}|{{T|{{#expr:{{{1}}}-1}}}}}}]")
+    assert expand_both(u"x{{T|8}}", db) == u"x[8[7[6[5[4[3[2[1[0]]]]]]]]]"
+
+    for limit in range(10, 50):
+        expand_both(u"x{{T|8}}", db, recursion_limit=limit)
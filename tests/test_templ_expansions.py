@@ -0,0 +1,97 @@
+#! /usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from mwlib.templ import nodes
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.expansions import ExpansionStore, page_version
+from mwlib.templ.misc import DictDB, page
+from mwlib.refine import uparser
+from mwlib import nshandling
+
+
+class StoreDB(DictDB):
+    store = None
+
+    def get_expansion_store(self):
+        return self.store
+
+
+def expand(store, db, raw, title=u"thispage"):
+    te = Expander(raw, pagename=title, wikidb=db)
+    res = store.get(te, raw)
+    if res is None:
+        res = te.expandTemplates(True)
+        store.put(te, raw, res)
+    return te, res
+
+
+def test_page_version():
+    p = page(u"foo")
+    assert page_version(None) is None
+    assert len(page_version(p)) == 40
+    p.revid = 17
+    assert page_version(p) == 17
+
+
+def test_reuse(tmpdir):
+    store = ExpansionStore(tmpdir.join("expansions.db").strpath)
+    db = DictDB(a=u"<b>{{{1}}}</b>{{b}}", b=u"{{DISPLAYTITLE:x}}<ref>b</ref>")
+    raw = u"{{a|<nowiki>{{x}}</nowiki>}}"
+
+    te, expected = expand(store, db, raw)
+    assert store.misses == 1
+    assert te.uniquifier.replace_uniq(expected) == u"<b>{{x}}</b><ref>b</ref>"
+
+    te, res = expand(store, db, raw)
+    assert store.hits == 1
+    assert res == expected
+    assert te.magic_displaytitle == u"x"
+    assert te.uniquifier.replace_uniq(res) == u"<b>{{x}}</b><ref>b</ref>"
+
+    te, res = expand(store, db, raw, title=u"otherpage")
+    assert store.misses == 2
+
+
+def test_changed_template(tmpdir):
+    store = ExpansionStore(tmpdir.join("expansions.db").strpath)
+    db = DictDB(a=u"a{{b}}", b=u"b")
+    expand(store, db, u"{{a}}{{c}}")
+
+    db.d["b"] = u"B"
+    te, res = expand(store, db, u"{{a}}{{c}}")
+    assert store.misses == 2
+    assert res == u"aB"
+
+    db.d["c"] = u"c"
+    te, res = expand(store, db, u"{{a}}{{c}}")
+    assert store.misses == 3
+    assert res == u"aBc"
+
+    te, res = expand(store, db, u"{{a}}{{c}}")
+    assert store.hits == 1
+
+
+def test_volatile(tmpdir):
+    store = ExpansionStore(tmpdir.join("expansions.db").strpath)
+    db = DictDB(a=u"{{CURRENTYEAR}}", b=u"{{#ifexist:a|x|y}}", c=u"{{#time:Y}}", d=u"{{PAGENAME}}")
+    db.nshandler = nshandling.nshandler(db.siteinfo)
+    for raw in [u"{{a}}", u"{{b}}", u"{{c}}"]:
+        expand(store, db, raw)
+        te, res = expand(store, db, raw)
+        assert te.resolver.volatile
+    assert store.hits == 0
+
+    expand(store, db, u"{{d}}")
+    te, res = expand(store, db, u"{{d}}")
+    assert not te.resolver.volatile
+    assert store.hits == 1
+
+
+def test_parse_string(tmpdir):
+    db = StoreDB(a=u"<ref>{{{1}}}</ref>")
+    db.store = ExpansionStore(tmpdir.join("expansions.db").strpath)
+    raw = u"foo{{a|bar}}\n<references/>"
+    r1 = uparser.parseString(u"thispage", raw=raw, wikidb=db)
+    r2 = uparser.parseString(u"thispage", raw=raw, wikidb=db)
+    assert db.store.hits == 1
+    assert repr(list(r1.allchildren())) == repr(list(r2.allchildren()))
@@ -0,0 +1,104 @@
+#! /usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from mwlib.templ import nodes, memo
+from mwlib.templ.evaluate import Expander
+from mwlib.templ.misc import DictDB
+
+
+def expand_both(s, db, pagename="thispage"):
+    te = Expander(s, pagename=pagename, wikidb=db)
+    te.template_memo = None
+    expected = te.expandTemplates(keep_uniq=True)
+
+    te = Expander(s, pagename=pagename, wikidb=db)
+    res = te.expandTemplates(keep_uniq=True)
+    print "EXPAND: %r -> %r %r" % (s, res, te.template_memo)
+    assert res == expected, "memoized: %r, expected: %r" % (res, expected)
+    return te.template_memo
+
+
+def test_pure_template():
+    db = DictDB(flagicon=u"[[Image:Flag of {{{1}}}.svg|{{{size|20px}}}]]",
+                page=u"{{flagicon|DE}} {{flagicon|FR}} {{flagicon| DE }} {{flagicon|1=DE}} {{flagicon|DE|size=}}")
+    m = expand_both(u"{{page}}{{flagicon|DE}}", db)
+    assert m.hits == 2
+    assert m.misses == 5
+
+
+def test_nested_pure():
+    db = DictDB(convert=u"{{{1}}} {{unit|{{{2}}}}}{{#expr:{{{1}}}*1000}}",
+                unit=u"{{#switch:{{{1}}}|km=kilometres|m=metres}}",
+                page=u"{{convert|5|km}} {{convert|5|km}} {{convert|7|m}}")
+    m = expand_both(u"{{page}} {{page}}", db)
+    assert m.hits > 0
+
+
+def test_impure_templates():
+    db = DictDB(a=u"{{PAGENAME}}",
+                b=u"{{CURRENTYEAR}}",
+                c=u"{{DISPLAYTITLE:{{{1}}}}}",
+                d=u"{{a}}",
+                e=u"{{#tag:ref|{{{1}}}}}",
+                f=u"{{/sub}}",
+                g=u"{{ {{{1}}} }}",
+                h=u"{{h}}",
+                page=u"{{a}}{{b}}{{c|x}}{{d}}{{e|x}}{{f}}{{g|a}}{{h}}")
+    m = expand_both(u"{{page}}{{page}}", db)
+    assert m.hits == 0
+    for x in "abcdefgh":
+        assert not m.is_pure_template(x)
+
+
+def test_pure_magics():
+    db = DictDB(a=u"{{lc:{{{1}}}}}{{#if:{{{1}}}|{{uc:{{{1}}}}}}}{{#ifeq:{{{1}}}|x|y|z}}{{formatnum:{{{1}}}}}")
+    m = expand_both(u"{{a|X}}{{a|X}}", db)
+    assert m.is_pure_template("a")
+    assert m.hits == 1
+
+
+def test_impure_args():
+    db = DictDB(a=u"<{{{1}}}>")
+    m = expand_both(u"{{a|{{PAGENAME}}}}{{a|{{PAGENAME}}}}", db)
+    assert m.hits == 0
+
+
+def test_duplicate_argument_names():
+    db = DictDB(a=u"{{{x}}}{{{1}}}{{{y}}}",
+                b=u"{{a|x={{{x}}}|1|y={{{x}}}}}")
+    expand_both(u"{{a|x=1|x=2}}{{a|x=1|x=2}}", db)
+    expand_both(u"{{b|x=1|x=2}}{{b|x=3|y=2}}{{b|x=1|x=2}}", db)
+
+
+def test_newlines():
+    db = DictDB(a=u"{{{1}}}", b=u"*{{{1}}}\n")
+    expand_both(u"{{a|*x}}\n{{a|*x}}\n{{a|#x}} {{b|x}}{{b|x}}", db)
+
+
+def test_recursion():
+    db = DictDB(T=u"[{{{1}}}{{#if:{{#ifexpr:{{{1}}}>0|1}}|{{T|{{#expr:{{{1}}}-1}}}}}}]",
+                U=u"{{T|{{{1}}}}}{{T|{{{1}}}}}",
+                V=u"{{U|{{{1}}}}}{{V|{{#expr:{{{1}}}-1}}}}")
+    expand_both(u"{{T|8}}{{T|8}}{{U|12}}{{U|3}}", db)
+    expand_both(u"{{V|5}}", db)
+
+
+def test_impure_magics():
+    db = DictDB()
+    m = expand_both(u"", db)
+    for name in [u"#timel:Y", u"#time:Y", u"NUMBEROFARTICLES", u"numberofusers", u"CURRENTVERSION",
+                 u"#invoke:a|b", u"int:lang", u"#language:de", u"#ifexist:a", u"CURRENTYEAR",
+                 u"LOCALTIME", u"PAGENAME", u"REVISIONID", u"SITENAME", u"#tag:ref"]:
+        assert not m.is_pure_call(name), name
+    for name in [u"lc:A", u"#expr:1+1", u"urlencode:a b", u"padleft:1|3", u"#if:x", u"#switch:x"]:
+        assert m.is_pure_call(name), name
+
+
+def test_impure_magic_not_memoized():
+    db = DictDB(a=u"{{#timel:Y}}{{{1}}}",
+                b=u"{{NUMBEROFARTICLES}}{{{1}}}",
+                c=u"{{numberofpages:R}}{{{1}}}")
+    m = expand_both(u"{{a|x}}{{a|x}}{{b|x}}{{b|x}}{{c|x}}{{c|x}}", db)
+    assert m.hits == 0
+    for x in "abc":
+        assert not m.is_pure_template(x)
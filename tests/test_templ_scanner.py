@@ -0,0 +1,66 @@
+#! /usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import random
+import pytest
+from mwlib.templ import nodes, scanner
+
+if scanner._expander is None:
+    pytest.skip("mwlib._expander not built")
+
+
+def check(txt):
+    expected = scanner.scan_rx(txt)
+    res = scanner.scan(txt)
+    print "SCAN: %r -> %r" % (txt, res)
+    assert res == expected
+
+
+def test_braces_and_links():
+    for s in [u"", u"a", u"{{a}}", u"{{{1|x}}}", u"{a}", u"{{{{{a}}}}}", u"[[a|b]]]", u"[a]",
+              u"a=b|c", u"a}}}}b{{", u"}{", u"[[[]]]"]:
+        check(s)
+
+
+def test_tags():
+    for s in [u"<noinclude>x{{a}}</noinclude>y", u"<noinclude>x", u"<INCLUDEONLY>a</includeonly>",
+              u"<nowiki>{{a}}</nowiki>", u"<nowiki>{{a}}", u"<NoWiki>|</NOWIKI>",
+              u"<math>a=b</math>", u"<math a>x</math>", u"<imagemap x=1>a|b</imagemap>",
+              u"<imagemap x<y>a</imagemap>", u"<gallery>\nImage:a|b\n</gallery>", u"<gallery",
+              u"<ref name=x/>", u"<ref/>", u"<ref>x</ref>", u"<ref name=a>x/>", u"<references />",
+              u"<source lang=c>a[i]=b;</source>", u"<pre>{{x}}</pre>", u"<pre class=a>|</pre>",
+              u"<prefix>x</pre>", u"<pre</pre>", u"<pre</pre>a</pre>", u"<pre>x", u"a<b"]:
+        check(s)
+
+
+def test_special_characters():
+    check(u"a\0b|c\0")
+    check(u"\0")
+    check(u"äöü{{ü|ß=€}}\U0001d11e")
+
+
+def test_random():
+    parts = [u"{", u"}", u"[", u"]", u"|", u"=", u"<", u">", u"/", u"a", u" ", u"\n", u"\0", u"ü",
+             u"<noinclude>", u"</noinclude>", u"<includeonly>", u"</includeonly>",
+             u"<nowiki>", u"</nowiki>", u"<math>", u"</math>", u"<imagemap", u"</imagemap>",
+             u"<gallery", u"</gallery>", u"<ref", u"<source", u"</source>", u"<pre", u"</pre>",
+             u"<PRE>", u"</Pre>"]
+    r = random.Random(42)
+    for i in range(3000):
+        check(u"".join(r.choice(parts) for j in range(r.randint(0, 30))))
+
+
+def test_scan_offsets():
+    txt = u"{{a|[[b]]}}<nowiki>|</nowiki>"
+    assert scanner.scan(txt) == [(1, 0, 2), (5, 2, 1), (5, 3, 1), (3, 4, 2), (5, 6, 1),
+                                 (3, 7, 2), (2, 9, 2), (5, 11, 18)]
+
+
+def test_tokenize_parse():
+    txt = u"{{#if:{{{1|}}}|<nowiki>|</nowiki>[[a|b]]|{{b|x=<ref name=a/>}}}}<noinclude>c</noinclude>"
+    src, toks = scanner.tokenize_offsets(txt, included=False)
+    assert src == txt.replace(u"<noinclude>", u"").replace(u"</noinclude>", u"")
+    assert toks[-1] == (None, len(src), 0)
+    assert toks[:-1] == scanner.scan_rx(src)
+    assert u"".join(src[start:start + length] for ty, start, length in toks) == src
+    assert scanner.tokenize(txt, included=False) == [(t, src[start:start + length]) for t, start, length in toks[:-1]] + [(None, '')]
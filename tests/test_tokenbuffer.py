@@ -0,0 +1,72 @@
+#! /usr/bin/env py.test
+
+import random
+import pytest
+from mwlib.templ import nodes
+from mwlib.refine import core, tokenbuffer
+
+if tokenbuffer.tokenbuffer is None:
+    pytest.skip("mwlib.refine._core not built")
+
+
+def test_list_api():
+    cls = tokenbuffer.tokenbuffer
+    b = cls(range(10))
+    assert len(b) == 10
+    assert list(b) == range(10)
+    assert b[3] == 3
+    assert b[-1] == 9
+    assert b[2:5] == [2, 3, 4]
+
+    b[2:5] = ["x"]
+    assert list(b) == [0, 1, "x", 5, 6, 7, 8, 9]
+    assert b[-1] == 9
+    del b[0]
+    assert b[0] == 1
+    b.insert(1, "y")
+    b.append("z")
+    b[-2] = "w"
+    assert b.tolist() == [1, "y", "x", 5, 6, 7, 8, "w", "z"]
+
+    b = cls([1])
+    pytest.raises(IndexError, b.__getitem__, 1)
+    pytest.raises(IndexError, b.__getitem__, -2)
+
+
+def test_random_operations():
+    cls = tokenbuffer.tokenbuffer
+    r = random.Random(17)
+    for n in range(50):
+        lst = range(r.randrange(50))
+        b = cls(lst)
+        for i in range(100):
+            op = r.randrange(5)
+            size = len(lst)
+            start = r.randrange(-3, size + 3)
+            stop = r.randrange(-3, size + 3)
+            if op == 0 and size:
+                i = r.randrange(-size, size)
+                assert b[i] == lst[i]
+            elif op == 1:
+                assert b[start:stop] == lst[start:stop]
+            elif op == 2:
+                value = [object() for x in range(r.randrange(3))]
+                b[start:stop] = value
+                lst[start:stop] = value
+            elif op == 3:
+                del b[start:stop]
+                del lst[start:stop]
+            else:
+                value = object()
+                b.insert(start, value)
+                lst.insert(start, value)
+            assert len(b) == len(lst)
+        assert list(b) == lst
+        assert b.tolist() == lst
+
+
+def test_parse_long_lists(monkeypatch):
+    s = "\n".join(["== a ==", "* [[a|b]] ''c'' <div>d</div>", "{|", "|-", "| cell [http://x.org y]", "|}"] * 20)
+    expected = repr(list(core.walknode(core.parse_txt(s))))
+    monkeypatch.setattr(tokenbuffer, "min_length", 0)
+    assert repr(list(core.walknode(core.parse_txt(s)))) == expected
@@ -611,3 +611,143 @@ Image:bla.png
 
     tree, reports = cleanMarkup(raw)
     assert len(tree.getChildNodesByClass(Section)) == 4, 'section falsly removed'
+
+
+class _NoSkipTreeCleaner(TreeCleaner):
+    def getCleanerNodeClasses(self):
+        return {}
+
+
+def _cleanedTree(raw, cleanerClass):
+    tree = getTreeFromMarkup(raw)
+    buildAdvancedTree(tree)
+    tc = cleanerClass(tree, save_reports=True)
+    tc.cleanAll(skipMethods=[])
+    return tree, tc.getReports()
+
+
+def _dumpTree(node):
+    return (node.__class__.__name__, node.caption, sorted((node.vlist or {}).items()),
+            [_dumpTree(c) for c in node.children])
+
+
+def test_skipCleanersWithoutNodes():
+    tree = getTreeFromMarkup('some text')
+    buildAdvancedTree(tree)
+    tc = TreeCleaner(tree)
+    skipped = []
+    classes = tc._getNodeClasses(tree)
+    for method, needs in tc.getCleanerNodeClasses().items():
+        if not _any([_all([klass in classes for klass in group]) for group in needs]):
+            skipped.append(method)
+    assert 'removeBreakingReturns' in skipped
+    assert 'fixTableColspans' in skipped
+    assert 'removeEmptyTextNodes' not in skipped
+
+
+def test_skipCleanersSameResult():
+    raw = '''
+== section 1 ==
+text<br/>more text<br/><br/>
+
+{| class="navbox"
+|-
+| [[a]] || <br/>
+|}
+
+* <br/>item
+<references/>
+== See also ==
+* [[b]]
+
+{|
+|-
+| <gallery>
+Image:bla.png
+</gallery>
+|}
+<center><u>x</u></center>
+'''
+    tree, reports = _cleanedTree(raw, TreeCleaner)
+    tree_noskip, reports_noskip = _cleanedTree(raw, _NoSkipTreeCleaner)
+    _treesanity(tree)
+    assert _dumpTree(tree) == _dumpTree(tree_noskip)
+    assert len(reports) == len(reports_noskip)
+
+
+def test_skipCleanersOverridden():
+    called = []
+
+    class MyTreeCleaner(TreeCleaner):
+        def removeBreakingReturns(self, node):
+            called.append(node)
+
+    tree = getTreeFromMarkup('some text')
+    buildAdvancedTree(tree)
+    MyTreeCleaner(tree).clean(['removeBreakingReturns'])
+    assert called
+
+
+def test_skipCleanersDirectEdit():
+    class MyTreeCleaner(TreeCleaner):
+        def makeBreakingReturns(self, node):
+            # changes __class__ without the methods of AdvancedNode
+            for t in node.getChildNodesByClass(Text):
+                if t.caption.strip() == u'x':
+                    t.__class__ = BreakingReturn
+
+    tree = getTreeFromMarkup('x\n\nsome text')
+    buildAdvancedTree(tree)
+    MyTreeCleaner(tree).clean(['removeEmptyTextNodes', 'makeBreakingReturns', 'removeBreakingReturns'])
+    assert not tree.getChildNodesByClass(BreakingReturn)
+
+
+def _bookFromMarkup(articles):
+    from mwlib.advtree import Book
+    book = Book()
+    for raw in articles:
+        book.children.append(getTreeFromMarkup(raw))
+    buildAdvancedTree(book)
+    return book
+
+
+def test_cleanBookRemovedArticle():
+    # the article following a removed article is cleaned as well
+    book = _bookFromMarkup(['text', '<gallery>\n</gallery>', 'more<br/><br/>'])
+    tc = TreeCleaner(book, processes=0)
+    tc.cleanAll()
+    assert len(book.children) == 2
+    assert not book.children[1].getChildNodesByClass(BreakingReturn)
+
+
+def test_cleanBookParallel():
+    articles = ['text', '<gallery>\n</gallery>', 'more<br/><br/>', '''
+== section 1 ==
+{| class="navbox"
+|-
+| [[a]] || <br/>
+|}
+
+* <br/>item
+<references/>
+== section 2 ==
+[[Image:bla.png]]
+<center><u>x</u></center>
+''', '* [[Category:C]] [[b]]']
+
+    res = []
+    for processes in (0, 2):
+        book = _bookFromMarkup(articles)
+        status = []
+        tc = TreeCleaner(book, save_reports=True, processes=processes,
+                         status_cb=lambda progress=None: status.append(progress))
+        tc.cleanAll()
+        _treesanity(book)
+        for (i, c) in enumerate(book.children):
+            assert c.parent is book
+            if processes:
+                # the indices cached by advtree._idIndex are renewed
+                assert c._index + book._shift == i
+        assert status == [0, 20, 40, 60, 80]
+        res.append((_dumpTree(book), [r[0] for r in tc.getReports()]))
+    assert res[0] == res[1]
@@ -40,3 +40,33 @@ def test_comment():
     yield repl,  "foo\n<!-- bla -->\nbar",  "foo\nbar"
     yield repl,  "foo\n<!-- bla -->bar",  "foo\nbar"
     yield repl,  "foo<!-- bla -->\nbar",  "foo\nbar"
+
+
+def test_shared_rx():
+    u1 = uniq.Uniquifier()
+    u2 = uniq.Uniquifier()
+    u1.replace_tags(u"<ref>a</ref>")
+    u2.replace_tags(u"<ref>b</ref>")
+    assert u1.rx is u2.rx
+
+
+def test_rx_follows_registry():
+    from mwlib import tagext
+
+    class X(tagext.TagExtension):
+        name = "uniqtestext"
+
+    assert "UNIQ" not in uniq.Uniquifier().replace_tags(u"<uniqtestext>x</uniqtestext>")
+    tagext.register(X)
+    try:
+        assert "UNIQ" in uniq.Uniquifier().replace_tags(u"<uniqtestext>x</uniqtestext>")
+    finally:
+        del tagext.default_registry.name2ext["uniqtestext"]
+
+
+def test_many_refs():
+    u = uniq.Uniquifier()
+    txt = u"".join(u"x<ref name=r%d>ref %d</ref>y<ref name=r%d />\n" % (i, i, i) for i in range(2000))
+    s = u.replace_tags(txt)
+    assert s.count(u"UNIQ") == 4000
+    assert u.replace_uniq(s) == txt
@@ -0,0 +1,64 @@
+#! /usr/bin/env py.test
+
+import os
+import cPickle
+import pytest
+from mwlib import workers
+
+
+class Thing(object):
+    def __init__(self, name, ref=None):
+        self.name = name
+        self.ref = ref
+
+
+def _pid(job, item):
+    return os.getpid()
+
+
+def _wrap(job, item):
+    factor, things = job
+    assert item.ref is things[0]
+    return Thing(item.name * factor, item.ref)
+
+
+def test_imap_shared():
+    resident = Thing("resident")
+    shared = Thing("shared", resident)
+    pool = workers.WorkerPool(2, [resident])
+    try:
+        items = [Thing(str(i), shared) for i in range(5)]
+        res = dict(pool.imap(_wrap, (2, [shared]), items, [shared]))
+        assert sorted(res) == range(5)
+        for i, x in res.items():
+            assert x.name == str(i) * 2
+            assert x.ref is shared
+            assert x.ref.ref is resident
+    finally:
+        pool.close()
+
+
+def test_imap_remote():
+    book = Thing("book", [1, 2, 3])
+    stub = Thing("stub")
+    pool = workers.WorkerPool(2)
+    try:
+        res = dict(pool.imap(_wrap, (1, [stub]), [Thing("a", book)], [book], [stub]))
+        assert res[0].ref is book
+    finally:
+        pool.close()
+
+
+def test_pool_reused():
+    pool = workers.get_pool(2)
+    assert workers.get_pool(2) is pool
+    pids = set(pid for i, pid in pool.imap(_pid, None, range(10)))
+    pids.update(pid for i, pid in pool.imap(_pid, None, range(10)))
+    assert len(pids) <= 2
+    assert os.getpid() not in pids
+
+
+def test_not_picklable():
+    pool = workers.WorkerPool(2)
+    pytest.raises((TypeError, cPickle.PicklingError), pool.imap, _pid, lambda: None, range(3))
+    assert pool._pool is None